@@ -3,22 +3,33 @@ import logging
 import os
 import random
 from collections import deque
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 from datetime import datetime, timedelta, timezone
 from typing import Dict, List, Optional, Set
 
 import numpy as np
-from app.data_manager import ISSUES_COLLECTION, TIME_INTERVAL, DataManager, is_out_dated
+from app.concurrency import AdaptiveLimiter
+from app.data_manager import (
+    ISSUES_COLLECTION,
+    TIME_INTERVAL,
+    DataManager,
+    convert_size_into_number,
+    is_out_dated,
+)
 from app.llm_helper import LLMHelper
 from app.models import (
+    Alarm,
     Event,
     EventRisk,
     Issue,
     IssueStatus,
     NodeData,
     NodeSummary,
+    PerformanceData,
     RiskLevel,
 )
+from app.pipeline import Pipeline
+from app.scheduler import by_priority, issue_priority, priority_score
 from llm.reasoning_agent import ReasoningAgent
 
 logger = logging.getLogger(__name__)
@@ -29,8 +40,31 @@ class AgentConfig:
     run_interval: int = 0.1  # minutes
     lookforward_period: int = 24 * 90  # hours
     monitoring_period: int = 15  # minutes
-    concurrency_limit: int = 2  # max. num of reasoning agents to run concurrently
+    # initial concurrency limits of the stages, adapted to latency and 429s
+    concurrency_limit: int = 2  # reasoning agents
+    event_concurrency_limit: int = 4  # event risk evaluations
+    recommendation_concurrency_limit: int = 4  # network config recommendations
+    node_concurrency_limit: int = 8  # node risk assessments
+    max_concurrency_limit: int = 32
+    # latency above which a stage is considered overloaded (seconds)
+    event_latency_target: float = 120.0
+    recommendation_latency_target: float = 120.0
+    node_latency_target: float = 30.0
+    agent_latency_target: float = 900.0
     batch_size: int = 10  # number of events / issues per cycle
+    queue_size: int = 16  # capacity of the queues between the cycle's stages
+
+
+@dataclass
+class EventContext:
+    """An event and the data gathered for it along the cycle's pipeline"""
+
+    event: Event
+    nodes: List[NodeData]
+    performances: Dict[str, List[PerformanceData]] = field(default_factory=dict)
+    alarms: Dict[str, List[Alarm]] = field(default_factory=dict)
+    node_summaries: Optional[List[NodeSummary]] = None
+    event_risk: Optional[EventRisk] = None
 
 
 class AgentLogger:
@@ -76,9 +110,51 @@ class Agent:
         self.last_run = datetime.now()
         self._task: Optional[asyncio.Task] = None
         self.logger = AgentLogger()
-        self.agent_semaphore = asyncio.Semaphore(self.config.concurrency_limit)
+        # separate limiters per stage, so that nested stages never wait on a
+        # slot held by their caller
+        self.event_limiter = self._stage_limiter(
+            "event_evaluation",
+            self.config.event_concurrency_limit,
+            self.config.event_latency_target,
+        )
+        self.recommendation_limiter = self._stage_limiter(
+            "recommendation",
+            self.config.recommendation_concurrency_limit,
+            self.config.recommendation_latency_target,
+        )
+        self.node_limiter = self._stage_limiter(
+            "node_assessment",
+            self.config.node_concurrency_limit,
+            self.config.node_latency_target,
+        )
+        self.agent_limiter = self._stage_limiter(
+            "reasoning_agent",
+            self.config.concurrency_limit,
+            self.config.agent_latency_target,
+        )
         self.batch_size = self.config.batch_size
 
+    def _stage_limiter(
+        self, name: str, initial_limit: int, latency_target: float
+    ) -> AdaptiveLimiter:
+        return AdaptiveLimiter(
+            name,
+            initial_limit,
+            max_limit=self.config.max_concurrency_limit,
+            latency_target=latency_target,
+        )
+
+    def concurrency_limits(self) -> List[Dict]:
+        return [
+            limiter.stats()
+            for limiter in (
+                self.event_limiter,
+                self.recommendation_limiter,
+                self.node_limiter,
+                self.agent_limiter,
+            )
+        ]
+
     async def _run(self):
         """Internal method to run periodic tasks"""
         day_incremental = 0
@@ -86,44 +162,205 @@ class Agent:
             try:
                 logger.info("[_run]: start process cycle ...")
                 self.last_run = datetime.now() + timedelta(hours=24 * day_incremental)
-                await self._process_event_cycle()
-                await self.data_manager.sort_issues()
-                await self._process_issue_cycle()
+                await self._process_cycle()
                 logger.info("[_run]: finished cycle")
             except Exception as e:
                 logger.error(f"Exiting current run cycle due to: {e}")
             await asyncio.sleep(self.config.run_interval * 60)
             day_incremental += 1
 
+    async def _process_cycle(self):
+        """Run a processing cycle as a pipeline, from the events to the issues
+        they raise"""
+        logger.info(
+            f"[_process_cycle]: start running cycle with batch size {self.batch_size}..."
+        )
+        stats = await self._cycle_pipeline(process_issues=True).run()
+        logger.info(f"[_process_cycle]: finished with stage stats {stats}")
+
     async def _process_event_cycle(self):
         """Run a single processing cycle"""
         logger.info(
             f"[_process_event_cycle]: start running event cycle with batch size {self.batch_size}..."
         )
-        events = await self._get_events()
-        await asyncio.gather(*[self._process_event(event) for event in events])
-        logger.info(
-            f"[_process_event_cycle]: finished with {len(events)} events processed"
+        stats = await self._cycle_pipeline(process_issues=False).run()
+        logger.info(f"[_process_event_cycle]: finished with stage stats {stats}")
+
+    def _cycle_pipeline(self, process_issues: bool) -> Pipeline:
+        """
+        event fetch -> node lookup -> KPI/alarm fetch -> node assessment -> event
+        assessment -> issue creation [-> issue processing]
+
+        The lookups take the events already queued in bulk, the LLM stages run as
+        many workers as the adaptive limiters can admit, so that the limiters,
+        not the workers, bound the concurrency. With `process_issues`, the issues
+        created in the cycle are processed as soon as they are, along with the
+        issues already due for analysis. Queued events and issues, and the calls
+        waiting for a limiter, go from the highest priority down.
+        """
+        llm_workers = self.config.max_concurrency_limit
+        pipeline = (
+            Pipeline("cycle", self._event_source, queue_size=self.config.queue_size)
+            .add_stage("node_lookup", self._lookup_nodes, batch_size=self.batch_size)
+            .add_stage(
+                "kpi_alarm_fetch",
+                self._fetch_node_data,
+                workers=2,
+                batch_size=self.batch_size,
+            )
+            .add_stage(
+                "node_assessment",
+                self._assess_nodes,
+                workers=llm_workers,
+                priority=self._context_priority,
+            )
+            .add_stage(
+                "event_assessment",
+                self._assess_event,
+                workers=llm_workers,
+                priority=self._context_priority,
+            )
+            .add_stage(
+                "issue_creation",
+                self._create_event_issue,
+                workers=llm_workers,
+                priority=self._context_priority,
+            )
         )
+        if process_issues:
+            seen_issue_ids = set()
+
+            async def process_issue(issue: Issue):
+                # an issue created in the cycle may also be due for analysis
+                if issue.issue_id not in seen_issue_ids:
+                    seen_issue_ids.add(issue.issue_id)
+                    await self._process_issue(issue)
+                    yield issue
+
+            pipeline.add_stage(
+                "issue_processing",
+                process_issue,
+                workers=llm_workers,
+                feed=self._issue_source,
+                priority=self._issue_priority,
+            )
+        return pipeline
+
+    def _event_priority(
+        self,
+        event: Event,
+        event_risk: Optional[EventRisk] = None,
+        node_summaries: Optional[List[NodeSummary]] = None,
+    ) -> float:
+        return priority_score(
+            self.last_run,
+            start_date=event.start_date,
+            event_size=convert_size_into_number(event.size),
+            risk_level=event_risk.risk_level if event_risk else None,
+            n_problematic_nodes=sum(s.is_problematic for s in node_summaries or []),
+            last_evaluated=event.processed_at,
+        )
+
+    def _context_priority(self, context: EventContext) -> float:
+        return self._event_priority(
+            context.event, context.event_risk, context.node_summaries
+        )
+
+    def _issue_priority(self, issue: Issue) -> float:
+        return issue_priority(issue, now=self.last_run)
+
+    # -------------------
+    # cycle stages
+    # -------------------
+
+    async def _event_source(self):
+        for event in by_priority(await self._get_events(), self._event_priority):
+            yield event
+
+    async def _issue_source(self):
+        # already from the highest priority down
+        for issue in await self._get_issues_for_analysis():
+            yield issue
+
+    async def _lookup_nodes(self, events: List[Event]):
+        # one spatial join for the events queued together
+        needed = await asyncio.gather(
+            *[self._event_needs_processing(e) for e in events]
+        )
+        events = [event for event, n in zip(events, needed) if n]
+        if not events:
+            return
+        event_nodes = await self.data_manager.get_nearby_nodes_batch(events)
+        for event in events:
+            yield EventContext(event=event, nodes=event_nodes.get(event.event_id, []))
+
+    async def _fetch_node_data(self, contexts: List[EventContext]):
+        # one KPI and one alarm request for the events queued together; the
+        # alarms of a site are fetched once and shared by all of its nodes
+        nodes = [node for context in contexts for node in context.nodes]
+        performances, alarms = await asyncio.gather(
+            self.data_manager.get_performance_data_bulk([n.node_id for n in nodes]),
+            self.data_manager.get_alarms_bulk([n.site_id for n in nodes]),
+        )
+        for context in contexts:
+            context.performances = performances
+            context.alarms = alarms
+            yield context
+
+    async def _assess_nodes(self, context: EventContext):
+        context.node_summaries = await self._get_node_summaries(
+            context.nodes,
+            context.performances,
+            context.alarms,
+            priority=self._context_priority(context),
+        )
+        # the raw data is no longer needed once summarized
+        context.performances, context.alarms = {}, {}
+        yield context
+
+    async def _assess_event(self, context: EventContext):
+        async with self.event_limiter.slot(self._context_priority(context)):
+            context.event_risk = await self.llm_helper.assess_event_risk(
+                event=context.event, node_summaries=context.node_summaries
+            )
+        if context.event_risk.risk_level != RiskLevel.LOW:
+            yield context
+        else:
+            logger.info(
+                f"[_assess_event]: event {context.event.event_id} is low risk, no issue created"
+            )
+
+    async def _create_event_issue(self, context: EventContext):
+        issue = await self._create_issue_for_event(
+            context.event, context.event_risk, priority=self._context_priority(context)
+        )
+        if issue:
+            yield issue
+
+    # -------------------
+    # single steps
+    # -------------------
 
     async def _process_issue_cycle(self):
         """Run a single processing cycle"""
         logger.info(
             f"[_process_issue_cycle]: start running issue cycle with batch size {self.batch_size}..."
         )
+        issues = await self._get_issues_for_analysis()
+        issue_tasks = [self._process_issue(issue) for issue in issues]
+        await asyncio.gather(*issue_tasks)  # added await here
+        logger.info(
+            f"[_process_issue_cycle]: finished with {len(issues)} issues processed"
+        )
+
+    async def _get_issues_for_analysis(self) -> List[Issue]:
         start_time = self.last_run
         end_time = start_time + timedelta(hours=self.config.lookforward_period)
-
-        issues = await self.data_manager.get_issues_for_analysis(
+        return await self.data_manager.get_issues_for_analysis(
             start_time=start_time,
             end_time=end_time,
             max_num_issues=self.batch_size,
         )
-        issue_tasks = [self._process_issue(issue) for issue in issues]
-        await asyncio.gather(*issue_tasks)  # added await here
-        logger.info(
-            f"[_process_issue_cycle]: finished with {len(issues)} issues processed"
-        )
 
     async def _get_events(self, location: Optional[str] = None) -> List[Event]:
         logger.info("[_get_events]: start ...")
@@ -139,7 +376,7 @@ class Agent:
         # If there's already an issue related to the event in the database, skip the event
         if event.issue_id:
             doc = (
-                self.data_manager.manager_db.collection(ISSUES_COLLECTION)
+                await self.data_manager.manager_db.collection(ISSUES_COLLECTION)
                 .document(event.issue_id)
                 .get()
             )
@@ -147,71 +384,134 @@ class Agent:
                 return True
         return False
 
-    async def _process_event(self, event: Event) -> Issue | None:
+    async def _process_event(
+        self,
+        event: Event,
+        nodes: Optional[List[NodeData]] = None,
+        performances: Optional[Dict[str, List[PerformanceData]]] = None,
+        alarms: Optional[Dict[str, List[Alarm]]] = None,
+    ) -> Issue | None:
         """Processes a single event and creates an issue if necessary."""
-        async with self.agent_semaphore:
-            logger.info(f"[_process_event]: start with event {event.event_id}...")
-            if not await self.data_manager.get_event(event.event_id):
-                logger.info(
-                    f"[_process_event]: finished with event {event.event_id} not found in data manager's event collection"
-                )
-                return
-            else:
-                # when to skip event...
-                if await self._event_has_wip_issue(event):
-                    logger.info(
-                        f"[_process_event]: finished with event {event.event_id} already has WIP issue, skipped"
-                    )
-                    return
+        logger.info(f"[_process_event]: start with event {event.event_id}...")
+        if not await self._event_needs_processing(event):
+            return
 
-                event_risk = await self._evaluate_event_risk(event=event)
+        priority = self._event_priority(event)
+        event_risk = await self._evaluate_event_risk(
+            event=event,
+            nodes=nodes,
+            performances=performances,
+            alarms=alarms,
+            priority=priority,
+        )
 
-                if event_risk.risk_level != RiskLevel.LOW:
-                    recommendation = await self._create_recommendation(
-                        event=event, event_risk=event_risk
-                    )
-                    issue_id = await self._create_issue(
-                        event, event_risk, recommendation
-                    )
-                    await self.data_manager.update_event(
-                        event.event_id,
-                        {"issue_id": issue_id, "processed_at": datetime.now()},
-                    )
-                    logger.info(
-                        f"[_process_event]: finished with issue {issue_id} created for event {event.event_id}"
-                    )
-                    issue = await self.data_manager.get_issue(issue_id)
-                    return issue
-                else:
-                    logger.info(
-                        f"[_process_event]: finished with event {event.event_id} is low risk, no issue created"
-                    )
-                    pass
+        if event_risk.risk_level != RiskLevel.LOW:
+            return await self._create_issue_for_event(
+                event, event_risk, priority=priority
+            )
+        else:
+            logger.info(
+                f"[_process_event]: finished with event {event.event_id} is low risk, no issue created"
+            )
+
+    async def _event_needs_processing(self, event: Event) -> bool:
+        if not await self.data_manager.get_event(event.event_id):
+            logger.info(
+                f"[_event_needs_processing]: event {event.event_id} not found in data manager's event collection"
+            )
+            return False
+        # when to skip event...
+        if await self._event_has_wip_issue(event):
+            logger.info(
+                f"[_event_needs_processing]: event {event.event_id} already has WIP issue, skipped"
+            )
+            return False
+        return True
+
+    async def _create_issue_for_event(
+        self, event: Event, event_risk: EventRisk, priority: float = 0.0
+    ) -> Issue | None:
+        recommendation = await self._create_recommendation(
+            event=event, event_risk=event_risk, priority=priority
+        )
+        issue_id = await self._create_issue(event, event_risk, recommendation)
+        await self.data_manager.update_event(
+            event.event_id,
+            {"issue_id": issue_id, "processed_at": datetime.now()},
+        )
+        logger.info(
+            f"[_create_issue_for_event]: finished with issue {issue_id} created for event {event.event_id}"
+        )
+        return await self.data_manager.get_issue(issue_id)
 
-    async def _evaluate_event_risk(self, event: Event) -> EventRisk:
+    async def _evaluate_event_risk(
+        self,
+        event: Event,
+        nodes: Optional[List[NodeData]] = None,
+        performances: Optional[Dict[str, List[PerformanceData]]] = None,
+        alarms: Optional[Dict[str, List[Alarm]]] = None,
+        priority: float = 0.0,
+    ) -> EventRisk:
         """
         - if the combined capacity of the nodes is enough to cover even
         - if there's on-going alarm for the site
         - if the performance is degrading
+
+        `nodes` (the nodes near the event), `performances` (their KPIs by node id)
+        and `alarms` (by site id) are passed when they were already fetched for the
+        whole cycle.
         """
         logger.info(f"[_evaluate_event_risk]: start with event {event.event_id} ...")
 
-        nodes = await self.data_manager.get_nearby_nodes(event.location)
-        node_summary_tasks = [self._get_node_summary(node=node) for node in nodes]
-        node_summaries = await asyncio.gather(*node_summary_tasks)
-
-        event_risk = await self.llm_helper.assess_event_risk(
-            event=event, node_summaries=node_summaries
+        if nodes is None:
+            nodes = await self.data_manager.get_nearby_nodes(event.location)
+        if performances is None or alarms is None:
+            performances, alarms = await asyncio.gather(
+                self.data_manager.get_performance_data_bulk(
+                    [node.node_id for node in nodes]
+                ),
+                self.data_manager.get_alarms_bulk([node.site_id for node in nodes]),
+            )
+        node_summaries = await self._get_node_summaries(
+            nodes, performances, alarms, priority=priority
         )
+
+        async with self.event_limiter.slot(priority):
+            event_risk = await self.llm_helper.assess_event_risk(
+                event=event, node_summaries=node_summaries
+            )
         logger.info(
             f"[_evaluate_event_risk]: finished with risk level {event_risk.risk_level}"
         )
         return event_risk
 
-    async def _get_node_summary(self, node: NodeData):
+    async def _get_node_summaries(
+        self,
+        nodes: List[NodeData],
+        performances: Dict[str, List[PerformanceData]],
+        alarms: Dict[str, List[Alarm]],
+        priority: float = 0.0,
+    ) -> List[NodeSummary]:
+        return await asyncio.gather(
+            *[
+                self._get_node_summary(
+                    node=node,
+                    performance_data=performances.get(node.node_id, []),
+                    alarm_data=alarms.get(node.site_id, []),
+                    priority=priority,
+                )
+                for node in nodes
+            ]
+        )
+
+    async def _get_node_summary(
+        self,
+        node: NodeData,
+        performance_data: List[PerformanceData],
+        alarm_data: List[Alarm],
+        priority: float = 0.0,
+    ):
         logger.info(f"[_get_node_summary]: start with node {node.node_id} ...")
-        performance_data = await self.data_manager.get_performance_data(node.node_id)
-        alarm_data = await self.data_manager.get_alarms(node.site_id)
         capacity = node.capacity
 
         node_summary = NodeSummary(
@@ -222,7 +522,10 @@ class Agent:
             capacity=capacity,
             timestamp=datetime.now(),
         )
-        node_summary = await self.llm_helper.assess_node_risk(node_summary=node_summary)
+        async with self.node_limiter.slot(priority):
+            node_summary = await self.llm_helper.assess_node_risk(
+                node_summary=node_summary
+            )
         logger.info(
             f"[_get_node_summary]: finished with node {node.node_id} summary created"
         )
@@ -262,7 +565,9 @@ class Agent:
             )
             return
 
-        event_risk = await self._evaluate_event_risk(event=event)
+        event_risk = await self._evaluate_event_risk(
+            event=event, priority=self._issue_priority(issue)
+        )
         event_updates["event_risk"] = event_risk.model_dump()
         event_updates["node_ids"] = [s.node_id for s in event_risk.node_summaries]
         if issue.status == IssueStatus.NEW:
@@ -295,12 +600,15 @@ class Agent:
         logger.info(f"[_evaluate_if_human_intervention]: finished with result {result}")
         return result
 
-    async def _create_recommendation(self, event, event_risk: EventRisk) -> str:
+    async def _create_recommendation(
+        self, event, event_risk: EventRisk, priority: float = 0.0
+    ) -> str:
         logger.info("[_create_recommendation]: start ...")
         # replace with some gemini magic here)
-        recommendation = await self.llm_helper.recommend_network_config(
-            event, event_risk
-        )
+        async with self.recommendation_limiter.slot(priority):
+            recommendation = await self.llm_helper.recommend_network_config(
+                event, event_risk
+            )
         logger.info(f"[_create_recommendation]: finished with recommendation created")
         return recommendation
 
@@ -319,13 +627,15 @@ class Agent:
             f"[_handle_human_intervention]: finished with issue {issue_id} marked for human intervention"
         )
 
-    async def _process_node_with_ai_agent(self, issue_id: str, node_id: str) -> None:
+    async def _process_node_with_ai_agent(
+        self, issue_id: str, node_id: str, priority: float = 0.0
+    ) -> None:
         """Process a single node with a ReasoningAgent instance.
 
         This helper method handles the creation and execution of a ReasoningAgent
         for a single node while respecting the concurrency limit.
         """
-        async with self.agent_semaphore:  # Using semaphore to limit concurrent executions
+        async with self.agent_limiter.slot(priority):
             logger.info(f"Starting ReasoningAgent for node {node_id}")
             await self.logger.log(
                 "info",
@@ -386,7 +696,7 @@ class Agent:
             return
 
         logger.info(
-            f"Processing {len(issue.node_ids)} nodes with concurrency limit of {self.config.concurrency_limit}"
+            f"Processing {len(issue.node_ids)} nodes with concurrency limit of {int(self.agent_limiter.limit)}"
         )
         await self.logger.log(
             "info",
@@ -394,9 +704,13 @@ class Agent:
             issue_id=issue_id,
         )
 
-        # Create tasks for all nodes with concurrency control
+        # Create tasks for all nodes with concurrency control, the nodes of the
+        # higher priority issues get the free reasoning agent slots first
+        priority = self._issue_priority(issue)
         tasks = [
-            asyncio.create_task(self._process_node_with_ai_agent(issue_id, node_id))
+            asyncio.create_task(
+                self._process_node_with_ai_agent(issue_id, node_id, priority)
+            )
             for node_id in issue.node_ids
         ]
 
@@ -452,9 +766,7 @@ class Agent:
         try:
             logger.info("[_run]: start process cycle ...")
             self.last_run = datetime.now()
-            await self._process_event_cycle()
-            await self.data_manager.sort_issues()
-            await self._process_issue_cycle()
+            await self._process_cycle()
             logger.info("[_run]: finished cycle")
         except Exception as e:
             logger.error(f"Exiting current run cycle due to: {e}")
@@ -0,0 +1,104 @@
+"""
+Benchmark startup time and request latency of the backend API.
+
+The "per-request" run overrides the `get_data_manager` dependency to build a new
+DataManager (and so new Firestore, BigQuery and Storage clients) for every
+request, as the routes used to. The "shared" run uses the lifespan-managed
+DataManager. Requests are sent in-process through httpx's ASGI transport, so
+only the application and database latencies are measured. The periodic jobs of
+the lifespan (stats reconciliation, inventory refresh) are disabled, so that
+their queries do not run during the measurement.
+
+    FIRESTORE_EMULATOR_HOST=localhost:8080 poetry run python -m app.bin.run_benchmark_api_latency
+"""
+
+import asyncio
+import os
+import time
+from typing import List
+
+import httpx
+import typer
+from app import main as api_main
+from app.data_manager import DataManager
+from app.main import app as api
+from app.routes import get_data_manager
+from dotenv import load_dotenv
+
+load_dotenv()
+
+PROJECT_ID = os.getenv("PROJECT_ID", "demo-ran-guardian")
+ROUTES = ["/health", "/issues?max_num_issues=20", "/issues_stats", "/locations"]
+
+app = typer.Typer(add_completion=False)
+
+
+def _percentile(values: List[float], pct: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * pct))]
+
+
+async def _per_request_data_manager():
+    data_manager = DataManager(project_id=PROJECT_ID)
+    try:
+        yield data_manager
+    finally:
+        await data_manager.close()
+
+
+async def benchmark(name: str, n_requests: int, concurrency: int):
+    t0 = time.perf_counter()
+    async with api.router.lifespan_context(api):
+        startup_time = time.perf_counter() - t0
+        transport = httpx.ASGITransport(app=api)
+        async with httpx.AsyncClient(
+            transport=transport, base_url="http://benchmark"
+        ) as client:
+            semaphore = asyncio.Semaphore(concurrency)
+
+            async def _timed_get(route: str) -> float:
+                async with semaphore:
+                    t_start = time.perf_counter()
+                    response = await client.get(route)
+                    response.raise_for_status()
+                    return time.perf_counter() - t_start
+
+            for route in ROUTES:
+                await client.get(route)  # warm up
+                latencies = await asyncio.gather(
+                    *[_timed_get(route) for _ in range(n_requests)]
+                )
+                print(
+                    f"{name:>12} | {route:<28}"
+                    f" | p50 {_percentile(latencies, 0.5) * 1000:8.1f} ms"
+                    f" | p99 {_percentile(latencies, 0.99) * 1000:8.1f} ms"
+                )
+    print(f"{name:>12} | startup {startup_time * 1000:.1f} ms")
+
+
+@app.command()
+def main(n_requests: int = 100, concurrency: int = 10):
+    async def _main():
+        api_main.STATS_RECONCILE_INTERVAL = 0
+        api_main.INVENTORY_REFRESH_INTERVAL = 0
+
+        t0 = time.perf_counter()
+        data_manager = DataManager(project_id=PROJECT_ID)
+        print(
+            f"DataManager construction: {(time.perf_counter() - t0) * 1000:.1f} ms"
+            " (paid on every request by the per-request dependency)"
+        )
+
+        await data_manager.close()
+
+        api.dependency_overrides[get_data_manager] = _per_request_data_manager
+        await benchmark("per-request", n_requests, concurrency)
+
+        api.dependency_overrides.clear()
+        await benchmark("shared", n_requests, concurrency)
+
+    asyncio.run(_main())
+
+
+if __name__ == "__main__":
+    app()
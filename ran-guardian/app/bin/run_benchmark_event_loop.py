@@ -0,0 +1,165 @@
+"""
+Benchmark event-loop lag and cycle wall time of the DataManager Firestore I/O.
+
+It compares the previous pattern (synchronous `firestore.Client` calls inside
+`async def` methods) with the `firestore.AsyncClient` backed DataManager, using
+the same fan-out as `Agent._process_event_cycle`: one `get_events` query
+followed by `asyncio.gather` over per-event reads and writes.
+
+Run it against a local Firestore emulator:
+
+    gcloud emulators firestore start --host-port=localhost:8080
+    FIRESTORE_EMULATOR_HOST=localhost:8080 poetry run python -m app.bin.run_benchmark_event_loop
+"""
+
+import asyncio
+import os
+import statistics
+import time
+from datetime import datetime, timedelta
+from typing import Dict, List
+
+import typer
+from app.data_manager import EVENTS_COLLECTION, DataManager
+from app.models import Event
+from dotenv import load_dotenv
+from google.cloud import firestore
+from google.cloud.firestore_v1.base_query import FieldFilter
+
+load_dotenv()
+
+PROJECT_ID = os.getenv("PROJECT_ID", "demo-ran-guardian")
+DB_NAME = "ran-guardian-data-manager"
+LAG_SAMPLING_INTERVAL = 0.005  # seconds
+
+app = typer.Typer(add_completion=False)
+
+
+class SyncBaseline:
+    """The DataManager event methods as they were before, on a blocking client"""
+
+    def __init__(self, project_id: str, manager_db: str = DB_NAME):
+        self.manager_db = firestore.Client(project=project_id, database=manager_db)
+
+    async def get_events(self, start_time, end_time, max_num_event=None):
+        event_collection = (
+            self.manager_db.collection(EVENTS_COLLECTION)
+            .where(filter=FieldFilter("start_date", ">=", f"{start_time:%Y-%m-%d}"))
+            .where(filter=FieldFilter("start_date", "<=", f"{end_time:%Y-%m-%d}"))
+            .order_by("start_date")
+            .order_by("end_date")
+        )
+        events = []
+        for doc in event_collection.stream():
+            if "issue_id" in doc.to_dict():
+                continue
+            events.append(Event.from_firestore_doc(doc.id, doc.to_dict()))
+            if max_num_event and (len(events) >= max_num_event):
+                break
+        return events
+
+    async def get_event(self, event_id: str):
+        doc = self.manager_db.collection(EVENTS_COLLECTION).document(event_id).get()
+        return Event.from_firestore_doc(doc.id, doc.to_dict()) if doc.exists else None
+
+    async def update_event(self, event_id: str, updates: Dict) -> bool:
+        self.manager_db.collection(EVENTS_COLLECTION).document(event_id).update(updates)
+        return True
+
+
+def seed_events(num_events: int) -> None:
+    db = firestore.Client(project=PROJECT_ID, database=DB_NAME)
+    batch = db.batch()
+    start_date = datetime.now() + timedelta(days=1)
+    for i in range(num_events):
+        doc_ref = db.collection(EVENTS_COLLECTION).document(f"bench-event-{i:05d}")
+        batch.set(
+            doc_ref,
+            {
+                "name": f"Benchmark event {i}",
+                "location": "Berlin Berlin",
+                "address": "Berlin, Germany",
+                "lat": 52.52,
+                "lng": 13.405,
+                "start_date": (start_date + timedelta(days=i % 30)).strftime(
+                    "%Y-%m-%d"
+                ),
+                "end_date": (start_date + timedelta(days=i % 30 + 1)).strftime(
+                    "%Y-%m-%d"
+                ),
+                "url": None,
+                "event_type": "Benchmark",
+                "size": "M",
+            },
+        )
+        if (i + 1) % 500 == 0:
+            batch.commit()
+            batch = db.batch()
+    batch.commit()
+
+
+async def _monitor_loop_lag(stop: asyncio.Event, lags: List[float]):
+    """Record how late the loop wakes a coroutine sleeping for a fixed interval"""
+    while not stop.is_set():
+        t0 = time.perf_counter()
+        await asyncio.sleep(LAG_SAMPLING_INTERVAL)
+        lags.append(time.perf_counter() - t0 - LAG_SAMPLING_INTERVAL)
+
+
+async def _run_cycle(data_manager, num_events: int):
+    start_time = datetime.now()
+    end_time = start_time + timedelta(days=90)
+    events = await data_manager.get_events(
+        start_time, end_time, max_num_event=num_events
+    )
+
+    async def _process(event: Event):
+        await data_manager.get_event(event.event_id)
+        await data_manager.update_event(
+            event.event_id, {"processed_at": datetime.now()}
+        )
+
+    await asyncio.gather(*[_process(event) for event in events])
+    return len(events)
+
+
+async def benchmark(name: str, data_manager, num_events: int, repeat: int):
+    lags = []
+    wall_times = []
+    stop = asyncio.Event()
+    monitor = asyncio.create_task(_monitor_loop_lag(stop, lags))
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        n_events = await _run_cycle(data_manager, num_events)
+        wall_times.append(time.perf_counter() - t0)
+    stop.set()
+    await monitor
+
+    lags_ms = sorted(lag * 1000 for lag in lags) or [0.0]
+    print(
+        f"{name:>10} | events/cycle {n_events:5d}"
+        f" | cycle wall time median {statistics.median(wall_times) * 1000:8.1f} ms"
+        f" | loop lag p50 {lags_ms[len(lags_ms) // 2]:7.2f} ms"
+        f" p99 {lags_ms[int(len(lags_ms) * 0.99)]:7.2f} ms"
+        f" max {lags_ms[-1]:7.2f} ms"
+    )
+
+
+@app.command()
+def main(num_events: int = 200, repeat: int = 5, seed: bool = True):
+    if not os.getenv("FIRESTORE_EMULATOR_HOST"):
+        raise typer.BadParameter(
+            "FIRESTORE_EMULATOR_HOST is not set, refusing to benchmark a real database"
+        )
+    if seed:
+        seed_events(num_events)
+
+    async def _main():
+        await benchmark("sync", SyncBaseline(PROJECT_ID), num_events, repeat)
+        await benchmark("async", DataManager(PROJECT_ID), num_events, repeat)
+
+    asyncio.run(_main())
+
+
+if __name__ == "__main__":
+    app()
@@ -0,0 +1,113 @@
+"""
+Compare the number of documents read by one agent cycle before and after the
+events and issues got their indexed state fields (see run_migrate_processing_state.py).
+
+"before" replays the previous client-side filtering on the same queries and
+counts the streamed documents, "after" runs the current server-side queries.
+Firestore bills one read per returned document.
+"""
+
+import os
+from datetime import datetime, timedelta
+
+import typer
+from app.data_manager import (
+    EVENT_STATE_PENDING,
+    EVENTS_COLLECTION,
+    ISSUES_COLLECTION,
+    NON_ACTIVE_ISSUE_STATUS,
+    TIME_INTERVAL,
+    is_out_dated,
+)
+from dotenv import load_dotenv
+from google.cloud import firestore
+from google.cloud.firestore_v1.base_query import FieldFilter
+
+load_dotenv()
+
+PROJECT_ID = os.getenv("PROJECT_ID")
+DB_NAME = "ran-guardian-data-manager"
+
+db = firestore.Client(project=PROJECT_ID, database=DB_NAME)
+app = typer.Typer(add_completion=False)
+
+
+def _in_window(collection: str, start_time: datetime, end_time: datetime):
+    return (
+        db.collection(collection)
+        .where(filter=FieldFilter("start_date", ">=", f"{start_time:%Y-%m-%d}"))
+        .where(filter=FieldFilter("start_date", "<=", f"{end_time:%Y-%m-%d}"))
+        .order_by("start_date")
+        .order_by("end_date")
+    )
+
+
+def count_event_reads(start_time, end_time, batch_size):
+    n_before, n_found = 0, 0
+    query = _in_window(EVENTS_COLLECTION, start_time, end_time).select(["issue_id"])
+    for doc in query.stream():
+        n_before += 1
+        if "issue_id" not in doc.to_dict():
+            n_found += 1
+            if n_found >= batch_size:
+                break
+
+    query = (
+        _in_window(EVENTS_COLLECTION, start_time, end_time)
+        .where(filter=FieldFilter("processing_state", "==", EVENT_STATE_PENDING))
+        .select(["start_date"])
+        .limit(batch_size)
+    )
+    n_after = len(list(query.stream()))
+    return n_before, n_after
+
+
+def count_issue_reads(start_time, end_time, batch_size):
+    n_before, n_found = 0, 0
+    query = (
+        _in_window(ISSUES_COLLECTION, start_time, end_time)
+        .order_by("event_size", direction=firestore.Query.DESCENDING)
+        .select(["status", "updated_at"])
+    )
+    for doc in query.stream():
+        n_before += 1
+        issue_data = doc.to_dict()
+        if issue_data.get("status") in NON_ACTIVE_ISSUE_STATUS:
+            continue
+        time_updated = issue_data.get("updated_at")
+        if time_updated and not is_out_dated(time_updated, TIME_INTERVAL):
+            continue
+        n_found += 1
+        if n_found >= batch_size:
+            break
+
+    query = (
+        _in_window(ISSUES_COLLECTION, start_time, end_time)
+        .order_by("event_size", direction=firestore.Query.DESCENDING)
+        .where(filter=FieldFilter("is_active", "==", True))
+        .where(filter=FieldFilter("next_eval_at", "<=", datetime.now()))
+        .order_by("next_eval_at")
+        .select(["start_date"])
+        .limit(batch_size)
+    )
+    n_after = len(list(query.stream()))
+    return n_before, n_after
+
+
+@app.command()
+def main(lookforward_days: int = 90, batch_size: int = 10):
+    start_time = datetime.now()
+    end_time = start_time + timedelta(days=lookforward_days)
+    for name, count_reads in [
+        ("events", count_event_reads),
+        ("issues", count_issue_reads),
+    ]:
+        n_before, n_after = count_reads(start_time, end_time, batch_size)
+        print(
+            f"{name}: {n_before} documents read before, {n_after} after"
+            f" (batch size {batch_size}, {lookforward_days} days look forward)"
+        )
+
+
+if __name__ == "__main__":
+    app()
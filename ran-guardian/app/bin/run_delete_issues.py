@@ -3,7 +3,12 @@ import os
 from datetime import datetime
 from typing import Optional
 
-from app.data_manager import EVENTS_COLLECTION, ISSUES_COLLECTION, check_date
+from app.data_manager import (
+    EVENT_STATE_PENDING,
+    EVENTS_COLLECTION,
+    ISSUES_COLLECTION,
+    check_date,
+)
 from dotenv import load_dotenv
 from event_scout.firestore_helper import db as origin_db
 from google.cloud import firestore
@@ -34,7 +39,12 @@ def delete_all_issues_from_db(
         if event_id:
             event = db.collection(EVENTS_COLLECTION).document(event_id)
             if event.get().exists:
-                event.update({"issue_id": firestore.DELETE_FIELD})
+                event.update(
+                    {
+                        "issue_id": firestore.DELETE_FIELD,
+                        "processing_state": EVENT_STATE_PENDING,
+                    }
+                )
         doc.reference.delete()
         n_docs += 1
     print(f"deleted {n_docs} events from new events db")
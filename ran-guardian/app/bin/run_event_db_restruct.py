@@ -3,7 +3,7 @@ import os
 from datetime import datetime
 from typing import Optional
 
-from app.data_manager import EVENTS_COLLECTION, check_date
+from app.data_manager import EVENT_STATE_PENDING, EVENTS_COLLECTION, check_date
 from dotenv import load_dotenv
 from event_scout.firestore_helper import db as origin_db
 from google.cloud import firestore
@@ -47,6 +47,7 @@ def save_event_to_new_db(event_data: dict, event_id: str):
     if event_ref.exists:
         event_ref.update(event_data)
     else:
+        event_data["processing_state"] = EVENT_STATE_PENDING
         _, doc_ref = new_db.collection(EVENTS_COLLECTION).add(
             document_data=event_data, document_id=event_id
         )
@@ -0,0 +1,92 @@
+"""
+Backfill the indexed state fields used by the agent queries on existing documents:
+`processing_state` on events, `is_active` and `next_eval_at` on issues.
+
+The agent queries need the following composite indexes:
+
+    gcloud firestore indexes composite create --database=ran-guardian-data-manager \
+        --collection-group=events-dev \
+        --field-config=field-path=processing_state,order=ascending \
+        --field-config=field-path=start_date,order=ascending \
+        --field-config=field-path=end_date,order=ascending
+
+    gcloud firestore indexes composite create --database=ran-guardian-data-manager \
+        --collection-group=issues-dev \
+        --field-config=field-path=is_active,order=ascending \
+        --field-config=field-path=start_date,order=ascending \
+        --field-config=field-path=end_date,order=ascending \
+        --field-config=field-path=event_size,order=descending \
+        --field-config=field-path=next_eval_at,order=ascending
+"""
+
+import os
+from datetime import datetime, timedelta
+
+from app.data_manager import (
+    EVENT_STATE_PENDING,
+    EVENT_STATE_PROCESSED,
+    EVENTS_COLLECTION,
+    ISSUES_COLLECTION,
+    TIME_INTERVAL,
+    get_issue_state_fields,
+)
+from dotenv import load_dotenv
+from google.cloud import firestore
+from tqdm import tqdm
+
+load_dotenv()
+
+PROJECT_ID = os.getenv("PROJECT_ID")
+DB_NAME = "ran-guardian-data-manager"
+MAX_BATCH_WRITES = 500
+
+db = firestore.Client(project=PROJECT_ID, database=DB_NAME)
+
+
+def migrate_events():
+    batch = db.batch()
+    n_docs = 0
+    for doc in tqdm(db.collection(EVENTS_COLLECTION).select(["issue_id"]).stream()):
+        if doc.to_dict().get("issue_id"):
+            processing_state = EVENT_STATE_PROCESSED
+        else:
+            processing_state = EVENT_STATE_PENDING
+        batch.update(doc.reference, {"processing_state": processing_state})
+        n_docs += 1
+        if n_docs % MAX_BATCH_WRITES == 0:
+            batch.commit()
+            batch = db.batch()
+    batch.commit()
+    return n_docs
+
+
+def migrate_issues():
+    batch = db.batch()
+    n_docs = 0
+    issues_stream = (
+        db.collection(ISSUES_COLLECTION)
+        .select(["status", "created_at", "updated_at"])
+        .stream()
+    )
+    for doc in tqdm(issues_stream):
+        issue_data = doc.to_dict()
+        if issue_data.get("updated_at"):
+            next_eval_at = issue_data["updated_at"] + timedelta(minutes=TIME_INTERVAL)
+        else:
+            next_eval_at = issue_data.get("created_at") or datetime.now()
+        batch.update(
+            doc.reference,
+            get_issue_state_fields(next_eval_at, issue_data.get("status")),
+        )
+        n_docs += 1
+        if n_docs % MAX_BATCH_WRITES == 0:
+            batch.commit()
+            batch = db.batch()
+    batch.commit()
+    return n_docs
+
+
+if __name__ == "__main__":
+    n_events = migrate_events()
+    n_issues = migrate_issues()
+    print(f"Added state fields to {n_events} events and {n_issues} issues")
@@ -0,0 +1,42 @@
+"""
+Recount the issues per status and the events per size, and overwrite the
+materialized counters read by `/issues_stats` and `/event_stats`.
+
+The backend does this periodically (see `STATS_RECONCILE_INTERVAL`), but never at
+startup; run it by hand after bulk edits that bypass the counters, or to
+initialise them:
+
+    poetry run python -m app.bin.run_reconcile_stats
+"""
+
+import asyncio
+import os
+
+import typer
+from app.data_manager import DataManager
+from dotenv import load_dotenv
+
+load_dotenv()
+
+PROJECT_ID = os.getenv("PROJECT_ID")
+
+app = typer.Typer(add_completion=False)
+
+
+@app.command()
+def main(issues: bool = True, events: bool = True):
+    async def _main():
+        data_manager = DataManager(project_id=PROJECT_ID)
+        try:
+            if issues:
+                print(f"issues: {await data_manager.reconcile_issue_stats()}")
+            if events:
+                print(f"events: {await data_manager.reconcile_event_stats()}")
+        finally:
+            await data_manager.close()
+
+    asyncio.run(_main())
+
+
+if __name__ == "__main__":
+    app()
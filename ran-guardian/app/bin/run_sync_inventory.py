@@ -0,0 +1,48 @@
+"""
+Sync the local inventory snapshot with the `ran_guardian.inventory` BigQuery table.
+
+The snapshot is an uncompressed Arrow IPC file (`INVENTORY_SNAPSHOT_PATH`) that
+the backend and the events explorer memory-map instead of querying BigQuery. A
+sync downloads nothing when the table is unchanged, and only the modified rows
+when `INVENTORY_UPDATED_COLUMN` is set. `--parquet` also writes a Parquet copy
+for batch analysis.
+
+    poetry run python -m app.bin.run_sync_inventory [--full] [--parquet inventory.parquet]
+"""
+
+import os
+import time
+from typing import Optional
+
+import pyarrow.parquet as pq
+import typer
+from app.inventory_snapshot import INVENTORY_SNAPSHOT_PATH, sync_inventory_snapshot
+from dotenv import load_dotenv
+from google.cloud import bigquery
+
+load_dotenv()
+
+PROJECT_ID = os.getenv("PROJECT_ID")
+
+app = typer.Typer(add_completion=False)
+
+
+@app.command()
+def main(
+    path: str = INVENTORY_SNAPSHOT_PATH,
+    full: bool = False,
+    parquet: Optional[str] = None,
+):
+    bq_client = bigquery.Client(project=PROJECT_ID, location="europe-west3")
+    t0 = time.perf_counter()
+    table = sync_inventory_snapshot(bq_client, path, full=full)
+    print(
+        f"{table.num_rows} sites in {path}, synced in {time.perf_counter() - t0:.1f} s"
+    )
+    if parquet:
+        pq.write_table(table, parquet)
+        print(f"Parquet copy written to {parquet}")
+
+
+if __name__ == "__main__":
+    app()
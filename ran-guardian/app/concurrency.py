@@ -0,0 +1,145 @@
+"""
+Adaptive concurrency limits of the agent's stages.
+
+An `AdaptiveLimiter` admits up to `limit` concurrent calls and adjusts the limit
+with AIMD (additive increase, multiplicative decrease), as TCP does with its
+congestion window: every window of `limit` healthy calls raises the limit by
+one, an overloaded call (rate limited, timed out or slower than the latency
+target) cuts it by `decrease_factor`. Calls started before the last cut do not
+cut it again, so that a burst of 429s counts as a single overload. Waiting calls
+are admitted from the highest priority down, in arrival order among equals.
+"""
+
+import asyncio
+import heapq
+import itertools
+import time
+from contextlib import asynccontextmanager
+from typing import Dict, Optional
+
+from llm.rate_limiter import count_rate_limits, is_rate_limit_error
+
+
+def is_overload_error(exc: BaseException) -> bool:
+    """Timeouts and 429 answers"""
+    if isinstance(exc, (asyncio.TimeoutError, TimeoutError)):
+        return True
+    return is_rate_limit_error(exc)
+
+
+class AdaptiveLimiter:
+    def __init__(
+        self,
+        name: str,
+        initial_limit: int,
+        min_limit: int = 1,
+        max_limit: int = 64,
+        latency_target: float = 60.0,
+        decrease_factor: float = 0.5,
+    ):
+        """
+        `latency_target` is in seconds. A call during which the LLM rate limiter
+        saw a 429 counts as overloaded, even when the error was handled below the
+        limiter.
+        """
+        self.name = name
+        self.limit = float(initial_limit)
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.latency_target = latency_target
+        self.decrease_factor = decrease_factor
+        self.in_flight = 0
+        self._waiters = []  # heap of (-priority, arrival, future)
+        self._arrivals = itertools.count()
+        self._last_decrease = 0.0
+        self.successes = 0
+        self.overloads = 0
+        self.errors = 0
+        self.avg_latency: Optional[float] = None
+
+    async def acquire(self, priority: float = 0.0):
+        """Takes a free slot, or waits for one in priority order. A released slot
+        is handed over to the waiter it wakes up, so that a newcomer cannot take
+        it before that waiter resumes."""
+        self._drop_cancelled()
+        if self.in_flight < int(self.limit) and not self._waiters:
+            self.in_flight += 1
+            return
+        waiter = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, (-priority, next(self._arrivals), waiter))
+        try:
+            await waiter
+        except asyncio.CancelledError:
+            # a cancelled waiter stays in the heap, skipped once popped, unless
+            # it was handed a slot already
+            if waiter.done() and not waiter.cancelled():
+                self.release()
+            raise
+
+    def release(self):
+        self.in_flight -= 1
+        self._wake()
+
+    def _drop_cancelled(self):
+        while self._waiters and self._waiters[0][-1].done():
+            heapq.heappop(self._waiters)
+
+    def _wake(self):
+        while self.in_flight < int(self.limit) and self._waiters:
+            _, _, waiter = heapq.heappop(self._waiters)
+            if not waiter.done():
+                self.in_flight += 1
+                waiter.set_result(None)
+
+    @asynccontextmanager
+    async def slot(self, priority: float = 0.0):
+        """Holds a slot for the duration of the block and feeds its outcome back
+        into the limit"""
+        await self.acquire(priority)
+        start = time.monotonic()
+        overloaded = False
+        failed = False
+        try:
+            # only the 429s of this call, not those of the other stages
+            with count_rate_limits() as rate_limits:
+                yield
+        except Exception as e:
+            overloaded = is_overload_error(e)
+            failed = True
+            raise
+        finally:
+            latency = time.monotonic() - start
+            overloaded = (
+                overloaded or latency > self.latency_target or rate_limits[0] > 0
+            )
+            self._on_done(start, latency, overloaded, failed)
+            self.release()
+
+    def _on_done(self, start: float, latency: float, overloaded: bool, failed: bool):
+        self.avg_latency = (
+            latency
+            if self.avg_latency is None
+            else 0.9 * self.avg_latency + 0.1 * latency
+        )
+        if overloaded:
+            self.overloads += 1
+            if start >= self._last_decrease:
+                self.limit = max(self.min_limit, self.limit * self.decrease_factor)
+                self._last_decrease = time.monotonic()
+        elif failed:
+            self.errors += 1
+        else:
+            self.successes += 1
+            self.limit = min(self.max_limit, self.limit + 1 / self.limit)
+
+    def stats(self) -> Dict:
+        return {
+            "name": self.name,
+            "limit": int(self.limit),
+            "in_flight": self.in_flight,
+            "waiting": sum(not waiter.done() for _, _, waiter in self._waiters),
+            "successes": self.successes,
+            "overloads": self.overloads,
+            "errors": self.errors,
+            "avg_latency": self.avg_latency,
+        }
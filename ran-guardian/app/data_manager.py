@@ -1,12 +1,18 @@
+import asyncio
+import base64
+import binascii
 import json
 import logging
 import os
 import pickle
 from datetime import datetime, timedelta, timezone
-from typing import Dict, List, Optional, Tuple
+from typing import AsyncIterator, Dict, List, Optional, Tuple
 
-import numpy as np
-import requests
+import httpx
+import pyarrow as pa
+from app.inventory import InventoryIndex
+from app.inventory_snapshot import sync_inventory_snapshot
+from app.kpi_cache import KpiCache
 from app.models import (
     AgentHistory,
     Alarm,
@@ -23,23 +29,75 @@ from app.models import (
     StateSnapshot,
     Task,
 )
-from event_scout.firestore_helper import db as EVENT_DB
-from event_scout.firestore_helper import get_locations
+from app.performance_series import PerformanceSeries
+from app.scheduler import by_priority, issue_priority
 from google.cloud import bigquery, firestore, storage
-from google.cloud.firestore_v1 import aggregation
 from google.cloud.firestore_v1.base_query import FieldFilter
-from tqdm import tqdm
 
 logger = logging.getLogger(__name__)
 
 MOCK_DATA_SERVER_URL = os.getenv("MOCK_DATA_SERVER_URL")
+# connections kept open to the mock data server, this also bounds the number of
+# concurrent KPI / alarm requests (the others wait for a free connection)
+MOCK_DATA_MAX_CONNECTIONS = int(os.getenv("MOCK_DATA_MAX_CONNECTIONS", 20))
+MOCK_DATA_TIMEOUT = httpx.Timeout(30.0, connect=5.0, pool=None)
+# bulk exports are streamed for as long as the KPIs are generated
+MOCK_DATA_EXPORT_TIMEOUT = httpx.Timeout(None, connect=5.0)
+# KPI names of the mock data server -> PerformanceData fields
+MOCK_PERFORMANCE_FIELDS = {
+    "Max_RRC_Conn_User": "rrc_max_users",
+    "RRC_Estab_SR_pct": "rrc_setup_sr_pct",
+    "eRAB_SSR_Data_pct": "erab_ssr_volte_pct",
+    "eRAB_SSR_VoLTE_pct": "erab_ssr_data_pct",
+    "Traffic_Data_Vol_DL_MiB": "download_throughput",
+    "Traffic_Data_Vol_UL_MiB": "upload_throughput",
+}
 TIME_INTERVAL = int(os.getenv("TIME_INTERVAL"))
 MAX_NUM_EVENTS = int(os.getenv("MAX_NUM_EVENTS", 10))
 MAX_NUM_ISSUES = int(os.getenv("MAX_NUM_ISSUES", 10))
+# issues read per issue requested for analysis, the highest priority ones are kept
+ISSUE_CANDIDATE_FACTOR = int(os.getenv("ISSUE_CANDIDATE_FACTOR", 5))
 MAX_NUM_NODE_PER_EVENT = int(os.getenv("MAX_NUM_NODE_PER_EVENT", 10))
+# number of (nearest) sites whose nodes are assessed for an event
+MAX_NUM_SITE_PER_EVENT = 2
+# KPI cache: TIME_INTERVAL buckets kept per node, and caps before evicting nodes
+KPI_CACHE_BUCKETS = int(os.getenv("KPI_CACHE_BUCKETS", 96))
+KPI_CACHE_MAX_NODES = int(os.getenv("KPI_CACHE_MAX_NODES", 10000))
+KPI_CACHE_MAX_RECORDS = int(os.getenv("KPI_CACHE_MAX_RECORDS", 200000))
+FIREBASE_DB_NAME = os.getenv("FIREBASE_DB_NAME")
+# number of document references sent in a single BatchGetDocuments request
+FIRESTORE_BATCH_GET_SIZE = 100
+# fields the issue and event listings are ordered on, which page tokens point into.
+# "__name__" (document id) keeps the order total, its direction follows the
+# last ordered field (event_size descending for the issue listing, next_eval_at
+# ascending for the actionable issues) so that the composite indexes apply
+ISSUE_ORDER_FIELDS = ["start_date", "end_date", "event_size", "__name__"]
+EVENT_ORDER_FIELDS = ["start_date", "end_date", "__name__"]
+
+# indexed state fields maintained on every write, so that the agent cycles only
+# read actionable documents:
+# - events carry a `processing_state`, "processed" once an issue was created
+# - issues carry `is_active` (status still handled by the agent) and
+#   `next_eval_at` (time from which the issue is due for a new evaluation)
+EVENT_STATE_PENDING = "pending"
+EVENT_STATE_PROCESSED = "processed"
+NON_ACTIVE_ISSUE_STATUS = [
+    IssueStatus.PENDING_APPROVAL,
+    IssueStatus.ESCALATE,
+    IssueStatus.RESOLVED,
+]
+
+# materialized statistics: issue counters per status live in STATS_COLLECTION,
+# event counters per size live next to `num_events` in the event scout's
+# "locations/0_stats" document (maintained by event_scout.firestore_helper)
+ISSUE_STATS_DOC = "issues"
+EVENT_STATS_DOC = "0_stats"
+EVENT_SIZES = ["S", "M", "L", "XL"]
+STATS_RECONCILE_CONCURRENCY = 50
 
 ISSUES_COLLECTION = "issues-dev"
 EVENTS_COLLECTION = "events-dev"
+STATS_COLLECTION = "stats-dev"
 # ISSUES_COLLECTION = "issues"
 
 
@@ -77,6 +135,77 @@ def check_date(
     return res
 
 
+def encode_page_token(doc, order_fields: List[str]) -> str:
+    """Builds an opaque continuation token pointing right after `doc`"""
+    doc_data = doc.to_dict()
+    cursor = {
+        field: doc.id if field == "__name__" else doc_data.get(field)
+        for field in order_fields
+    }
+    return base64.urlsafe_b64encode(json.dumps(cursor).encode("utf-8")).decode("ascii")
+
+
+def decode_page_token(page_token: str) -> Dict:
+    """Turns a continuation token back into a `start_after` cursor"""
+    try:
+        cursor = json.loads(base64.urlsafe_b64decode(page_token.encode("ascii")))
+    except (ValueError, binascii.Error) as e:
+        raise ValueError(f"Invalid page token: {page_token}") from e
+    if not isinstance(cursor, dict):
+        raise ValueError(f"Invalid page token: {page_token}")
+    return cursor
+
+
+def get_issue_state_fields(
+    next_eval_at: datetime, status: Optional[str] = None
+) -> Dict:
+    """Returns the indexed state fields of an issue, `is_active` only when the status is known"""
+    state_fields = {"next_eval_at": next_eval_at}
+    if status is not None:
+        state_fields["is_active"] = status not in NON_ACTIVE_ISSUE_STATUS
+    return state_fields
+
+
+def get_event_state_fields(updates: Dict) -> Dict:
+    """Returns the `processing_state` matching an update of the event's `issue_id`"""
+    if "issue_id" not in updates:
+        return {}
+    if updates["issue_id"] in (None, firestore.DELETE_FIELD):
+        return {"processing_state": EVENT_STATE_PENDING}
+    return {"processing_state": EVENT_STATE_PROCESSED}
+
+
+def _status_value(status) -> Optional[str]:
+    if status is None:
+        return None
+    try:
+        return IssueStatus(status).value
+    except ValueError:
+        return str(status)
+
+
+def get_status_counter_updates(old_status, new_status) -> Dict:
+    """Returns the increments moving an issue from one status counter to another"""
+    old_status, new_status = _status_value(old_status), _status_value(new_status)
+    if old_status == new_status:
+        return {}
+    counters = {}
+    if old_status:
+        counters[old_status] = firestore.Increment(-1)
+    if new_status:
+        counters[new_status] = firestore.Increment(1)
+    return {"by_status": counters}
+
+
+def _to_performance_data(d: Dict) -> PerformanceData:
+    """Maps a record of the mock data server to the app's model"""
+    return PerformanceData(
+        node_id=d["node_id"],
+        timestamp=d["timestamp"],
+        **{field: d[name] for name, field in MOCK_PERFORMANCE_FIELDS.items()},
+    )
+
+
 def is_out_dated(doc_time: datetime, time_interval: int):
     if doc_time.tzinfo:
         time_threshold = datetime.now(timezone.utc) - timedelta(minutes=time_interval)
@@ -88,12 +217,113 @@ def is_out_dated(doc_time: datetime, time_interval: int):
 class DataManager:
     def __init__(self, project_id: str, manager_db: str = "ran-guardian-data-manager"):
         logger.info("[DataManager.__init__]: start ...")
-        self.manager_db = firestore.Client(project=project_id, database=manager_db)
+        # AsyncClient keeps Firestore round trips off the event loop, so that the
+        # agent cycles, SSE streams and health checks can interleave with them
+        self.manager_db = firestore.AsyncClient(project=project_id, database=manager_db)
         self.bq_client = bigquery.Client(project=project_id, location="europe-west3")
         self.bq_event_db_name = f"{project_id}.events_db_de.people_events"
-        self.event_db = EVENT_DB
+        self.event_db = firestore.AsyncClient(
+            project=project_id, database=FIREBASE_DB_NAME
+        )
+        self.storage_client = storage.Client(project=project_id)
+        # one pooled client, so that KPI and alarm fetches reuse keep-alive
+        # connections and run concurrently without blocking the loop
+        self.http_client = httpx.AsyncClient(
+            base_url=MOCK_DATA_SERVER_URL or "",
+            timeout=MOCK_DATA_TIMEOUT,
+            limits=httpx.Limits(
+                max_connections=MOCK_DATA_MAX_CONNECTIONS,
+                max_keepalive_connections=MOCK_DATA_MAX_CONNECTIONS,
+            ),
+        )
+        # loaded on first use and then replaced by `refresh_inventory`
+        self.inventory: Optional[InventoryIndex] = None
+        self._inventory_lock = asyncio.Lock()
+        self.kpi_cache = KpiCache(
+            self._fetch_performance_data,
+            interval=TIME_INTERVAL,
+            buckets_per_node=KPI_CACHE_BUCKETS,
+            max_nodes=KPI_CACHE_MAX_NODES,
+            max_records=KPI_CACHE_MAX_RECORDS,
+        )
         logger.info("[DataManager.__init__]: finished with data manager initialized")
 
+    async def close(self):
+        """Release the gRPC channels and HTTP sessions held by the clients"""
+        logger.info("[DataManager.close]: start ...")
+        for client in (self.manager_db, self.event_db):
+            # firestore clients expose no public close(), their transport is only
+            # created on first use
+            firestore_api = client._firestore_api_internal
+            if firestore_api is not None:
+                await firestore_api.transport.close()
+        self.bq_client.close()
+        await self.http_client.aclose()
+        self.storage_client.close()
+        logger.info("[DataManager.close]: finished with clients closed")
+
+    async def _get_all(self, doc_refs: List) -> Dict:
+        """Batch reads documents, returns the existing ones keyed by document path"""
+        chunks = [
+            doc_refs[i : i + FIRESTORE_BATCH_GET_SIZE]
+            for i in range(0, len(doc_refs), FIRESTORE_BATCH_GET_SIZE)
+        ]
+
+        async def _read_chunk(chunk):
+            return [doc async for doc in self.manager_db.get_all(chunk)]
+
+        # chunks are read concurrently, so the whole batch costs a single round trip
+        results = await asyncio.gather(*[_read_chunk(chunk) for chunk in chunks])
+        return {
+            doc.reference.path: doc for docs in results for doc in docs if doc.exists
+        }
+
+    async def _write_issue(
+        self, issue_ref, issue_data: Optional[Dict], create: bool = False
+    ):
+        """Writes (or deletes, when `issue_data` is None) an issue and moves its
+        status counter within the same transaction"""
+        stats_ref = self.manager_db.collection(STATS_COLLECTION).document(
+            ISSUE_STATS_DOC
+        )
+
+        @firestore.async_transactional
+        async def _write(transaction):
+            snapshot = await issue_ref.get(transaction=transaction)
+            old_status = snapshot.to_dict().get("status") if snapshot.exists else None
+            if issue_data is None:
+                transaction.delete(issue_ref)
+                new_status = None
+            elif create:
+                transaction.set(issue_ref, issue_data)
+                new_status = issue_data.get("status")
+            else:
+                transaction.update(issue_ref, issue_data)
+                new_status = issue_data.get("status", old_status)
+            counter_updates = get_status_counter_updates(old_status, new_status)
+            if counter_updates:
+                transaction.set(stats_ref, counter_updates, merge=True)
+
+        await _write(self.manager_db.transaction())
+
+    async def _stream_page(
+        self,
+        query,
+        order_fields: List[str],
+        page_size: Optional[int] = None,
+        page_token: Optional[str] = None,
+    ) -> Tuple[List, Optional[str]]:
+        """Reads one page of an ordered query, returns the documents and the token of the next page"""
+        if page_token:
+            query = query.start_after(decode_page_token(page_token))
+        if page_size:
+            query = query.limit(page_size)
+        docs = [doc async for doc in query.stream()]
+        next_page_token = None
+        if page_size and len(docs) == page_size:
+            next_page_token = encode_page_token(docs[-1], order_fields)
+        return docs, next_page_token
+
     # -------------------
     # Issue management
     # -------------------
@@ -104,21 +334,58 @@ class DataManager:
         end_time: Optional[datetime] = None,
         max_num_issues: Optional[int] = None,
     ) -> List[Issue]:
-        logger.info("[get_issues]: start ...")
+        issues, _ = await self.get_issues_page(start_time, end_time, max_num_issues)
+        return issues
+
+    async def get_issues_page(
+        self,
+        start_time: Optional[datetime] = None,
+        end_time: Optional[datetime] = None,
+        max_num_issues: Optional[int] = None,
+        page_token: Optional[str] = None,
+    ) -> Tuple[List[Issue], Optional[str]]:
+        """Retrieves one page of issues and the token of the next page, if any"""
+        logger.info("[get_issues_page]: start ...")
         issues_ref = self._filter_issues_on_dates(start_time, end_time)
+        docs, next_page_token = await self._stream_page(
+            issues_ref, ISSUE_ORDER_FIELDS, max_num_issues, page_token
+        )
         issues = []
-        for doc in issues_ref.stream():
+        for doc in docs:
             issue = Issue.from_firestore_doc(doc)
             if issue:
                 issues.append(issue)
-            if max_num_issues and len(issues) >= max_num_issues:
-                break
+        logger.info(f"[get_issues_page]: finished with {len(issues)} issues retrieved")
+        return issues, next_page_token
+
+    async def get_issues_with_events(
+        self,
+        start_time: Optional[datetime] = None,
+        end_time: Optional[datetime] = None,
+        max_num_issues: Optional[int] = None,
+        page_token: Optional[str] = None,
+    ) -> Tuple[List[Tuple[Issue, Optional[Event]]], Optional[str]]:
+        """Retrieves a page of issues along with their events, the events are read in one batch"""
+        logger.info("[get_issues_with_events]: start ...")
+        issues, next_page_token = await self.get_issues_page(
+            start_time=start_time,
+            end_time=end_time,
+            max_num_issues=max_num_issues,
+            page_token=page_token,
+        )
+        events = await self.get_events_by_ids(
+            [issue.event_id for issue in issues if issue.event_id]
+        )
         logger.info(
-            f"[get_issues_for_analysis]: finished with {len(issues)} issues retrieved"
+            f"[get_issues_with_events]: finished with {len(issues)} issues and {len(events)} events retrieved"
         )
-        return issues
+        return [
+            (issue, events.get(issue.event_id)) for issue in issues
+        ], next_page_token
 
-    def _filter_issues_on_dates(self, start_time: datetime, end_time: datetime):
+    def _filter_issues_on_dates(
+        self, start_time: datetime, end_time: datetime, actionable_only: bool = False
+    ):
         issues_ref = self.manager_db.collection(ISSUES_COLLECTION)
 
         if start_time:
@@ -136,6 +403,18 @@ class DataManager:
             .order_by("end_date")
             .order_by("event_size", direction=firestore.Query.DESCENDING)
         )
+        if actionable_only:
+            # active issues which have not been evaluated within the last TIME_INTERVAL
+            issues_ref = (
+                issues_ref.where(filter=FieldFilter("is_active", "==", True))
+                .where(filter=FieldFilter("next_eval_at", "<=", datetime.now()))
+                .order_by("next_eval_at")
+                .order_by("__name__")
+            )
+        else:
+            issues_ref = issues_ref.order_by(
+                "__name__", direction=firestore.Query.DESCENDING
+            )
         return issues_ref
 
     async def get_issues_for_analysis(
@@ -144,47 +423,48 @@ class DataManager:
         end_time: Optional[datetime] = None,
         max_num_issues: Optional[int] = None,
     ) -> List[Issue]:
-        """Retrieves all issue data from Firestore and returns a list of Issues."""
+        """Retrieves the issues due for analysis from Firestore and returns a list of
+        Issues, from the highest priority down. With `max_num_issues`, they are
+        the highest priority ones of a larger set of candidates."""
         logger.info("[get_issues_for_analysis]: start ...")
-        issues_ref = self._filter_issues_on_dates(start_time, end_time)
+        issues_ref = self._filter_issues_on_dates(
+            start_time, end_time, actionable_only=True
+        )
+        if max_num_issues:
+            issues_ref = issues_ref.limit(max_num_issues * ISSUE_CANDIDATE_FACTOR)
 
         issues = []
-        non_active_status = [
-            IssueStatus.PENDING_APPROVAL,
-            IssueStatus.ESCALATE,
-            IssueStatus.RESOLVED,
-        ]
-        for doc in issues_ref.stream():
-            if doc.get("status") in non_active_status:
-                continue
-            time_updated = doc.get("updated_at")
-            if time_updated and not is_out_dated(time_updated, TIME_INTERVAL):
-                # skip the issues which have just been evalutate
-                continue
+        async for doc in issues_ref.stream():
             issue = Issue.from_firestore_doc(doc)
             if issue:
                 issues.append(issue)
-            if max_num_issues and len(issues) >= max_num_issues:
-                break
+        issues = self.sort_issues(issues, now=start_time, max_num_issues=max_num_issues)
         logger.info(
             f"[get_issues_for_analysis]: finished with {len(issues)} issues retrieved"
         )
         return issues
 
-    async def sort_issues(self):
+    def sort_issues(
+        self,
+        issues: List[Issue],
+        now: Optional[datetime] = None,
+        max_num_issues: Optional[int] = None,
+    ) -> List[Issue]:
         """
-        sort the issues based on their start and end date,
+        sort the issues from the highest priority down (see app.scheduler): time to
+        event start, event size, risk level, number of problematic nodes and time
+        since the last evaluation
         """
-        logger.info("[sort_issues]: start ...")
-        # sorting logic to be implemented
-        logger.info("[sort_issues]: finished with issues sorting logic not implemented")
-        pass
+        now = now or datetime.now()
+        return by_priority(
+            issues, lambda issue: issue_priority(issue, now), n=max_num_issues
+        )
 
     async def get_issue(self, issue_id: str) -> Optional[Issue]:
         """Retrieves issue data from Firestore"""
         logger.info(f"[get_issue]: start ...")
         issue_ref = self.manager_db.collection(ISSUES_COLLECTION).document(issue_id)
-        doc = issue_ref.get()
+        doc = await issue_ref.get()
         if not doc or not doc.exists:
             logger.info(f"[get_issue]: finished with issue {issue_id} not found")
             return None
@@ -212,7 +492,7 @@ class DataManager:
         event.issue_id = issue_id
 
         issue_ref = self.manager_db.collection(ISSUES_COLLECTION).document(issue_id)
-        doc = issue_ref.get()
+        doc = await issue_ref.get()
 
         if doc.exists:
             # this should never be called since we skip all the events with an issue already created.
@@ -239,8 +519,9 @@ class DataManager:
             issue_data["start_date"] = event.start_date.strftime("%Y-%m-%d")
             issue_data["end_date"] = event.end_date.strftime("%Y-%m-%d")
             issue_data["event_size"] = convert_size_into_number(event.size)
+            issue_data.update(get_issue_state_fields(now_time, issue.status))
 
-            issue_ref.set(issue_data)
+            await self._write_issue(issue_ref, issue_data, create=True)
             logger.info(f"[create_issue]: finished with issue {issue_id} created")
 
         return issue_ref.id
@@ -251,7 +532,13 @@ class DataManager:
         issue_ref = self.manager_db.collection(ISSUES_COLLECTION).document(
             issue.issue_id
         )
-        issue_ref.set(issue.model_dump())
+        issue_data = issue.model_dump()
+        if issue.updated_at:
+            next_eval_at = issue.updated_at + timedelta(minutes=TIME_INTERVAL)
+        else:
+            next_eval_at = issue.created_at
+        issue_data.update(get_issue_state_fields(next_eval_at, issue.status))
+        await self._write_issue(issue_ref, issue_data, create=True)
         logger.info(
             f"[create_issue_from_model]: finished with issue {issue.issue_id} created from model"
         )
@@ -259,9 +546,8 @@ class DataManager:
 
     async def delete_issue(self, issue_id: str):
         logger.info(f"[delete_issue]: start ...")
-        await self.manager_db.collection(ISSUES_COLLECTION).document(
-            issue_id
-        ).delete()  # added await
+        issue_ref = self.manager_db.collection(ISSUES_COLLECTION).document(issue_id)
+        await self._write_issue(issue_ref, None)
         logger.info(f"[delete_issue]: finished with issue {issue_id} deleted")
 
     async def update_issue(self, issue: str | Issue, updates: Dict) -> bool:
@@ -273,26 +559,55 @@ class DataManager:
 
         logger.info(f"[update_issue]: start ...")
         updates["updated_at"] = datetime.now()
+        updates.update(
+            get_issue_state_fields(
+                updates["updated_at"] + timedelta(minutes=TIME_INTERVAL),
+                updates.get("status"),
+            )
+        )
         issue_ref = self.manager_db.collection(ISSUES_COLLECTION).document(issue_id)
-        issue_ref.update(updates)
+        if "status" in updates:
+            # status transitions also move the materialized status counters
+            await self._write_issue(issue_ref, updates)
+        else:
+            await issue_ref.update(updates)
         logger.info(f"[update_issue]: finished with issue {issue_id} updated")
         return True
 
     async def get_issue_stats(self) -> Dict:
         """Retrieves statistics on the number of issues for each status."""
         logger.info("[get_issue_stats]: start ...")
-        stats = {}
+        doc = (
+            await self.manager_db.collection(STATS_COLLECTION)
+            .document(ISSUE_STATS_DOC)
+            .get()
+        )
+        counters = (doc.to_dict() or {}).get("by_status", {}) if doc.exists else {}
+        stats = {status.value: counters.get(status.value, 0) for status in IssueStatus}
+
+        logger.info(
+            f"[get_issue_stats]: finished with stats for {len(IssueStatus)} issue statuses retrieved"
+        )
+        return stats
+
+    async def reconcile_issue_stats(self) -> Dict:
+        """Recounts the issues of each status and overwrites the materialized counters"""
+        logger.info("[reconcile_issue_stats]: start ...")
         issues_ref = self.manager_db.collection(ISSUES_COLLECTION)
-        for status in IssueStatus:
+
+        async def _count(status: IssueStatus) -> int:
             query = issues_ref.where(filter=FieldFilter("status", "==", status.value))
-            aggregate_query = aggregation.AggregationQuery(query)
             # `alias` to provides a key for accessing the aggregate query results
-            aggregate_query.count(alias="all")
-            results = aggregate_query.get()
-            stats[status.value] = results[0][0].value
-
+            results = await query.count(alias="all").get()
+            return results[0][0].value
+
+        counts = await asyncio.gather(*[_count(status) for status in IssueStatus])
+        stats = {status.value: count for status, count in zip(IssueStatus, counts)}
+        await self.manager_db.collection(STATS_COLLECTION).document(
+            ISSUE_STATS_DOC
+        ).set({"by_status": stats}, merge=True)
         logger.info(
-            f"[get_issue_stats]: finished with stats for {len(IssueStatus)} issue statuses retrieved"
+            f"[reconcile_issue_stats]: finished with {sum(counts)} issues recounted"
         )
         return stats
 
@@ -301,23 +616,46 @@ class DataManager:
     # -------------------
 
     async def get_event_stats(self) -> Dict:
-        """Retrieves statistics on the number of issues for each status."""
-        logger.info("[get_issue_stats]: start ...")
-        all_sizes = ["S", "M", "L", "XL"]
-        stats = {size: 0 for size in all_sizes}
-        locations = await self.get_all_locations()
-        for location in tqdm(locations):
-            issues_ref = self.event_db.collection(location)
-            for size in all_sizes:
-                query = issues_ref.where(filter=FieldFilter("size", "==", size))
-                aggregate_query = aggregation.AggregationQuery(query)
+        """Retrieves statistics on the number of events for each size."""
+        logger.info("[get_event_stats]: start ...")
+        doc = (
+            await self.event_db.collection("locations").document(EVENT_STATS_DOC).get()
+        )
+        counters = (doc.to_dict() or {}).get("by_size", {}) if doc.exists else {}
+        stats = {size: counters.get(size, 0) for size in EVENT_SIZES}
+
+        logger.info(
+            f"[get_event_stats]: finished with stats for {len(EVENT_SIZES)} event sizes retrieved"
+        )
+        return stats
+
+    async def reconcile_event_stats(self) -> Dict:
+        """Recounts the events of each size across all locations and overwrites the
+        materialized counters. This runs 4 count queries per location."""
+        logger.info("[reconcile_event_stats]: start ...")
+        semaphore = asyncio.Semaphore(STATS_RECONCILE_CONCURRENCY)
+
+        async def _count(location: str, size: str) -> int:
+            async with semaphore:
+                query = self.event_db.collection(location).where(
+                    filter=FieldFilter("size", "==", size)
+                )
                 # `alias` to provides a key for accessing the aggregate query results
-                aggregate_query.count(alias="all")
-                results = aggregate_query.get()
-                stats[size] += results[0][0].value
+                results = await query.count(alias="all").get()
+                return results[0][0].value
 
+        locations = await self.get_all_locations()
+        stats = {}
+        for size in EVENT_SIZES:
+            counts = await asyncio.gather(
+                *[_count(location, size) for location in locations]
+            )
+            stats[size] = sum(counts)
+        await self.event_db.collection("locations").document(EVENT_STATS_DOC).set(
+            {"by_size": stats}, merge=True
+        )
         logger.info(
-            f"[get_issue_stats]: finished with stats for {len(IssueStatus)} issue statuses retrieved"
+            f"[reconcile_event_stats]: finished with {len(locations)} locations recounted"
         )
         return stats
 
@@ -335,7 +673,7 @@ class DataManager:
         query = events_ref
 
         all_events = []
-        for doc in query.stream():
+        async for doc in query.stream():
             # We only collect events whose start and end dates are well formated
             if check_date(doc.get("start_date"), start_time, end_time) & check_date(
                 doc.get("end_date"), start_time, end_time
@@ -358,6 +696,46 @@ class DataManager:
         max_num_event: Optional[int] = None,
     ):
         logger.info("[get_events]: start ...")
+        # we only ask for those which don't have an issue yet
+        event_collection = self._filter_events_on_dates(start_time, end_time).where(
+            filter=FieldFilter("processing_state", "==", EVENT_STATE_PENDING)
+        )
+        if max_num_event:
+            event_collection = event_collection.limit(max_num_event)
+
+        events = []
+        async for doc in event_collection.stream():
+            try:
+                event = Event.from_firestore_doc(doc.id, doc.to_dict())
+                events.append(event)
+            except Exception as e:
+                logger.error(f"parsing event got error {e}")
+        logger.info(f"[get_events]: finished with {len(events)} events retrieved")
+        return events
+
+    async def get_events_page(
+        self,
+        start_time: Optional[datetime] = None,
+        end_time: Optional[datetime] = None,
+        max_num_event: Optional[int] = MAX_NUM_EVENTS,
+        page_token: Optional[str] = None,
+    ) -> Tuple[List[Event], Optional[str]]:
+        """Retrieves one page of events, processed or not, and the token of the next page"""
+        logger.info("[get_events_page]: start ...")
+        event_collection = self._filter_events_on_dates(start_time, end_time)
+        docs, next_page_token = await self._stream_page(
+            event_collection, EVENT_ORDER_FIELDS, max_num_event, page_token
+        )
+        events = []
+        for doc in docs:
+            try:
+                events.append(Event.from_firestore_doc(doc.id, doc.to_dict()))
+            except Exception as e:
+                logger.error(f"parsing event got error {e}")
+        logger.info(f"[get_events_page]: finished with {len(events)} events retrieved")
+        return events, next_page_token
+
+    def _filter_events_on_dates(self, start_time: datetime, end_time: datetime):
         event_collection = self.manager_db.collection(EVENTS_COLLECTION)
         if start_time:
             start_time_str = start_time.strftime("%Y-%m-%d")
@@ -369,27 +747,17 @@ class DataManager:
             event_collection = event_collection.where(
                 filter=FieldFilter("start_date", "<=", end_time_str)
             )  # we can only filter on the same field , i.e. start date due to firestore query limits
-        event_collection = event_collection.order_by("start_date").order_by("end_date")
-
-        events = []
-        for doc in event_collection.stream():
-            # we skip those which already has an issue_id
-            if "issue_id" in doc.to_dict():
-                continue
-            try:
-                event = Event.from_firestore_doc(doc.id, doc.to_dict())
-                events.append(event)
-                if max_num_event and (len(events) >= max_num_event):
-                    break
-            except Exception as e:
-                logger.error(f"parsing event got error {e}")
-        logger.info(f"[get_events]: finished with {len(events)} events retrieved")
-        return events
+        event_collection = (
+            event_collection.order_by("start_date")
+            .order_by("end_date")
+            .order_by("__name__")
+        )
+        return event_collection
 
     async def get_event(self, event_id: str) -> Optional[Event]:
         logger.info(f"[get_event]: start ...")
         event_ref = self.manager_db.collection(EVENTS_COLLECTION).document(event_id)
-        doc = event_ref.get()
+        doc = await event_ref.get()
         if doc.exists:
             event = Event.from_firestore_doc(doc.id, doc.to_dict())
             logger.info(f"[get_event]: finished with event {event_id} retrieved")
@@ -397,10 +765,29 @@ class DataManager:
         logger.info(f"[get_event]: finished with event {event_id} not found")
         return None
 
+    async def get_events_by_ids(self, event_ids: List[str]) -> Dict[str, Event]:
+        """Retrieves events with a batch read, returns the found ones keyed by id"""
+        logger.info(f"[get_events_by_ids]: start ...")
+        event_collection = self.manager_db.collection(EVENTS_COLLECTION)
+        docs = await self._get_all(
+            [event_collection.document(event_id) for event_id in set(event_ids)]
+        )
+        events = {}
+        for doc in docs.values():
+            try:
+                events[doc.id] = Event.from_firestore_doc(doc.id, doc.to_dict())
+            except Exception as e:
+                logger.error(f"parsing event got error {e}")
+        logger.info(
+            f"[get_events_by_ids]: finished with {len(events)} of {len(event_ids)} events retrieved"
+        )
+        return events
+
     async def update_event(self, event_id: str, updates: Dict) -> bool:
         logger.info(f"[update_event]: start ...")
+        updates.update(get_event_state_fields(updates))
         event_ref = self.manager_db.collection(EVENTS_COLLECTION).document(event_id)
-        event_ref.update(updates)
+        await event_ref.update(updates)
         logger.info(f"[update_event]: finished with event {event_id} updated")
         return True
 
@@ -410,7 +797,7 @@ class DataManager:
         stats = {}
         events_ref = self.manager_db.collection(EVENTS_COLLECTION)
         event_count = 0
-        for doc in events_ref.stream():  # Stream for potentially large datasets
+        async for doc in events_ref.stream():  # Stream for potentially large datasets
             event_type = doc.to_dict().get("status", "new")
             stats[event_type] = stats.get(event_type, 0) + 1
             event_count += 1
@@ -426,50 +813,96 @@ class DataManager:
     async def get_performance_data(
         self, node_id: str, n_record: int = 4
     ) -> List[PerformanceData]:
-        # TODO: need to be able to retrieve data for a list of node
         logger.debug(f"[get_performance_data]: start ...")
-
-        # Using the mock data generator
-        end_time = datetime.now()
-        start_time = end_time - timedelta(minutes=n_record * int(TIME_INTERVAL))
+        perf = (await self.get_performance_data_bulk([node_id], n_record))[node_id]
+        logger.debug(
+            f"[get_performance_data]: finished with {len(perf)} performance data records retrieved for node {node_id}"
+        )
+        return perf
+
+    async def get_performance_data_bulk(
+        self, node_ids: List[str], n_record: int = 4
+    ) -> Dict[str, List[PerformanceData]]:
+        """Same as `get_performance_data` for many nodes, keyed by node id. Records
+        are served from the KPI cache, only the buckets it misses are fetched"""
+        logger.debug(f"[get_performance_data_bulk]: start ...")
+        try:
+            perf = await self.kpi_cache.get(node_ids, n_record)
+        except httpx.HTTPError as e:
+            logger.exception("Error fetching performance data")
+            perf = {node_id: [] for node_id in node_ids}
+        logger.debug(
+            f"[get_performance_data_bulk]: finished with performance data records retrieved for {len(perf)} nodes"
+        )
+        return perf
+
+    async def _fetch_performance_data(
+        self, node_ids: List[str], start_time: datetime, end_time: datetime
+    ) -> Dict[str, List[PerformanceData]]:
+        """Fetches the records of many nodes with a single request, keyed by node
+        id"""
+        perf = {node_id: [] for node_id in node_ids}
+        async for record in self.iter_performance_data(node_ids, start_time, end_time):
+            perf.setdefault(record.node_id, []).append(record)
+        return perf
+
+    async def iter_performance_data(
+        self, node_ids: List[str], start_time: datetime, end_time: datetime
+    ) -> AsyncIterator[PerformanceData]:
+        """Records of many nodes between two timestamps, yielded as they arrive
+        from the NDJSON stream of the mock data server"""
         payload = {
-            "node_id": node_id,
+            "node_ids": node_ids,
+            "start_time": start_time.isoformat(),
+            "end_time": end_time.isoformat(),
+        }
+        async for d in self._iter_ndjson("/performances/batch", payload):
+            yield _to_performance_data(d)
+
+    async def _iter_ndjson(self, url: str, payload: Dict) -> AsyncIterator[Dict]:
+        """Records of an NDJSON response of the mock data server, parsed line by
+        line while the body is received, so that it is never buffered whole"""
+        async with self.http_client.stream(
+            "POST", url, json=payload, params={"format": "ndjson"}
+        ) as response:
+            response.raise_for_status()
+            async for line in response.aiter_lines():
+                if line:
+                    yield json.loads(line)
+
+    async def get_performance_series(
+        self, node_ids: List[str], start_time: datetime, end_time: datetime
+    ) -> PerformanceSeries:
+        """Records of many nodes over a long time range (load tests, offline
+        analysis), from the Arrow export of the mock data server. The series
+        arrays point into the response body instead of going through one model
+        per record"""
+        logger.debug(f"[get_performance_series]: start ...")
+        payload = {
+            "node_ids": node_ids,
             "start_time": start_time.isoformat(),
             "end_time": end_time.isoformat(),
         }
-
-        url = MOCK_DATA_SERVER_URL + "/performances"
-        headers = {"Content-Type": "application/json"}
-        perf = []
-
         try:
-            response = requests.post(
-                url, headers=headers, data=json.dumps(payload), timeout=30
-            )
-            if response.status_code == 200:
-                data = json.loads(response.content)
-                for d in data:
-                    perf.append(
-                        PerformanceData(
-                            node_id=d["node_id"],
-                            timestamp=d["timestamp"],
-                            rrc_max_users=d["Max_RRC_Conn_User"],
-                            rrc_setup_sr_pct=d["RRC_Estab_SR_pct"],
-                            erab_ssr_volte_pct=d["eRAB_SSR_Data_pct"],
-                            erab_ssr_data_pct=d["eRAB_SSR_VoLTE_pct"],
-                            download_throughput=d["Traffic_Data_Vol_DL_MiB"],
-                            upload_throughput=d["Traffic_Data_Vol_UL_MiB"],
-                        )
-                    )
-            else:
-                pass  # handled in the finally block
-        except requests.exceptions.RequestException as e:
-            logger.exception(f"Error fetching performance data from {url}")
-        finally:
-            logger.debug(
-                f"[get_performance_data]: finished with {len(perf)} performance data records retrieved for node {node_id}"
+            response = await self.http_client.post(
+                "/performances/export",
+                json=payload,
+                params={"format": "arrow"},
+                timeout=MOCK_DATA_EXPORT_TIMEOUT,
             )
-            return perf
+            response.raise_for_status()
+        except httpx.HTTPError as e:
+            logger.exception("Error fetching performance data")
+            return PerformanceSeries.from_records([])
+        table = pa.ipc.open_stream(pa.py_buffer(response.content)).read_all()
+        table = table.rename_columns(
+            [MOCK_PERFORMANCE_FIELDS.get(name, name) for name in table.column_names]
+        )
+        series = PerformanceSeries.from_arrow(table)
+        logger.debug(
+            f"[get_performance_series]: finished with {len(series)} performance data records retrieved for {len(node_ids)} nodes"
+        )
+        return series
 
     # -------------------
     # Alarm data
@@ -481,20 +914,12 @@ class DataManager:
             "node_id": site_id,
         }
 
-        url = MOCK_DATA_SERVER_URL + "/alarms"
-        headers = {"Content-Type": "application/json"}
+        url = "/alarms"
         alarms = []
         try:
-            response = requests.post(
-                url, headers=headers, data=json.dumps(payload), timeout=30
-            )
-            if response.status_code == 200:
-                data = json.loads(response.content)
-                for d in data:
-                    alarms.append(Alarm(**d))
-            else:
-                pass  # handled in finally block
-        except requests.exceptions.RequestException as e:
+            async for d in self._iter_ndjson(url, payload):
+                alarms.append(Alarm(**d))
+        except httpx.HTTPError as e:
             logger.exception(f"Error fetching alarm data from {url}")
         finally:
             logger.debug(
@@ -502,6 +927,30 @@ class DataManager:
             )
             return alarms
 
+    async def get_alarms_bulk(self, site_ids: List[str]) -> Dict[str, List[Alarm]]:
+        """Same as `get_alarms` for many sites with a single request, keyed by site
+        id. Each site is requested once, however many of its nodes are listed"""
+        logger.debug(f"[get_alarms_bulk]: start ...")
+        site_ids = list(dict.fromkeys(site_ids))
+        alarms = {site_id: [] for site_id in site_ids}
+        try:
+            async for alarm in self.iter_alarms(site_ids):
+                alarms.setdefault(alarm.node_id, []).append(alarm)
+        except httpx.HTTPError as e:
+            logger.exception(f"Error fetching alarm data from /alarms/batch")
+        logger.debug(
+            f"[get_alarms_bulk]: finished with alarms retrieved for {len(site_ids)} sites"
+        )
+        return alarms
+
+    async def iter_alarms(self, site_ids: List[str]) -> AsyncIterator[Alarm]:
+        """Alarms of many sites, yielded as they arrive from the NDJSON stream of
+        the mock data server"""
+        if not site_ids:
+            return
+        async for d in self._iter_ndjson("/alarms/batch", {"node_ids": site_ids}):
+            yield Alarm(**d)
+
         ...
         # time range is now to the next
 
@@ -509,52 +958,36 @@ class DataManager:
     # Node data
     # -------------------
 
+    async def refresh_inventory(self) -> InventoryIndex:
+        """Syncs the local inventory snapshot with BigQuery and swaps in a new
+        spatial index"""
+        logger.info("[refresh_inventory]: start ...")
+
+        def _load():
+            return InventoryIndex.from_table(sync_inventory_snapshot(self.bq_client))
+
+        # the query and the index build are blocking, keep them off the event loop
+        self.inventory = await asyncio.to_thread(_load)
+        logger.info(
+            f"[refresh_inventory]: finished with {len(self.inventory)} sites indexed"
+        )
+        return self.inventory
+
+    async def get_inventory(self) -> InventoryIndex:
+        if self.inventory is None:
+            async with self._inventory_lock:
+                if self.inventory is None:
+                    await self.refresh_inventory()
+        return self.inventory
+
     async def get_nearby_site(
         self, location: Location, radius: int = 300
     ) -> list[Site]:
-        """Get node IDs near a specific location"""
+        """Get sites near a specific location"""
 
         logger.info("[get_nearby_site]: start ...")
-        QUERY = """
-        SELECT
-        MS_MSRBS_STO_KNG AS site_id,
-        CELLS_4G,
-        ST_X(GEO_COORDINATES) AS longitude,
-        ST_Y(GEO_COORDINATES) AS latitude,
-        MS_MSRBS_HERSTELLER
-        FROM
-        `de1000-dev-mwc-ran-agent.ran_guardian.inventory`
-        WHERE
-        ST_DISTANCE(
-            GEO_COORDINATES, -- Replace longitude and latitude with your table's column names
-            ST_GEOGPOINT({lng}, {lat}) -- Replace with your target longitude and latitude (e.g., Chicago)
-        ) <= {radius} -- 5000 meters = 5 kilometers
-        AND CELLS_4G IS NOT NULL ;
-        """
-        formatted_query = QUERY.format(
-            lng=location.longitude, lat=location.latitude, radius=radius
-        )
-        query_job = self.bq_client.query(formatted_query)  # API request
-        df = query_job.to_dataframe()
-        node_ids_list = df["CELLS_4G"].apply(
-            lambda x: x.replace("[", "").replace("]", "").replace("'", "").split(", ")
-        )
-        sites = []
-        site_ids = df["site_id"].to_list()
-        for node_ids, site_id in zip(node_ids_list, site_ids):
-            sites.append(
-                Site(
-                    site_id=site_id,
-                    nodes=[
-                        NodeData(
-                            node_id=node_id,
-                            site_id=site_id,
-                            capacity=np.random.randint(100, 500),
-                        )
-                        for node_id in node_ids
-                    ],
-                )
-            )
+        inventory = await self.get_inventory()
+        sites = inventory.nearby_sites(location, radius)
         logger.info(f"[get_nearby_site]: finished with {len(sites)} sites retrieved")
         return sites
 
@@ -564,47 +997,39 @@ class DataManager:
         """Get node IDs near a specific location"""
 
         logger.info("[get_nearby_nodes]: start ...")
-        QUERY = """
-        SELECT
-        MS_MSRBS_STO_KNG AS site_id,
-        CELLS_4G,
-        ST_X(GEO_COORDINATES) AS longitude,
-        ST_Y(GEO_COORDINATES) AS latitude,
-        MS_MSRBS_HERSTELLER
-        FROM
-        `de1000-dev-mwc-ran-agent.ran_guardian.inventory`
-        WHERE
-        ST_DISTANCE(
-            GEO_COORDINATES, -- Replace longitude and latitude with your table's column names
-            ST_GEOGPOINT({lng}, {lat}) -- Replace with your target longitude and latitude (e.g., Chicago)
-        ) <= {radius} -- 5000 meters = 5 kilometers
-        AND CELLS_4G IS NOT NULL
-        LIMIT 2;
-        """
-        formatted_query = QUERY.format(
-            lng=location.longitude, lat=location.latitude, radius=radius
-        )
-        query_job = self.bq_client.query(formatted_query)  # API request
-        df = query_job.to_dataframe()
-        node_ids_list = df["CELLS_4G"].apply(
-            lambda x: x.replace("[", "").replace("]", "").replace("'", "").split(", ")
-        )
-        nodes = []
-        site_ids = df["site_id"].to_list()
-        for node_ids, site_id in zip(node_ids_list, site_ids):
-            for node_id in node_ids:
-                nodes.append(
-                    NodeData(
-                        node_id=node_id,
-                        site_id=site_id,
-                        capacity=np.random.randint(100, 500),
-                    )  # mock the capacity for now
-                )
+        inventory = await self.get_inventory()
+        nodes = inventory.nearby_nodes(
+            location, radius, max_sites=MAX_NUM_SITE_PER_EVENT
+        )
         if MAX_NUM_NODE_PER_EVENT:
             nodes = nodes[:MAX_NUM_NODE_PER_EVENT]
         logger.info(f"[get_nearby_nodes]: finished with {len(nodes)} nodes retrieved")
         return nodes
 
+    async def get_nearby_nodes_batch(
+        self, events: List[Event], radius: int = 300
+    ) -> Dict[str, List[NodeData]]:
+        """Get the nodes near each event with a single spatial join, keyed by
+        event id"""
+
+        logger.info("[get_nearby_nodes_batch]: start ...")
+        inventory = await self.get_inventory()
+        nodes_by_event = inventory.nearby_nodes_batch(
+            [event.location for event in events],
+            radius,
+            max_sites=MAX_NUM_SITE_PER_EVENT,
+        )
+        event_nodes = {
+            event.event_id: (
+                nodes[:MAX_NUM_NODE_PER_EVENT] if MAX_NUM_NODE_PER_EVENT else nodes
+            )
+            for event, nodes in zip(events, nodes_by_event)
+        }
+        logger.info(
+            f"[get_nearby_nodes_batch]: finished with nodes retrieved for {len(events)} events"
+        )
+        return event_nodes
+
     # -------------------
     # Agent state management
     # -------------------
@@ -623,7 +1048,7 @@ class DataManager:
         bucket_name = os.environ.get("BUCKET_NAME")
         checkpoints_location = os.environ.get("CHECKPOINTS_LOCATION")
 
-        client = storage.Client()
+        client = self.storage_client
         bucket = client.bucket(bucket_name)
         snapshot_blob = bucket.blob(
             f"{checkpoints_location}/{issue_id}_{node_id}_snapshot.pkl"
@@ -651,7 +1076,7 @@ class DataManager:
     async def load_agent_snapshot(self, issue_id: str, node_id: str) -> StateSnapshot:
         """Retrieves a saved agent state if it exists, otherwise returns None"""
         logger.info(f"[load_agent_snapshot]: start ...")
-        client = storage.Client()
+        client = self.storage_client
 
         bucket_name = os.environ.get("BUCKET_NAME")
         checkpoints_location = os.environ.get("CHECKPOINTS_LOCATION")
@@ -679,7 +1104,7 @@ class DataManager:
     ) -> Optional[AgentHistory]:
         """Retrieves a saved agent state if it exists, otherwise returns None"""
         logger.info(f"[load_agent_history]: start ...")
-        client = storage.Client()
+        client = self.storage_client
 
         bucket_name = os.environ.get("BUCKET_NAME")
         checkpoints_location = os.environ.get("CHECKPOINTS_LOCATION")
@@ -718,7 +1143,7 @@ class DataManager:
 
     async def get_all_locations(self):
         docs = self.event_db.collection("locations").stream()
-        locations = [doc.id for doc in docs if doc.id != "0_stats"]
+        locations = [doc.id async for doc in docs if doc.id != "0_stats"]
         return sorted(locations)
 
     async def build_get_issue_response_payload(
@@ -726,21 +1151,39 @@ class DataManager:
     ) -> Dict | None:
         """Build the response payload for the GET issue request by combining event and issue data"""
         logger.info("[build_get_issue_response_payload]: start ...")
-        event = await self.get_event(issue_or_event_id)
+        # issues are created with the id of their event, so both documents are
+        # read in one batch and a second read is only needed when the ids differ
+        event_ref = self.manager_db.collection(EVENTS_COLLECTION).document(
+            issue_or_event_id
+        )
+        issue_ref = self.manager_db.collection(ISSUES_COLLECTION).document(
+            issue_or_event_id
+        )
+        docs = await self._get_all([event_ref, issue_ref])
+        event_doc = docs.get(event_ref.path)
+        issue_doc = docs.get(issue_ref.path)
+        event = (
+            Event.from_firestore_doc(event_doc.id, event_doc.to_dict())
+            if event_doc
+            else None
+        )
         issue = None  # Initialize issue to None in case only event is found at first
 
         if not event:
-            issue = await self.get_issue(issue_or_event_id)
+            issue = Issue.from_firestore_doc(issue_doc) if issue_doc else None
             if not issue:
                 logger.info(
                     f"[build_get_issue_response_payload]: finished with neither issue nor event found for id {issue_or_event_id}"
                 )
                 return None  # Return None as requested when neither issue nor event is found
             event_id = issue.event_id
-            event = await self.get_event(event_id)
+            if event_id != issue_or_event_id:
+                event = await self.get_event(event_id)
         else:
             issue_id = event.issue_id
-            if issue_id:  # Only fetch issue if issue_id exists
+            if issue_id == issue_or_event_id:
+                issue = Issue.from_firestore_doc(issue_doc) if issue_doc else None
+            elif issue_id:  # Only fetch issue if issue_id exists
                 issue = await self.get_issue(issue_id)
 
         payload = {
@@ -751,3 +1194,25 @@ class DataManager:
         }
         logger.info("[build_get_issue_response_payload]: finished with payload created")
         return payload
+
+
+# -------------------
+# Process-wide instance
+# -------------------
+
+_shared_data_manager: Optional[DataManager] = None
+
+
+def get_shared_data_manager() -> DataManager:
+    """Returns the DataManager shared by the API, the agent and the llm helpers"""
+    global _shared_data_manager
+    if _shared_data_manager is None:
+        _shared_data_manager = DataManager(project_id=os.getenv("PROJECT_ID"))
+    return _shared_data_manager
+
+
+async def close_shared_data_manager():
+    global _shared_data_manager
+    if _shared_data_manager is not None:
+        await _shared_data_manager.close()
+        _shared_data_manager = None
@@ -0,0 +1,272 @@
+"""
+In-memory spatial index of the RAN inventory, built from its local snapshot
+(app.inventory_snapshot).
+
+The sites with 4G cells are bucketed on a regular latitude / longitude grid.
+A radius query only looks at the grid cells overlapping the bounding box of the
+circle and then filters the candidates on their great-circle distance, computed
+on the same sphere as BigQuery's `ST_DISTANCE`, so that it returns the sites the
+SQL query used to return.
+"""
+
+import logging
+import math
+from typing import List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+from app.inventory_snapshot import EARTH_RADIUS, haversine_distance
+from app.models import Location, NodeData, Site
+
+logger = logging.getLogger(__name__)
+
+GRID_CELL_SIZE = 0.05  # degrees, about 5.5 km of latitude
+
+
+def explode_cells(cells) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Normalizes `CELLS_4G` values such as "['A1', 'A2']" into an exploded
+    node -> site table, without a Python loop over the rows.
+
+    Returns the CSR offsets of the nodes of each site (the nodes of site `i` are
+    `node_codes[offsets[i]:offsets[i + 1]]`), the integer code of each node and
+    the node ids indexed by code.
+    """
+    cells = (
+        pa.array(cells, type=pa.string()) if not isinstance(cells, pa.Array) else cells
+    )
+    node_lists = pc.split_pattern(
+        pc.replace_substring_regex(cells, pattern=r"[\[\]']", replacement=""),
+        pattern=", ",
+    )
+    offsets = node_lists.offsets.to_numpy().astype(np.int64)
+    offsets -= offsets[0]
+    encoded = pc.dictionary_encode(pc.list_flatten(node_lists))
+    node_codes = encoded.indices.to_numpy(zero_copy_only=False).astype(np.int32)
+    node_ids = encoded.dictionary.to_numpy(zero_copy_only=False)
+    return offsets, node_codes, node_ids
+
+
+class InventoryIndex:
+    """Sites of the inventory bucketed on a latitude / longitude grid, and their
+    nodes as integer-coded arrays"""
+
+    def __init__(
+        self,
+        site_ids,
+        latitudes,
+        longitudes,
+        cells,
+        cell_size: float = GRID_CELL_SIZE,
+    ):
+        self.table: Optional[pa.Table] = None
+        self.site_ids = np.asarray(site_ids, dtype=object)
+        self.latitudes = np.asarray(latitudes, dtype=np.float64)
+        self.longitudes = np.asarray(longitudes, dtype=np.float64)
+        self.node_offsets, self.node_codes, self.node_ids = explode_cells(cells)
+        self.cell_size = cell_size
+        self.n_cols = math.ceil(360 / cell_size)
+
+        keys = self._rows(self.latitudes) * self.n_cols + self._cols(self.longitudes)
+        order = np.argsort(keys, kind="stable")
+        unique_keys, starts = np.unique(keys[order], return_index=True)
+        self._grid = {
+            (key // self.n_cols, key % self.n_cols): indices
+            for key, indices in zip(unique_keys.tolist(), np.split(order, starts[1:]))
+        }
+
+    @classmethod
+    def from_table(
+        cls, table: pa.Table, cell_size: float = GRID_CELL_SIZE
+    ) -> "InventoryIndex":
+        """Builds the index from the rows of `INVENTORY_QUERY` with 4G cells and
+        coordinates"""
+        table = table.filter(
+            pc.and_(
+                pc.is_valid(table["CELLS_4G"]),
+                pc.and_(
+                    pc.is_valid(table["latitude"]), pc.is_valid(table["longitude"])
+                ),
+            )
+        ).combine_chunks()
+        index = cls(
+            table["site_id"].to_numpy(),
+            # zero-copy views on the (memory-mapped) coordinates
+            table["latitude"].to_numpy(),
+            table["longitude"].to_numpy(),
+            table["CELLS_4G"].chunk(0) if table.num_rows else [],
+            cell_size=cell_size,
+        )
+        index.table = table
+        return index
+
+    @classmethod
+    def from_dataframe(
+        cls, df: pd.DataFrame, cell_size: float = GRID_CELL_SIZE
+    ) -> "InventoryIndex":
+        return cls.from_table(
+            pa.Table.from_pandas(df, preserve_index=False), cell_size=cell_size
+        )
+
+    def __len__(self) -> int:
+        return len(self.site_ids)
+
+    def _rows(self, latitudes):
+        return np.floor(np.asarray(latitudes) / self.cell_size).astype(np.int64)
+
+    def _cols(self, longitudes):
+        cols = np.floor((np.asarray(longitudes) + 180) / self.cell_size)
+        return cols.astype(np.int64) % self.n_cols
+
+    def _candidates(self, lat: float, lng: float, radius: float) -> np.ndarray:
+        """Indices of the sites in the grid cells covering the circle's bounding box"""
+        dlat = math.degrees(radius / EARTH_RADIUS)
+        max_abs_lat = min(abs(lat) + dlat, 90.0)
+        cos_lat = math.cos(math.radians(max_abs_lat))
+        if max_abs_lat >= 90.0 or radius >= EARTH_RADIUS * cos_lat * math.pi:
+            # the circle covers a pole or wraps around the globe
+            cols = range(self.n_cols)
+        else:
+            dlng = math.degrees(radius / (EARTH_RADIUS * cos_lat))
+            col_min, col_max = self._cols([lng - dlng, lng + dlng]).tolist()
+            if col_max < col_min:  # crosses the antimeridian
+                col_max += self.n_cols
+            cols = [col % self.n_cols for col in range(col_min, col_max + 1)]
+        row_min, row_max = self._rows([lat - dlat, lat + dlat]).tolist()
+
+        buckets = [
+            self._grid[(row, col)]
+            for row in range(row_min, row_max + 1)
+            for col in cols
+            if (row, col) in self._grid
+        ]
+        if not buckets:
+            return np.empty(0, dtype=np.int64)
+        return np.concatenate(buckets)
+
+    def query_radius(self, location: Location, radius: float) -> np.ndarray:
+        """Indices of the sites within `radius` meters, nearest first"""
+        lat, lng = location.latitude, location.longitude
+        candidates = self._candidates(lat, lng, radius)
+        distances = haversine_distance(
+            lat, lng, self.latitudes[candidates], self.longitudes[candidates]
+        )
+        within = distances <= radius
+        candidates, distances = candidates[within], distances[within]
+        return candidates[np.argsort(distances, kind="stable")]
+
+    def query_radius_batch(
+        self,
+        locations: List[Location],
+        radius: float,
+        max_sites: Optional[int] = None,
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """Spatial join of many locations with the sites: pairs of (location
+        position, site index) within `radius` meters, grouped by location and
+        nearest first, keeping at most `max_sites` sites per location"""
+        lats = np.array([location.latitude for location in locations])
+        lngs = np.array([location.longitude for location in locations])
+        candidates = [
+            self._candidates(lat, lng, radius)
+            for lat, lng in zip(lats.tolist(), lngs.tolist())
+        ]
+        pair_sites = np.concatenate([np.empty(0, dtype=np.int64), *candidates])
+        pair_locations = np.repeat(
+            np.arange(len(locations)), [len(c) for c in candidates]
+        )
+        # a single distance computation for the candidates of all the locations
+        distances = haversine_distance(
+            lats[pair_locations],
+            lngs[pair_locations],
+            self.latitudes[pair_sites],
+            self.longitudes[pair_sites],
+        )
+        within = distances <= radius
+        pair_locations, pair_sites = pair_locations[within], pair_sites[within]
+        order = np.lexsort((distances[within], pair_locations))
+        pair_locations, pair_sites = pair_locations[order], pair_sites[order]
+        if max_sites is not None:
+            # rank of each pair within its location's group
+            starts = np.searchsorted(pair_locations, pair_locations, side="left")
+            kept = np.arange(len(pair_locations)) - starts < max_sites
+            pair_locations, pair_sites = pair_locations[kept], pair_sites[kept]
+        return pair_locations, pair_sites
+
+    def site_nodes(self, sites: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """Node codes of the given sites, and the site of each node"""
+        starts, ends = self.node_offsets[sites], self.node_offsets[sites + 1]
+        counts = ends - starts
+        node_sites = np.repeat(sites, counts)
+        # position of each node in its site's range, added to the range start
+        ranks = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+        return self.node_codes[np.repeat(starts, counts) + ranks], node_sites
+
+    def query_nodes(
+        self, location: Location, radius: float, max_sites: Optional[int] = None
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """Node codes of the `max_sites` nearest sites within `radius` meters, and
+        the site of each node"""
+        return self.site_nodes(self.query_radius(location, radius)[:max_sites])
+
+    def to_node_data(
+        self, node_codes: np.ndarray, node_sites: np.ndarray
+    ) -> List[NodeData]:
+        capacities = np.random.randint(100, 500, size=len(node_codes))  # mocked
+        return [
+            NodeData(node_id=node_id, site_id=site_id, capacity=capacity)
+            for node_id, site_id, capacity in zip(
+                self.node_ids[node_codes].tolist(),
+                self.site_ids[node_sites].tolist(),
+                capacities.tolist(),
+            )
+        ]
+
+    def nearby_sites(
+        self, location: Location, radius: float, max_sites: Optional[int] = None
+    ) -> List[Site]:
+        sites = self.query_radius(location, radius)[:max_sites]
+        node_codes, node_sites = self.site_nodes(sites)
+        nodes = self.to_node_data(node_codes, node_sites)
+        counts = self.node_offsets[sites + 1] - self.node_offsets[sites]
+        return [
+            Site(
+                site_id=self.site_ids[i],
+                name=self.site_ids[i],
+                location=Location(
+                    latitude=self.latitudes[i], longitude=self.longitudes[i]
+                ),
+                nodes=nodes[end - count : end],
+            )
+            for i, end, count in zip(
+                sites.tolist(), np.cumsum(counts).tolist(), counts.tolist()
+            )
+        ]
+
+    def nearby_nodes(
+        self, location: Location, radius: float, max_sites: Optional[int] = None
+    ) -> List[NodeData]:
+        return self.to_node_data(*self.query_nodes(location, radius, max_sites))
+
+    def nearby_nodes_batch(
+        self,
+        locations: List[Location],
+        radius: float,
+        max_sites: Optional[int] = None,
+    ) -> List[List[NodeData]]:
+        """Nodes near each of the locations, in the order of `locations`"""
+        pair_locations, pair_sites = self.query_radius_batch(
+            locations, radius, max_sites
+        )
+        nodes_by_location = [[] for _ in locations]
+        node_codes, node_sites = self.site_nodes(pair_sites)
+        # site_nodes keeps the order of the pairs, so this maps nodes to locations
+        node_locations = np.repeat(
+            pair_locations,
+            self.node_offsets[pair_sites + 1] - self.node_offsets[pair_sites],
+        )
+        for i, node in zip(
+            node_locations.tolist(), self.to_node_data(node_codes, node_sites)
+        ):
+            nodes_by_location[i].append(node)
+        return nodes_by_location
@@ -0,0 +1,198 @@
+"""
+Local snapshot of the RAN inventory.
+
+The inventory (site id, coordinates, vendor and `CELLS_4G` node list of every
+site) is exported through the BigQuery Storage Read API into an uncompressed
+Arrow IPC file. Readers memory-map that file, so opening it is zero-copy, and
+later syncs only pull the rows that changed.
+
+The snapshot holds every site, with or without 4G cells: the agent's node index
+(app.inventory) keeps the sites with 4G cells, the events explorer shows them
+all. This module only depends on pyarrow, numpy and BigQuery, so that the
+explorer can use it without the agent's dependencies.
+"""
+
+import logging
+import os
+import tempfile
+from datetime import datetime
+from typing import Optional
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
+from google.cloud import bigquery
+
+logger = logging.getLogger(__name__)
+
+EARTH_RADIUS = 6371008.8  # meters, sphere used by BigQuery geography functions
+
+INVENTORY_TABLE = "de1000-dev-mwc-ran-agent.ran_guardian.inventory"
+INVENTORY_SNAPSHOT_PATH = os.getenv(
+    "INVENTORY_SNAPSHOT_PATH",
+    os.path.join(tempfile.gettempdir(), "ran_guardian_inventory.arrow"),
+)
+# TIMESTAMP column of the inventory holding the last modification of a row, when
+# set syncs only pull the rows modified since the previous sync
+INVENTORY_UPDATED_COLUMN = os.getenv("INVENTORY_UPDATED_COLUMN")
+
+INVENTORY_QUERY = """
+SELECT
+MS_MSRBS_STO_KNG AS site_id,
+CELLS_4G,
+ST_X(GEO_COORDINATES) AS longitude,
+ST_Y(GEO_COORDINATES) AS latitude,
+MS_MSRBS_HERSTELLER{updated_column}
+FROM
+`{table}`{condition} ;
+"""
+
+# keys of the snapshot schema metadata
+TABLE_MODIFIED_KEY = b"table_modified"
+WATERMARK_KEY = b"watermark"
+VERSION_KEY = b"version"
+# bumped when the rows or columns of INVENTORY_QUERY change, so that older
+# snapshots are exported again (2: sites without 4G cells included)
+SNAPSHOT_VERSION = b"2"
+
+
+def haversine_distance(lat, lng, lats, lngs) -> np.ndarray:
+    """Great-circle distances in meters between (arrays of) points"""
+    lat, lng = np.radians(lat), np.radians(lng)
+    lats, lngs = np.radians(lats), np.radians(lngs)
+    a = (
+        np.sin((lats - lat) / 2) ** 2
+        + np.cos(lat) * np.cos(lats) * np.sin((lngs - lng) / 2) ** 2
+    )
+    return 2 * EARTH_RADIUS * np.arcsin(np.sqrt(np.minimum(a, 1.0)))
+
+
+def load_inventory_snapshot(path: str = INVENTORY_SNAPSHOT_PATH) -> pa.Table:
+    """Opens the snapshot memory-mapped, its buffers are read lazily from disk"""
+    return pa.ipc.open_file(pa.memory_map(path, "r")).read_all()
+
+
+def write_inventory_snapshot(
+    table: pa.Table, path: str = INVENTORY_SNAPSHOT_PATH
+) -> None:
+    # write next to the snapshot and rename, so that readers never see a partial
+    # file and the tables they already mapped stay valid; a unique temporary
+    # file per writer, as the agent and the explorer may sync at the same time
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(
+        dir=directory, prefix=f".{os.path.basename(path)}.", suffix=".tmp"
+    )
+    os.close(fd)
+    try:
+        with pa.OSFile(tmp_path, "wb") as sink:
+            with pa.ipc.new_file(sink, table.schema) as writer:
+                writer.write_table(table)
+        os.chmod(tmp_path, 0o644)  # mkstemp creates it readable by the owner only
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.remove(tmp_path)
+        raise
+
+
+def _read_inventory(
+    bq_client: bigquery.Client,
+    updated_column: Optional[str] = None,
+    since: Optional[datetime] = None,
+) -> pa.Table:
+    condition = f"\nWHERE\n{updated_column} > @since" if since else ""
+    query = INVENTORY_QUERY.format(
+        table=INVENTORY_TABLE,
+        updated_column=f",\n{updated_column} AS updated_at" if updated_column else "",
+        condition=condition,
+    )
+    job_config = bigquery.QueryJobConfig(
+        query_parameters=(
+            [bigquery.ScalarQueryParameter("since", "TIMESTAMP", since)]
+            if since
+            else []
+        )
+    )
+    # results are downloaded in parallel streams through the Storage Read API
+    return (
+        bq_client.query(query, job_config=job_config)
+        .to_arrow(create_bqstorage_client=True)
+        .combine_chunks()
+    )
+
+
+def _upsert(snapshot: pa.Table, changed: pa.Table) -> pa.Table:
+    """Replaces the rows of the sites present in `changed`"""
+    snapshot = snapshot.replace_schema_metadata(None)
+    kept = snapshot.filter(
+        pc.invert(pc.is_in(snapshot["site_id"], value_set=changed["site_id"]))
+    )
+    return pa.concat_tables([kept, changed.cast(snapshot.schema)])
+
+
+def sync_inventory_snapshot(
+    bq_client: bigquery.Client,
+    path: str = INVENTORY_SNAPSHOT_PATH,
+    updated_column: Optional[str] = INVENTORY_UPDATED_COLUMN,
+    full: bool = False,
+) -> pa.Table:
+    """Brings the local snapshot up to date with the BigQuery inventory.
+
+    Nothing is downloaded when the table was not modified since the previous
+    sync. Otherwise only the rows modified since then are pulled when
+    `updated_column` is set, falling back to a full export when rows were
+    deleted (the row counts disagree) or there is no snapshot yet.
+    """
+    logger.info("[sync_inventory_snapshot]: start ...")
+    table_modified = bq_client.get_table(INVENTORY_TABLE).modified.isoformat()
+    snapshot = None
+    if not full and os.path.exists(path):
+        snapshot = load_inventory_snapshot(path)
+    metadata = (snapshot.schema.metadata or {}) if snapshot is not None else {}
+    if metadata.get(VERSION_KEY) != SNAPSHOT_VERSION:
+        snapshot, metadata = None, {}
+
+    if metadata.get(TABLE_MODIFIED_KEY) == table_modified.encode():
+        logger.info("[sync_inventory_snapshot]: finished with snapshot up to date")
+        return snapshot
+
+    table = None
+    if updated_column and WATERMARK_KEY in metadata:
+        since = datetime.fromisoformat(metadata[WATERMARK_KEY].decode())
+        changed = _read_inventory(bq_client, updated_column, since)
+        table = _upsert(snapshot, changed)
+        n_rows = bq_client.query(f"SELECT COUNT(*) FROM `{INVENTORY_TABLE}`").result()
+        if next(iter(n_rows))[0] != table.num_rows:
+            table = None  # rows were deleted, start over
+        else:
+            logger.info(f"[sync_inventory_snapshot]: {changed.num_rows} rows changed")
+    if table is None:
+        table = _read_inventory(bq_client, updated_column)
+
+    metadata = {
+        TABLE_MODIFIED_KEY: table_modified.encode(),
+        VERSION_KEY: SNAPSHOT_VERSION,
+    }
+    if updated_column and table.num_rows:
+        watermark = pc.max(table["updated_at"]).as_py()
+        if watermark is not None:
+            metadata[WATERMARK_KEY] = watermark.isoformat().encode()
+    table = table.replace_schema_metadata(metadata)
+    write_inventory_snapshot(table, path)
+    logger.info(
+        f"[sync_inventory_snapshot]: finished with {table.num_rows} rows in {path}"
+    )
+    return load_inventory_snapshot(path)
+
+
+def sites_within_radius(
+    table: pa.Table, lat: float, lng: float, radius: float
+) -> np.ndarray:
+    """Indices of the rows of the snapshot within `radius` meters of a point,
+    nearest first, with a single vectorized distance computation"""
+    latitudes = table["latitude"].to_numpy(zero_copy_only=False)
+    longitudes = table["longitude"].to_numpy(zero_copy_only=False)
+    # null coordinates are NaN, which is never within the radius
+    distances = haversine_distance(lat, lng, latitudes, longitudes)
+    within = np.flatnonzero(distances <= radius)
+    return within[np.argsort(distances[within], kind="stable")]
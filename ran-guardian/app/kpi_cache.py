@@ -0,0 +1,134 @@
+"""
+In-process cache of the node KPI time series.
+
+KPIs come in one record per node and `TIME_INTERVAL` bucket, and past buckets do
+not change. The cache keeps the latest buckets of each node in a fixed-size ring
+buffer and only fetches the buckets newer than the newest one received, so that
+a bucket the KPI source publishes late is requested again. Idle nodes are
+evicted in least recently used order once the node or record caps are reached.
+"""
+
+import asyncio
+import math
+from collections import OrderedDict, deque
+from datetime import datetime
+from typing import Awaitable, Callable, Dict, List, Optional
+
+from app.models import PerformanceData
+
+# fetches the records of the nodes between two timestamps, keyed by node id
+FetchFunction = Callable[
+    [List[str], datetime, datetime], Awaitable[Dict[str, List[PerformanceData]]]
+]
+
+
+class _NodeBuffer:
+    def __init__(self, size: int):
+        self.records = deque(maxlen=size)  # (bucket, record), oldest first
+        self.fetched_until: Optional[int] = None  # newest bucket received
+
+
+class KpiCache:
+    def __init__(
+        self,
+        fetch: FetchFunction,
+        interval: int,
+        buckets_per_node: int = 96,
+        max_nodes: int = 10000,
+        max_records: int = 200000,
+    ):
+        """
+        `interval` is the bucket size in minutes, `buckets_per_node` the size of
+        the ring buffers and `max_records` the memory cap (a record takes a few
+        hundred bytes).
+        """
+        self._fetch = fetch
+        self.interval = interval * 60
+        self.buckets_per_node = buckets_per_node
+        self.max_nodes = max_nodes
+        self.max_records = max_records
+        self._nodes: OrderedDict[str, _NodeBuffer] = OrderedDict()
+        self.n_records = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def _bucket(self, time: datetime) -> int:
+        return math.floor(time.timestamp() / self.interval)
+
+    def _bucket_start(self, bucket: int) -> datetime:
+        return datetime.fromtimestamp(bucket * self.interval)
+
+    async def get(
+        self, node_ids: List[str], n_record: int, now: Optional[datetime] = None
+    ) -> Dict[str, List[PerformanceData]]:
+        """Records of the last `n_record` buckets of each node, oldest first"""
+        now = now or datetime.now()
+        last = self._bucket(now)
+        first = last - min(n_record, self.buckets_per_node) + 1
+        node_ids = list(dict.fromkeys(node_ids))
+
+        # nodes missing the same buckets are fetched with a single request
+        to_fetch: Dict[int, List[str]] = {}
+        for node_id in node_ids:
+            buffer = self._nodes.get(node_id)
+            start = first
+            if buffer is not None and buffer.fetched_until is not None:
+                start = max(first, buffer.fetched_until + 1)
+            if start <= last:
+                to_fetch.setdefault(start, []).append(node_id)
+            self.hits += start - first
+            self.misses += last - start + 1
+
+        results = await asyncio.gather(
+            *[
+                self._fetch(ids, self._bucket_start(start), now)
+                for start, ids in to_fetch.items()
+            ]
+        )
+        for ids, records in zip(to_fetch.values(), results):
+            for node_id in ids:
+                self._store(node_id, records.get(node_id, []))
+
+        cached = {node_id: self._read(node_id, first, last) for node_id in node_ids}
+        self._evict()
+        return cached
+
+    def _store(self, node_id: str, records: List[PerformanceData]):
+        buffer = self._nodes.get(node_id)
+        if buffer is None:
+            buffer = self._nodes[node_id] = _NodeBuffer(self.buckets_per_node)
+        n_before = len(buffer.records)
+        for record in sorted(records, key=lambda record: record.timestamp):
+            bucket = self._bucket(record.timestamp)
+            if not buffer.records or bucket > buffer.records[-1][0]:
+                buffer.records.append((bucket, record))
+        self.n_records += len(buffer.records) - n_before
+        if buffer.records:
+            buffer.fetched_until = buffer.records[-1][0]
+
+    def _read(self, node_id: str, first: int, last: int) -> List[PerformanceData]:
+        buffer = self._nodes.get(node_id)
+        if buffer is None:
+            return []
+        self._nodes.move_to_end(node_id)
+        return [record for bucket, record in buffer.records if first <= bucket <= last]
+
+    def _evict(self):
+        while self._nodes and (
+            len(self._nodes) > self.max_nodes or self.n_records > self.max_records
+        ):
+            _, buffer = self._nodes.popitem(last=False)
+            self.n_records -= len(buffer.records)
+            self.evictions += 1
+
+    def stats(self) -> Dict:
+        requested = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": self.hits / requested if requested else None,
+            "nodes": len(self._nodes),
+            "records": self.n_records,
+            "evictions": self.evictions,
+        }
@@ -20,13 +20,22 @@ from app.prompts import assess_event_risk, assess_node_risk, recommend_network_c
 from dotenv import load_dotenv
 from google import genai
 from google.api_core import exceptions, retry, retry_async
-from google.genai import types
+from google.genai import errors, types
+from llm.rate_limiter import RateLimiter, estimate_tokens, get_rate_limiter
 from pydantic import BaseModel
 
 load_dotenv()
 logger = logging.getLogger(__name__)
 
 
+def _is_transient_error(exc: Exception) -> bool:
+    """Rate limits and server errors of the genai SDK, which does not raise the
+    google.api_core exceptions"""
+    if isinstance(exc, errors.APIError):
+        return exc.code == 429 or (exc.code or 0) >= 500
+    return retry_async.if_transient_error(exc)
+
+
 class EventRiskEvalResult(BaseModel):
     risk_level: str
     reasoning: str
@@ -43,17 +52,52 @@ class LLMHelper:
         project_id: str = os.environ.get("PROJECT_ID"),
         location: str = os.environ.get("GEMINI_MODEL_LOCATION"),
         model_id: str = os.environ.get("GEMINI_MODEL_NAME"),
+        rate_limiter: Optional[RateLimiter] = None,
     ):
         self.client = genai.Client(vertexai=True, project=project_id, location=location)
         self.model_id = model_id
+        self.rate_limiter = rate_limiter or get_rate_limiter()
+
+    @retry_async.AsyncRetry(
+        predicate=_is_transient_error,
+        initial=8.0,
+        maximum=64.0,
+        multiplier=2.0,
+        timeout=600,
+    )
+    async def _generate_content(
+        self,
+        model: str,
+        config: types.GenerateContentConfig,
+        contents: types.Content,
+    ) -> types.GenerateContentResponse:
+        prompt = "".join(part.text or "" for part in contents.parts)
+        if isinstance(config.system_instruction, str):
+            prompt += config.system_instruction
+        tokens = estimate_tokens(prompt)
+        # the concurrency is bounded by the adaptive limiters of the callers
+        await self.rate_limiter.acquire(model, tokens)
+        try:
+            response = await self.client.aio.models.generate_content(
+                model=model, config=config, contents=contents
+            )
+        except errors.APIError as e:
+            if e.code == 429:
+                await self.rate_limiter.aon_rate_limited(model, e)
+            raise
+        usage = response.usage_metadata
+        if usage and usage.total_token_count:
+            await self.rate_limiter.arecord_usage(
+                model, usage.total_token_count - tokens
+            )
+        return response
 
     async def assess_event_risk(
         self, event: Event, node_summaries: List[NodeSummary]
     ) -> Event:
         total_capacity = sum(node.capacity for node in node_summaries)
-        # todo: add retry logic
         try:
-            response = self.client.models.generate_content(
+            response = await self._generate_content(
                 model=self.model_id,
                 config=types.GenerateContentConfig(
                     system_instruction=assess_event_risk.prompt,
@@ -93,16 +137,9 @@ class LLMHelper:
                 description=msg,
             )
 
-    @retry_async.AsyncRetry(
-        predicate=retry_async.if_transient_error,
-        initial=8.0,
-        maximum=64.0,
-        multiplier=2.0,
-        timeout=600,
-    )
     async def assess_node_risk(self, node_summary: NodeSummary) -> NodeSummary:
         try:
-            response = self.client.models.generate_content(
+            response = await self._generate_content(
                 model="gemini-1.5-flash",
                 config=types.GenerateContentConfig(
                     system_instruction=assess_node_risk.prompt,
@@ -130,19 +167,12 @@ class LLMHelper:
             node_summary.summary = msg
             return node_summary
 
-    @retry_async.AsyncRetry(
-        predicate=retry_async.if_transient_error,
-        initial=8.0,
-        maximum=64.0,
-        multiplier=2.0,
-        timeout=600,
-    )
     async def recommend_network_config(
         self, event: Event, event_risk: EventRisk
     ) -> str:
         """Suggest network configuration changes based on the issue"""
         try:
-            response = self.client.models.generate_content(
+            response = await self._generate_content(
                 model=self.model_id,
                 config=types.GenerateContentConfig(
                     system_instruction=recommend_network_config.prompt,
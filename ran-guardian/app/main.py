@@ -4,41 +4,83 @@ import os
 from contextlib import asynccontextmanager
 
 from app.agent import Agent
-from app.data_manager import DataManager
-from app.routes import router
+from app.data_manager import close_shared_data_manager, get_shared_data_manager
+from app.routes import NEXT_PAGE_TOKEN_HEADER, router
 from dotenv import load_dotenv
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 
 load_dotenv()
 PROJECT_ID = os.getenv("PROJECT_ID")
+# minutes between two recounts of the materialized issue / event statistics,
+# 0 disables the reconciliation job. The first recount only runs one interval
+# after startup, app.bin.run_reconcile_stats initialises the counters by hand
+STATS_RECONCILE_INTERVAL = int(os.getenv("STATS_RECONCILE_INTERVAL", 24 * 60))
+# minutes between two reloads of the in-memory inventory index, 0 disables them
+# (the inventory is then loaded once, on first use)
+INVENTORY_REFRESH_INTERVAL = int(os.getenv("INVENTORY_REFRESH_INTERVAL", 60))
 
 logging.basicConfig(
     level=logging.INFO, format="%(asctime)s - %(name)s - %(levelname)s - %(message)s"
 )
+logger = logging.getLogger(__name__)
 
-# Initialize your managers
-data_manager = DataManager(project_id=PROJECT_ID)
 
-# Create agent instance
-agent = Agent(data_manager)
+async def run_periodically(job, interval: int, run_now: bool = True):
+    """Runs `job` every `interval` minutes until cancelled, starting now or, with
+    `run_now` unset, after a first interval"""
+    if not run_now:
+        await asyncio.sleep(interval * 60)
+    while True:
+        try:
+            await job()
+        except Exception as e:
+            logger.error(f"Error running periodic job {job.__name__}: {e}")
+        await asyncio.sleep(interval * 60)
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    # Store agent in app state
+    # One data manager (and so one set of Firestore / BigQuery clients) for the
+    # whole process, shared by the routes, the agent and the llm helpers
+    data_manager = get_shared_data_manager()
+    agent = Agent(data_manager)
+
+    # Store data manager and agent in app state
+    app.state.data_manager = data_manager
     app.state.agent = agent
 
     # Start agent task on startup
     # if os.environ.get("START_AGENT_ON_STARTUP", "true") == "true":
     #    agent_task = asyncio.create_task(agent.start())
 
+    # (job, interval, run_now): the recounts are full collection scans, so a
+    # process start (e.g. a new Cloud Run instance) must not trigger them
+    periodic_jobs = []
+    if STATS_RECONCILE_INTERVAL > 0:
+        periodic_jobs += [
+            (data_manager.reconcile_issue_stats, STATS_RECONCILE_INTERVAL, False),
+            (data_manager.reconcile_event_stats, STATS_RECONCILE_INTERVAL, False),
+        ]
+    if INVENTORY_REFRESH_INTERVAL > 0:
+        periodic_jobs.append(
+            (data_manager.refresh_inventory, INVENTORY_REFRESH_INTERVAL, True)
+        )
+    background_tasks = [
+        asyncio.create_task(run_periodically(job, interval, run_now))
+        for job, interval, run_now in periodic_jobs
+    ]
+
     yield  # Run FastAPI
 
     # Cleanup on shutdown
     # if os.environ.get("START_AGENT_ON_STARTUP", "true") == "true":
     #    await agent.stop()
     #    await agent_task
+    for task in background_tasks:
+        task.cancel()
+    await agent.stop()
+    await close_shared_data_manager()
 
 
 app = FastAPI(
@@ -54,6 +96,7 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=[NEXT_PAGE_TOKEN_HEADER],
 )
 
 
@@ -0,0 +1,208 @@
+"""
+Columnar representation of `PerformanceData` time series.
+
+A `PerformanceSeries` holds one NumPy array per KPI plus a timestamp index,
+instead of one pydantic model per record, and computes its statistics with
+vectorized operations. It converts to and from the list of models used by the
+API and the LLM prompts.
+"""
+
+from datetime import datetime, timezone
+from typing import Dict, Iterable, List, Optional
+
+import numpy as np
+import pyarrow as pa
+from app.models import PerformanceData
+
+# KPI columns, missing optional values are stored as NaN
+METRICS = [
+    name
+    for name in PerformanceData.model_fields
+    if name not in ("node_id", "timestamp")
+]
+# required integer KPIs keep an integer dtype
+INT_METRICS = [
+    name for name in METRICS if PerformanceData.model_fields[name].annotation is int
+]
+
+
+class PerformanceSeries:
+    """KPI records of one or more nodes as NumPy arrays, in record order.
+
+    Timestamps are stored as `datetime64[us]`, in UTC for timezone-aware inputs
+    (`tzinfo` remembers the timezone of the first record to restore them).
+    """
+
+    def __init__(
+        self,
+        node_ids: np.ndarray,
+        timestamps: np.ndarray,
+        metrics: Dict[str, np.ndarray],
+        tzinfo: Optional[timezone] = None,
+    ):
+        self.node_ids = np.asarray(node_ids, dtype=object)
+        self.timestamps = np.asarray(timestamps, dtype="datetime64[us]")
+        self.metrics = metrics
+        self.tzinfo = tzinfo
+
+    def __len__(self) -> int:
+        return len(self.timestamps)
+
+    def __getitem__(self, metric: str) -> np.ndarray:
+        return self.metrics[metric]
+
+    @classmethod
+    def from_records(cls, records: Iterable[Dict]) -> "PerformanceSeries":
+        """Builds the series from dicts with the `PerformanceData` field names"""
+        records = list(records)
+        timestamps = [record["timestamp"] for record in records]
+        timestamps = [
+            datetime.fromisoformat(t) if isinstance(t, str) else t for t in timestamps
+        ]
+        tzinfo = timestamps[0].tzinfo if timestamps else None
+        if tzinfo is not None:
+            timestamps = [
+                t.astimezone(timezone.utc).replace(tzinfo=None) for t in timestamps
+            ]
+        metrics = {}
+        for name in METRICS:
+            values = [record.get(name) for record in records]
+            if name in INT_METRICS:
+                metrics[name] = np.array(values, dtype=np.int64)
+            else:
+                metrics[name] = np.array(
+                    [np.nan if v is None else v for v in values], dtype=np.float64
+                )
+        return cls(
+            [record["node_id"] for record in records],
+            np.array(timestamps, dtype="datetime64[us]"),
+            metrics,
+            tzinfo=tzinfo,
+        )
+
+    @classmethod
+    def from_arrow(cls, table: pa.Table) -> "PerformanceSeries":
+        """Builds the series from an Arrow table with the `PerformanceData` field
+        names. Single-chunk numeric columns without nulls are not copied"""
+        timestamps = table["timestamp"]
+        tzinfo = None
+        if timestamps.type.tz is not None and len(timestamps):
+            tzinfo = timestamps[0].as_py().tzinfo
+        # stored in UTC, the timezone is only dropped from the type
+        timestamps = timestamps.cast(pa.timestamp("us"))
+        metrics = {}
+        for name in METRICS:
+            if name not in table.column_names:
+                metrics[name] = np.full(len(table), np.nan)
+            elif name in INT_METRICS:
+                metrics[name] = table[name].cast(pa.int64()).to_numpy()
+            else:
+                metrics[name] = table[name].cast(pa.float64()).to_numpy()
+        return cls(
+            table["node_id"].to_numpy(),
+            timestamps.to_numpy(),
+            metrics,
+            tzinfo=tzinfo,
+        )
+
+    @classmethod
+    def from_models(cls, performances: List[PerformanceData]) -> "PerformanceSeries":
+        return cls.from_records([dict(p) for p in performances])
+
+    def to_models(self) -> List[PerformanceData]:
+        timestamps = self.timestamps.astype(datetime).tolist()
+        if self.tzinfo is not None:
+            timestamps = [
+                t.replace(tzinfo=timezone.utc).astimezone(self.tzinfo)
+                for t in timestamps
+            ]
+        columns = {
+            name: [None if v != v else v for v in values.tolist()]  # NaN -> None
+            for name, values in self.metrics.items()
+        }
+        return [
+            PerformanceData(
+                node_id=node_id,
+                timestamp=timestamp,
+                **{name: columns[name][i] for name in columns},
+            )
+            for i, (node_id, timestamp) in enumerate(
+                zip(self.node_ids.tolist(), timestamps)
+            )
+        ]
+
+    def for_node(self, node_id: str) -> "PerformanceSeries":
+        mask = self.node_ids == node_id
+        return PerformanceSeries(
+            self.node_ids[mask],
+            self.timestamps[mask],
+            {name: values[mask] for name, values in self.metrics.items()},
+            tzinfo=self.tzinfo,
+        )
+
+    # -------------------
+    # statistics
+    # -------------------
+
+    def _matrix(self) -> np.ndarray:
+        """KPIs as a (metric, record) float matrix"""
+        if not len(self):
+            return np.empty((len(METRICS), 0))
+        return np.vstack([self.metrics[name].astype(np.float64) for name in METRICS])
+
+    def _reduce(self, func) -> Dict[str, Optional[float]]:
+        matrix = self._matrix()
+        valid = ~np.isnan(matrix)
+        values = np.full(len(METRICS), np.nan)
+        has_values = valid.any(axis=1)
+        if has_values.any():
+            values[has_values] = func(matrix[has_values], axis=1)
+        return {
+            name: None if np.isnan(value) else float(value)
+            for name, value in zip(METRICS, values)
+        }
+
+    def min(self) -> Dict[str, Optional[float]]:
+        return self._reduce(np.nanmin)
+
+    def max(self) -> Dict[str, Optional[float]]:
+        return self._reduce(np.nanmax)
+
+    def mean(self) -> Dict[str, Optional[float]]:
+        return self._reduce(np.nanmean)
+
+    def slope(self) -> Dict[str, Optional[float]]:
+        """Least-squares trend of each KPI, in units per hour"""
+        if not len(self):
+            return {name: None for name in METRICS}
+        matrix = self._matrix()
+        hours = (self.timestamps - self.timestamps.min()).astype(np.float64) / 3.6e9
+        valid = ~np.isnan(matrix)
+        n = valid.sum(axis=1)
+        x = np.where(valid, hours, 0.0)
+        y = np.where(valid, matrix, 0.0)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            x_mean = x.sum(axis=1) / n
+            y_mean = y.sum(axis=1) / n
+            dx = np.where(valid, hours - x_mean[:, None], 0.0)
+            dy = np.where(valid, matrix - y_mean[:, None], 0.0)
+            slopes = (dx * dy).sum(axis=1) / (dx * dx).sum(axis=1)
+        return {
+            name: None if not np.isfinite(value) else float(value)
+            for name, value in zip(METRICS, slopes)
+        }
+
+    def breaches(
+        self,
+        metric: str,
+        below: Optional[float] = None,
+        above: Optional[float] = None,
+    ) -> np.ndarray:
+        """Mask of the records whose `metric` is below or above the thresholds"""
+        values = self.metrics[metric].astype(np.float64)
+        mask = np.zeros(len(values), dtype=bool)
+        if below is not None:
+            mask |= values < below
+        if above is not None:
+            mask |= values > above
+        return mask
@@ -0,0 +1,182 @@
+"""
+Streaming pipelines of asyncio stages.
+
+A pipeline is a source followed by stages connected by bounded queues. Each
+stage takes items from its inbox as soon as they are queued and puts its results
+in the inbox of the next stage, so a slow item only holds back the worker
+processing it, and a full queue makes the stages upstream wait (backpressure)
+instead of piling items up in memory.
+
+A stage function is an async generator: it yields zero (filter), one or several
+(fan-out) results per input. A stage with `batch_size > 1` gets a list of the
+items already queued, up to `batch_size`, for bulk lookups. A stage can also be
+fed by an extra source merged into its inbox. A stage with a `priority` function
+takes the queued items from the highest priority down instead of in arrival
+order.
+"""
+
+import asyncio
+import itertools
+import logging
+from dataclasses import dataclass
+from typing import Any, AsyncIterator, Callable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# end of stream marker, queued once all the producers of a queue are done
+_CLOSED = object()
+
+
+class _Channel:
+    """Bounded queue closed once all of its producers are done, a heap ordered by
+    `priority` when given"""
+
+    def __init__(
+        self,
+        maxsize: int,
+        n_producers: int,
+        priority: Optional[Callable[[Any], float]] = None,
+    ):
+        self.priority = priority
+        self.queue = (asyncio.PriorityQueue if priority else asyncio.Queue)(maxsize)
+        self.n_producers = n_producers
+        self._arrivals = itertools.count()
+
+    def _entry(self, item: Any) -> Any:
+        if not self.priority:
+            return item
+        # the end of stream marker comes after every item
+        key = float("inf") if item is _CLOSED else -self.priority(item)
+        return (key, next(self._arrivals), item)
+
+    async def put(self, item: Any):
+        await self.queue.put(self._entry(item))
+
+    async def close(self):
+        self.n_producers -= 1
+        if self.n_producers == 0:
+            await self.put(_CLOSED)
+
+    async def get(self) -> Any:
+        item = await self.queue.get()
+        if self.priority:
+            item = item[-1]
+        if item is _CLOSED:
+            self.queue.put_nowait(self._entry(_CLOSED))  # for the other workers
+        return item
+
+    async def get_batch(self, max_items: int) -> List[Any]:
+        """Waits for an item, then takes the items already queued, up to
+        `max_items`. Empty once the channel is closed."""
+        items = []
+        while len(items) < max_items and not (items and self.queue.empty()):
+            item = await self.get()
+            if item is _CLOSED:
+                break
+            items.append(item)
+        return items
+
+
+@dataclass
+class Stage:
+    name: str
+    func: Callable[[Any], AsyncIterator[Any]]
+    workers: int = 1
+    batch_size: int = 1
+    feed: Optional[Callable[[], AsyncIterator[Any]]] = None
+    priority: Optional[Callable[[Any], float]] = None
+    n_in: int = 0
+    n_out: int = 0
+    n_errors: int = 0
+
+
+class Pipeline:
+    def __init__(
+        self,
+        name: str,
+        source: Callable[[], AsyncIterator[Any]],
+        queue_size: int = 16,
+    ):
+        self.name = name
+        self.source = source
+        self.queue_size = queue_size
+        self.stages: List[Stage] = []
+
+    def add_stage(
+        self,
+        name: str,
+        func: Callable[[Any], AsyncIterator[Any]],
+        workers: int = 1,
+        batch_size: int = 1,
+        feed: Optional[Callable[[], AsyncIterator[Any]]] = None,
+        priority: Optional[Callable[[Any], float]] = None,
+    ) -> "Pipeline":
+        self.stages.append(Stage(name, func, workers, batch_size, feed, priority))
+        return self
+
+    async def run(self) -> List[Dict]:
+        """Runs the pipeline until the source is exhausted and every stage is
+        done, returns the stats of the stages"""
+        channels = [
+            _Channel(self.queue_size, 2 if stage.feed else 1, stage.priority)
+            for stage in self.stages
+        ]
+        tasks = [self._produce("source", self.source, channels[0])]
+        for i, stage in enumerate(self.stages):
+            if stage.feed:
+                tasks.append(self._produce(stage.name, stage.feed, channels[i]))
+            outbox = channels[i + 1] if i + 1 < len(self.stages) else None
+            tasks.append(self._run_stage(stage, channels[i], outbox))
+        await asyncio.gather(*tasks)
+        return self.stats()
+
+    async def _produce(
+        self, name: str, source: Callable[[], AsyncIterator[Any]], outbox: _Channel
+    ):
+        try:
+            async for item in source():
+                await outbox.put(item)
+        except Exception as e:
+            logger.error(f"[{self.name}]: {name} source failed: {e}", exc_info=True)
+        await outbox.close()
+
+    async def _run_stage(
+        self, stage: Stage, inbox: _Channel, outbox: Optional[_Channel]
+    ):
+        async def work():
+            while True:
+                if stage.batch_size > 1:
+                    arg = await inbox.get_batch(stage.batch_size)
+                    if not arg:
+                        return
+                    stage.n_in += len(arg)
+                else:
+                    arg = await inbox.get()
+                    if arg is _CLOSED:
+                        return
+                    stage.n_in += 1
+                try:
+                    async for result in stage.func(arg):
+                        stage.n_out += 1
+                        if outbox is not None:
+                            await outbox.put(result)
+                except Exception as e:
+                    stage.n_errors += 1
+                    logger.error(
+                        f"[{self.name}]: stage {stage.name} failed: {e}", exc_info=True
+                    )
+
+        await asyncio.gather(*[work() for _ in range(stage.workers)])
+        if outbox is not None:
+            await outbox.close()
+
+    def stats(self) -> List[Dict]:
+        return [
+            {
+                "name": stage.name,
+                "in": stage.n_in,
+                "out": stage.n_out,
+                "errors": stage.n_errors,
+            }
+            for stage in self.stages
+        ]
@@ -9,7 +9,7 @@ from app.agent import Agent
 from app.data_manager import DataManager
 from app.models import Issue, IssueStatus
 from dotenv import load_dotenv
-from fastapi import APIRouter, Depends, HTTPException, Request
+from fastapi import APIRouter, Depends, HTTPException, Request, Response
 from google.cloud import firestore
 from sse_starlette.sse import EventSourceResponse
 
@@ -21,10 +21,13 @@ logger = logging.getLogger(__name__)
 
 router = APIRouter()
 
+# response header carrying the opaque token of the next page of a listing
+NEXT_PAGE_TOKEN_HEADER = "X-Next-Page-Token"
 
-# Dependency Injection - create instances of managers and inject them
-async def get_data_manager():
-    return DataManager(project_id=PROJECT_ID)  # Or however you initialize it
+
+# Dependency Injection - inject the process-wide data manager created in the lifespan
+async def get_data_manager(request: Request) -> DataManager:
+    return request.app.state.data_manager
 
 
 @router.get("/")
@@ -100,6 +103,34 @@ async def process_event(
     return
 
 
+@router.get("/events", response_model=List[dict])
+async def get_events(
+    response: Response,
+    max_num_events: int = 100,
+    start_date: Optional[datetime] = None,
+    end_date: Optional[datetime] = None,
+    page_token: Optional[str] = None,
+    data_manager: DataManager = Depends(get_data_manager),
+):
+    """List events, `max_num_events` per page.
+
+    When more events are available, the token of the next page is returned in
+    the `X-Next-Page-Token` header, pass it back as `page_token` to continue.
+    """
+    try:
+        events, next_page_token = await data_manager.get_events_page(
+            start_time=start_date,
+            end_time=end_date,
+            max_num_event=max_num_events,
+            page_token=page_token,
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if next_page_token:
+        response.headers[NEXT_PAGE_TOKEN_HEADER] = next_page_token
+    return [event.model_dump() for event in events]
+
+
 @router.put("/process_events")
 async def process_events(
     request: Request,
@@ -120,30 +151,35 @@ async def process_events(
 # --- Issue management ---
 @router.get("/issues", response_model=List[dict])  # Type hint
 async def get_issues(
+    response: Response,
     max_num_issues: Optional[int] = None,
     start_date: Optional[datetime] = None,
     end_date: Optional[datetime] = None,
+    page_token: Optional[str] = None,
     data_manager: DataManager = Depends(get_data_manager),
 ):
-    issues = await data_manager.get_issues(
-        start_time=start_date,
-        end_time=end_date,
-        max_num_issues=max_num_issues,
-    )
-    events = []
-    for issue in issues:
-        event = None
-        event_id = issue.event_id
-        if event_id:
-            event = await data_manager.get_event(event_id)
-            if event:
-                events.append(event.model_dump())
-        if not event:
-            events.append({})
+    """List issues with their events, `max_num_issues` per page.
+
+    When more issues are available, the token of the next page is returned in
+    the `X-Next-Page-Token` header, pass it back as `page_token` to continue.
+    """
+    try:
+        issues_with_events, next_page_token = await data_manager.get_issues_with_events(
+            start_time=start_date,
+            end_time=end_date,
+            max_num_issues=max_num_issues,
+            page_token=page_token,
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if next_page_token:
+        response.headers[NEXT_PAGE_TOKEN_HEADER] = next_page_token
 
     payload = []
-    for issue, event in zip(issues, events):
-        payload.append({"issue": issue.model_dump(), "event": event})
+    for issue, event in issues_with_events:
+        payload.append(
+            {"issue": issue.model_dump(), "event": event.model_dump() if event else {}}
+        )
 
     return payload
 
@@ -175,6 +211,20 @@ async def get_issue_stats(data_manager: DataManager = Depends(get_data_manager))
     return await data_manager.get_issue_stats()
 
 
+@router.get("/concurrency_limits")
+async def get_concurrency_limits(request: Request):
+    """Get the current adaptive concurrency limits of the agent's stages"""
+    if not hasattr(request.app.state, "agent"):
+        raise HTTPException(status_code=503, detail="Agent not initialized")
+    return request.app.state.agent.concurrency_limits()
+
+
+@router.get("/kpi_cache_stats")
+async def get_kpi_cache_stats(data_manager: DataManager = Depends(get_data_manager)):
+    """Get hit ratio and size of the KPI cache"""
+    return data_manager.kpi_cache.stats()
+
+
 @router.get("/event_stats")
 async def get_issue_stats(data_manager: DataManager = Depends(get_data_manager)):
     """Get summary statistics of issues"""
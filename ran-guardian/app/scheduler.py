@@ -0,0 +1,93 @@
+"""
+Priority of the issues and events handled by the agent.
+
+The score is a weighted sum of components in [0, 1]:
+- urgency: 1 once the event started, halved URGENCY_HORIZON before its start
+- size: event size, S (1) to XL (4)
+- risk: current risk level, 0.5 while not evaluated yet
+- nodes: number of problematic nodes, saturating at NODES_SATURATION
+- staleness: time since the last evaluation, saturating at STALENESS_HORIZON
+
+so that imminent XL events at risk come first when the LLM capacity is the
+bottleneck.
+"""
+
+import heapq
+from datetime import datetime, timedelta
+from typing import Callable, Iterable, List, Optional, TypeVar
+
+from app.models import Issue, RiskLevel
+
+T = TypeVar("T")
+
+URGENCY_HORIZON = timedelta(days=7)
+STALENESS_HORIZON = timedelta(hours=24)
+NODES_SATURATION = 10
+MAX_EVENT_SIZE = 4  # XL
+PRIORITY_WEIGHTS = {
+    "urgency": 0.35,
+    "risk": 0.25,
+    "size": 0.2,
+    "nodes": 0.1,
+    "staleness": 0.1,
+}
+RISK_SCORES = {
+    RiskLevel.LOW: 0.0,
+    RiskLevel.MEDIUM: 1 / 3,
+    RiskLevel.HIGH: 2 / 3,
+    RiskLevel.ESCALATE: 1.0,
+}
+UNKNOWN_RISK_SCORE = 0.5
+
+
+def _local(dt: datetime) -> datetime:
+    """Naive local time, as `datetime.now()`, for timezone aware or naive times"""
+    return dt.astimezone().replace(tzinfo=None) if dt.tzinfo else dt
+
+
+def priority_score(
+    now: datetime,
+    start_date: Optional[datetime],
+    event_size: Optional[int],
+    risk_level: Optional[RiskLevel],
+    n_problematic_nodes: int = 0,
+    last_evaluated: Optional[datetime] = None,
+) -> float:
+    now = _local(now)
+    if start_date is None:
+        urgency = 0.0
+    else:
+        to_start = max(_local(start_date) - now, timedelta(0))
+        urgency = URGENCY_HORIZON / (URGENCY_HORIZON + to_start)
+    if last_evaluated is None:
+        staleness = 1.0
+    else:
+        since = max(now - _local(last_evaluated), timedelta(0))
+        staleness = min(since / STALENESS_HORIZON, 1.0)
+    components = {
+        "urgency": urgency,
+        "size": min((event_size or 0) / MAX_EVENT_SIZE, 1.0),
+        "risk": (UNKNOWN_RISK_SCORE if risk_level is None else RISK_SCORES[risk_level]),
+        "nodes": min(n_problematic_nodes / NODES_SATURATION, 1.0),
+        "staleness": staleness,
+    }
+    return sum(PRIORITY_WEIGHTS[name] * value for name, value in components.items())
+
+
+def issue_priority(issue: Issue, now: Optional[datetime] = None) -> float:
+    return priority_score(
+        now or datetime.now(),
+        start_date=issue.start_date,
+        event_size=issue.event_size,
+        risk_level=issue.event_risk.risk_level if issue.event_risk else None,
+        n_problematic_nodes=len(issue.node_ids or []),
+        last_evaluated=issue.updated_at or issue.created_at,
+    )
+
+
+def by_priority(
+    items: Iterable[T], priority: Callable[[T], float], n: Optional[int] = None
+) -> List[T]:
+    """The items from the highest priority down, only the first `n` if given"""
+    items = list(items)
+    return heapq.nlargest(len(items) if n is None else n, items, key=priority)
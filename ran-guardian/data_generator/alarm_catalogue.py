@@ -0,0 +1,98 @@
+"""
+In-memory copy of the alarm table the mock alarms are picked from.
+
+The mock alarms of a node are 1 to 3 consecutive rows of `ran_guardian.alarm`,
+in EVENTTIME order, chosen by a hash of the node id and the date. The table is
+small, so it is loaded once, from BigQuery or from a local Parquet copy, and the
+rows are then picked by position.
+"""
+
+import hashlib
+import logging
+import os
+from datetime import datetime
+from typing import Dict, List, Optional
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.parquet as pq
+from google.cloud import bigquery
+
+logger = logging.getLogger(__name__)
+
+ALARM_TABLE = "alarm"
+ALARM_COLUMNS = ["ALERTKEY", "EVENT_ID", "ALERTGROUP", "SUMMARY", "ADDITIONALTEXT"]
+# at most MAX_ROWS_PER_NODE consecutive rows are picked per node
+MAX_ROWS_PER_NODE = 3
+
+
+def hash_row_num(node_id: str, start_time: datetime, n_rows: int) -> int:
+    """Row number (1-based, as BigQuery's ROW_NUMBER) of the first alarm of the
+    node, stable for a node and a day"""
+    start_time_str = start_time.strftime("%Y-%m-%d")  # only use start date
+    combined_str = f"{node_id}|{start_time_str}"
+    hashed_bytes = hashlib.sha256(combined_str.encode("utf-8")).digest()
+    return int.from_bytes(hashed_bytes[:8], byteorder="big", signed=False) % n_rows
+
+
+class AlarmCatalogue:
+    def __init__(self, table: pa.Table):
+        """`table` holds the ALARM_COLUMNS of the alarms, in EVENTTIME order"""
+        self.alert_keys = _strings(table, "ALERTKEY")
+        self.event_ids = _strings(table, "EVENT_ID")
+        self.alert_groups = _strings(table, "ALERTGROUP")
+        self.descriptions = [
+            f"{summary or ''}\n{text or ''}"
+            for summary, text in zip(
+                _strings(table, "SUMMARY"), _strings(table, "ADDITIONALTEXT")
+            )
+        ]
+
+    def __len__(self) -> int:
+        return len(self.alert_keys)
+
+    @classmethod
+    def load(
+        cls,
+        bq_client: bigquery.Client,
+        dataset: str,
+        cache_dir: Optional[str] = None,
+    ) -> "AlarmCatalogue":
+        """Loads the table from the Parquet copy in `cache_dir` when it exists,
+        from BigQuery otherwise (then writing the copy)"""
+        path = os.path.join(cache_dir, f"{ALARM_TABLE}.parquet") if cache_dir else None
+        if path and os.path.exists(path):
+            table = pq.read_table(path)
+        else:
+            columns = ", ".join(f"`{column}`" for column in ALARM_COLUMNS)
+            query = (
+                f"SELECT {columns} FROM `{dataset}.{ALARM_TABLE}` ORDER BY EVENTTIME"
+            )
+            table = bq_client.query(query).to_arrow(create_bqstorage_client=True)
+            if path:
+                os.makedirs(cache_dir, exist_ok=True)
+                pq.write_table(table, path)
+        catalogue = cls(table)
+        logger.info(f"Alarm catalogue loaded with {len(catalogue)} alarms")
+        return catalogue
+
+    def rows(self, node_id: str, start_time: datetime) -> np.ndarray:
+        """Positions of the alarms of the node"""
+        if not len(self):
+            return np.empty(0, dtype=np.int64)
+        row_num = hash_row_num(node_id, start_time, len(self))
+        n_row = row_num % MAX_ROWS_PER_NODE
+        rows = np.arange(row_num, row_num + n_row + 1) - 1  # 1-based row numbers
+        return rows[(rows >= 0) & (rows < len(self))]
+
+    def record(self, row: int) -> Dict[str, Optional[str]]:
+        return {
+            "alarm_id": self.alert_keys[row],
+            "event_id": self.event_ids[row],
+            "alarm_type": self.alert_groups[row],
+            "description": self.descriptions[row],
+        }
+
+
+def _strings(table: pa.Table, column: str) -> List[Optional[str]]:
+    return table[column].cast(pa.string()).to_pylist()
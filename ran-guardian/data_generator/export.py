@@ -0,0 +1,100 @@
+"""
+Bulk export of mock KPIs as Arrow record batches.
+
+The KPIs of a node set over a time range are generated one chunk (a number of
+nodes times a number of timestamps) at a time, so that memory stays bounded
+whatever the size of the export. The batches are written as an Arrow IPC stream
+or as a Parquet file with one row group per chunk.
+"""
+
+from typing import Iterator, List, Union
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+from data_generator.kpi_tables import INT_METRICS, PERFORMANCE_METRICS, KpiTables
+
+# default chunk size: 1000 nodes times one day of 15 min buckets
+EXPORT_CHUNK_NODES = 1000
+EXPORT_CHUNK_TIMESTAMPS = 96
+# end of an Arrow IPC stream
+IPC_END_OF_STREAM = b"\xff\xff\xff\xff\x00\x00\x00\x00"
+
+
+def export_schema(time_range: pd.DatetimeIndex) -> pa.Schema:
+    tz = pa.array(time_range[:1]).type.tz
+    return pa.schema(
+        [("node_id", pa.string()), ("timestamp", pa.timestamp("us", tz=tz))]
+        + [
+            (name, pa.int64() if i in INT_METRICS else pa.float64())
+            for i, name in enumerate(PERFORMANCE_METRICS)
+        ]
+    )
+
+
+def generate_batches(
+    kpi_tables: KpiTables,
+    node_ids: List[str],
+    time_range: pd.DatetimeIndex,
+    rng: np.random.Generator,
+    chunk_nodes: int = EXPORT_CHUNK_NODES,
+    chunk_timestamps: int = EXPORT_CHUNK_TIMESTAMPS,
+) -> Iterator[pa.RecordBatch]:
+    """Record batches of the KPIs, in time chunk then node chunk order"""
+    schema = export_schema(time_range)
+    for t in range(0, len(time_range), chunk_timestamps):
+        times = time_range[t : t + chunk_timestamps]
+        hours = times.hour.to_numpy()
+        timestamps = pa.array(times).cast(schema.field("timestamp").type)
+        positions = np.arange(len(times))
+        for n in range(0, len(node_ids), chunk_nodes):
+            nodes = node_ids[n : n + chunk_nodes]
+            values = kpi_tables.generate(nodes, hours, rng)
+            values = values.reshape(-1, len(PERFORMANCE_METRICS))
+            columns = [
+                pa.array(np.repeat(np.array(nodes, dtype=object), len(times))),
+                timestamps.take(np.tile(positions, len(nodes))),
+            ] + [
+                pa.array(values[:, i].astype(schema[i + 2].type.to_pandas_dtype()))
+                for i in range(len(PERFORMANCE_METRICS))
+            ]
+            yield pa.RecordBatch.from_arrays(columns, schema=schema)
+
+
+def ipc_stream(schema: pa.Schema, batches: Iterator[pa.RecordBatch]) -> Iterator[bytes]:
+    """The messages of an Arrow IPC stream, one per batch, for streaming
+    responses"""
+    yield schema.serialize().to_pybytes()
+    for batch in batches:
+        yield batch.serialize().to_pybytes()
+    yield IPC_END_OF_STREAM
+
+
+def write_parquet(
+    where: Union[str, pa.NativeFile],
+    schema: pa.Schema,
+    batches: Iterator[pa.RecordBatch],
+) -> int:
+    """Writes the batches to a Parquet file, returns the number of records"""
+    n_records = 0
+    with pq.ParquetWriter(where, schema) as writer:
+        for batch in batches:
+            writer.write_batch(batch)
+            n_records += batch.num_rows
+    return n_records
+
+
+def write_ipc(
+    where: Union[str, pa.NativeFile],
+    schema: pa.Schema,
+    batches: Iterator[pa.RecordBatch],
+) -> int:
+    """Writes the batches to an Arrow IPC stream file, returns the number of
+    records"""
+    n_records = 0
+    with pa.ipc.new_stream(where, schema) as writer:
+        for batch in batches:
+            writer.write_batch(batch)
+            n_records += batch.num_rows
+    return n_records
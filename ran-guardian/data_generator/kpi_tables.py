@@ -0,0 +1,166 @@
+"""
+In-memory copy of the hourly KPI summary tables the mock KPIs are generated from.
+
+`perf-summary` (hour-of-day KPIs per node) and `perf-summary-mean` (the same
+averaged across nodes) are small, so they are loaded once, from BigQuery or from
+local Parquet copies, into NumPy arrays indexed by node and hour.
+"""
+
+import logging
+import os
+from typing import Dict, List, Optional
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.parquet as pq
+from google.cloud import bigquery
+
+logger = logging.getLogger(__name__)
+
+# columns of the perf-summary tables the mock KPIs are generated from
+PERF_METRIC_COLUMNS = [
+    "4G_ERI_Max_RRC_Conn_User",
+    "4G_ERI_RRC_Estab_SR_pct",
+    "4G_ERI_eRAB_SSR_VoLTE_pct",
+    "4G_ERI_eRAB_SSR_Data_pct",
+    "4G_ERI_Traffic_Data_Vol_DL_MiB",
+    "4G_ERI_Traffic_Data_Vol_UL_MiB",
+]
+# PerformanceData fields of the generator, in the order of PERF_METRIC_COLUMNS
+PERFORMANCE_METRICS = [column.removeprefix("4G_ERI_") for column in PERF_METRIC_COLUMNS]
+# indices of the percentage and integer KPIs in PERF_METRIC_COLUMNS
+PCT_METRICS = [1, 2, 3]
+INT_METRICS = [0]
+# relative amplitude of the noise added to the summary values
+SHAKE = 0.1
+NODE_TABLE = "perf-summary"
+MEAN_TABLE = "perf-summary-mean"
+# number of node ids whose lookup (including misses) is remembered
+LOOKUP_CACHE_SIZE = 100000
+
+
+def parse_node_key(node_id: str) -> Optional[float]:
+    """perf-summary identifies nodes with a FLOAT64 `OSS-NodeID_Generic`"""
+    try:
+        return float(node_id)
+    except (TypeError, ValueError):
+        return None
+
+
+class KpiTables:
+    def __init__(self, node_keys: np.ndarray, node_values: np.ndarray, mean_values):
+        """
+        `node_values` is a (node, hour, metric) array and `mean_values` an
+        (hour, metric) array, NaN where the tables have no row.
+        """
+        self.node_values = node_values
+        self.mean_values = mean_values
+        self.node_keys = node_keys
+        self._node_rows = {key: row for row, key in enumerate(node_keys.tolist())}
+        # node id -> row, -1 for unknown nodes (negative cache)
+        self._lookup_cache: Dict[str, int] = {}
+
+    @classmethod
+    def from_tables(cls, node_table: pa.Table, mean_table: pa.Table) -> "KpiTables":
+        node_keys, rows = np.unique(
+            node_table["node_id"].to_numpy(zero_copy_only=False), return_inverse=True
+        )
+        hours = node_table["hour"].to_numpy(zero_copy_only=False).astype(np.int64)
+        node_values = np.full(
+            (len(node_keys), 24, len(PERF_METRIC_COLUMNS)), np.nan, dtype=np.float32
+        )
+        for i, column in enumerate(PERF_METRIC_COLUMNS):
+            node_values[rows, hours, i] = _column(node_table, column)
+
+        mean_values = np.full((24, len(PERF_METRIC_COLUMNS)), np.nan, dtype=np.float32)
+        mean_hours = mean_table["hour"].to_numpy(zero_copy_only=False).astype(np.int64)
+        for i, column in enumerate(PERF_METRIC_COLUMNS):
+            mean_values[mean_hours, i] = _column(mean_table, column)
+        return cls(node_keys, node_values, mean_values)
+
+    @classmethod
+    def load(
+        cls,
+        bq_client: bigquery.Client,
+        dataset: str,
+        cache_dir: Optional[str] = None,
+    ) -> "KpiTables":
+        """Loads the tables from the Parquet copies in `cache_dir` when they exist,
+        from BigQuery otherwise (then writing the copies)"""
+        tables = []
+        for table_name in (NODE_TABLE, MEAN_TABLE):
+            path = (
+                os.path.join(cache_dir, f"{table_name}.parquet") if cache_dir else None
+            )
+            if path and os.path.exists(path):
+                table = pq.read_table(path)
+            else:
+                table = _query_table(bq_client, dataset, table_name)
+                if path:
+                    os.makedirs(cache_dir, exist_ok=True)
+                    pq.write_table(table, path)
+            tables.append(table)
+        kpi_tables = cls.from_tables(*tables)
+        logger.info(f"KPI tables loaded with {len(kpi_tables.node_values)} nodes")
+        return kpi_tables
+
+    def node_row(self, node_id: str) -> int:
+        """Row of the node in `node_values`, -1 when the node is unknown"""
+        row = self._lookup_cache.get(node_id)
+        if row is None:
+            row = self._node_rows.get(parse_node_key(node_id), -1)
+            if len(self._lookup_cache) >= LOOKUP_CACHE_SIZE:
+                self._lookup_cache.clear()
+            self._lookup_cache[node_id] = row
+        return row
+
+    def node_ids(self) -> List[str]:
+        """Ids of the nodes of perf-summary, as the API takes them"""
+        return [str(key) for key in self.node_keys.tolist()]
+
+    def node_rows(self, node_ids: List[str]) -> np.ndarray:
+        return np.fromiter(
+            (self.node_row(node_id) for node_id in node_ids),
+            dtype=np.int64,
+            count=len(node_ids),
+        )
+
+    def hourly_values(self, node_ids: List[str], hours: np.ndarray) -> np.ndarray:
+        """(node, time, metric) KPIs of the nodes at the given hours of day, the
+        mean across nodes for the hours (or the whole nodes) missing from
+        perf-summary"""
+        rows = self.node_rows(node_ids)
+        hours = np.asarray(hours, dtype=np.int64)
+        mean_values = self.mean_values[hours]
+        values = np.empty((len(rows), len(hours), len(PERF_METRIC_COLUMNS)))
+        values[:] = mean_values
+        known = rows >= 0
+        if known.any():
+            node_values = self.node_values[rows[known][:, None], hours[None, :]]
+            values[known] = np.where(np.isnan(node_values), mean_values, node_values)
+        return values
+
+    def generate(
+        self, node_ids: List[str], hours: np.ndarray, rng: np.random.Generator
+    ) -> np.ndarray:
+        """Mock KPIs: `hourly_values` each multiplied by a random ratio in
+        [1 - SHAKE, 1 + SHAKE), percentages clipped to [0, 1] and the integer
+        KPIs truncated"""
+        values = self.hourly_values(node_ids, hours)
+        values *= rng.uniform(1 - SHAKE, 1 + SHAKE, size=values.shape)
+        values[..., PCT_METRICS] = np.clip(values[..., PCT_METRICS], 0, 1)
+        values[..., INT_METRICS] = np.trunc(values[..., INT_METRICS])
+        return values
+
+
+def _column(table: pa.Table, column: str) -> np.ndarray:
+    return table[column].cast(pa.float32()).to_numpy(zero_copy_only=False)
+
+
+def _query_table(bq_client: bigquery.Client, dataset: str, table_name: str):
+    node_column = (
+        "`OSS-NodeID_Generic` AS node_id, " if table_name == NODE_TABLE else ""
+    )
+    metrics = ", ".join(f"`{column}`" for column in PERF_METRIC_COLUMNS)
+    query = f"SELECT {node_column}hour, {metrics} FROM `{dataset}.{table_name}`"
+    return bq_client.query(query).to_arrow(create_bqstorage_client=True)
@@ -2,7 +2,7 @@ import logging
 import os
 from contextlib import asynccontextmanager
 
-from data_generator.routes import router
+from data_generator.routes import get_alarm_catalogue, get_kpi_tables, router
 from dotenv import load_dotenv
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
@@ -14,12 +14,20 @@ logging.basicConfig(
     level=logging.INFO, format="%(asctime)s - %(name)s - %(levelname)s - %(message)s"
 )
 
-# Start agent task on startup
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # load the KPI and alarm tables before serving, so that no request waits for
+    # BigQuery
+    get_kpi_tables()
+    get_alarm_catalogue()
+    yield
 
 
 app = FastAPI(
     title="Synthtic data generator",
     description="Synthetic data generator which mimick the behavior of Tardis API",
+    lifespan=lifespan,
 )
 
 app.add_middleware(
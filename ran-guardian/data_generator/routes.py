@@ -1,20 +1,29 @@
 import asyncio
-import hashlib
 import json
 import logging
 import os
+import tempfile
 from datetime import datetime, timedelta
-from typing import Dict, List, Optional
+from typing import Iterable, List, Optional
 
 import numpy as np
 import pandas as pd
+from data_generator.alarm_catalogue import AlarmCatalogue
+from data_generator.export import (
+    export_schema,
+    generate_batches,
+    ipc_stream,
+    write_parquet,
+)
+from data_generator.kpi_tables import INT_METRICS, PERFORMANCE_METRICS, KpiTables
 from dotenv import load_dotenv
-from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
+from fastapi.responses import FileResponse, StreamingResponse
 
 # copy paste from app.models
 from google.cloud import bigquery
-from google.cloud.bigquery import enums
 from pydantic import BaseModel, Field
+from starlette.background import BackgroundTask
 
 load_dotenv()
 
@@ -24,12 +33,27 @@ BQ_DATASET_ID = os.getenv("BQ_DATASET_ID")
 # configuaration of the mock data's behavior
 TIME_INTERVAL = int(os.getenv("TIME_INTERVAL"))
 EVENT_PROBA = float(os.getenv("EVENT_PROBA"))
+# seed of the mock KPIs, unset for different data on every run
+DATA_GENERATOR_SEED = os.getenv("DATA_GENERATOR_SEED")
 
 
 logger = logging.getLogger(__name__)
 router = APIRouter()
 
+# directory of the local Parquet copies of the KPI and alarm tables, unset to
+# always load them from BigQuery
+KPI_TABLES_DIR = os.getenv("KPI_TABLES_DIR")
+
 bq_client = bigquery.Client(project=PROJECT_ID, location="europe-west3")
+_kpi_tables: Optional[KpiTables] = None
+_alarm_catalogue: Optional[AlarmCatalogue] = None
+
+ARROW_STREAM_MEDIA_TYPE = "application/vnd.apache.arrow.stream"
+PARQUET_MEDIA_TYPE = "application/vnd.apache.parquet"
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+# records generated per chunk of NDJSON responses
+NDJSON_CHUNK_RECORDS = 10000
+_rng = np.random.default_rng(int(DATA_GENERATOR_SEED) if DATA_GENERATOR_SEED else None)
 
 
 # -------------------
@@ -66,23 +90,17 @@ class NodeTimeRange(BaseModel):
     end_time: Optional[datetime] = None
 
 
+class NodesTimeRange(BaseModel):
+    node_ids: List[str]
+    start_time: Optional[datetime] = None
+    end_time: Optional[datetime] = None
+
+
 # -------------------
 # utility functions
 # -------------------
 
 
-def _shake(x, mode: str = "pct"):
-    ratio = np.random.rand() * 0.2 + 0.9
-    if mode == "pct":
-        return np.clip(x * ratio, 0, 1)
-    elif mode == "int":
-        return int(x * ratio)
-    elif mode == "float":
-        return float(x * ratio)
-    else:
-        raise Exception("mode not implemented !")
-
-
 def _parse_node_id(node_id: str):
     try:
         node_id = int(node_id)
@@ -103,9 +121,13 @@ def _parse_node_id(node_id: str):
 
 def _parse_node_time_range(node_time_range: NodeTimeRange):
     node_id = _parse_node_id(node_time_range.node_id)
-    start_time = node_time_range.start_time
-    end_time = node_time_range.end_time
+    start_time, end_time = _parse_time_range(
+        node_time_range.start_time, node_time_range.end_time
+    )
+    return node_id, start_time, end_time
 
+
+def _parse_time_range(start_time: Optional[datetime], end_time: Optional[datetime]):
     if (end_time is None) and (start_time is None):
         end_time = datetime.now()
         start_time = end_time - timedelta(minutes=TIME_INTERVAL)
@@ -113,28 +135,95 @@ def _parse_node_time_range(node_time_range: NodeTimeRange):
         end_time = start_time + timedelta(minutes=TIME_INTERVAL)
     elif start_time is None:
         start_time = end_time - timedelta(minutes=TIME_INTERVAL)
-    return node_id, start_time, end_time
+    return start_time, end_time
 
 
-def _run_query_job(node_id: str, hour_list: List[int], with_node=True):
-    table_name = "perf-summary" if with_node else "perf-summary-mean"
-    query = f"""
-        SELECT *
-        FROM `{PROJECT_ID}.{BQ_DATASET_ID}.{table_name}`
-        WHERE hour IN UNNEST(@hour_list)
-    """
-    query_parameters = [
-        bigquery.ArrayQueryParameter("hour_list", enums.SqlTypeNames.INT64, hour_list),
-    ]
-    if with_node:
-        query += f" AND `OSS-NodeID_Generic` = @oss_node_id"
-        query_parameters.append(
-            bigquery.ScalarQueryParameter("oss_node_id", "FLOAT64", node_id)
+def _get_time_range(start_time: datetime, end_time: datetime) -> pd.DatetimeIndex:
+    # Round up start_time to the next quarter hour
+    remainder = start_time.minute % TIME_INTERVAL
+    if remainder != 0:
+        start_time += timedelta(
+            minutes=(TIME_INTERVAL - remainder), seconds=start_time.second
+        )
+        if start_time > end_time:
+            return pd.DatetimeIndex([])
+
+    # Create a pandas DatetimeIndex with quarter-minute frequency
+    return pd.date_range(start=start_time, end=end_time, freq=f"{TIME_INTERVAL}min")
+
+
+def _get_rng(seed: Optional[int]) -> np.random.Generator:
+    return _rng if seed is None else np.random.default_rng(seed)
+
+
+def _performance_frame(
+    node_ids: List[str], time_range: pd.DatetimeIndex, values: np.ndarray
+) -> pd.DataFrame:
+    """(node, time, metric) KPIs as a frame of `PerformanceData` records"""
+    n_nodes, n_times, n_metrics = values.shape
+    frame = pd.DataFrame(values.reshape(-1, n_metrics), columns=PERFORMANCE_METRICS)
+    for i in INT_METRICS:
+        column = PERFORMANCE_METRICS[i]
+        frame[column] = frame[column].astype(np.int64)
+    timestamps = np.array([time.isoformat() for time in time_range], dtype=object)
+    frame.insert(0, "node_id", np.repeat(np.array(node_ids, dtype=object), n_times))
+    frame.insert(1, "timestamp", np.tile(timestamps, n_nodes))
+    return frame
+
+
+def _performance_response(
+    node_ids: List[str],
+    time_range: pd.DatetimeIndex,
+    rng: np.random.Generator,
+    format: str,
+) -> Response:
+    """Generates the KPIs and serializes them straight from the arrays instead of
+    through one model per record. NDJSON responses are generated and streamed one
+    chunk of nodes at a time"""
+    if time_range.empty or not node_ids:
+        return Response(
+            "[]" if format == "json" else "", media_type=_media_type(format)
         )
+    kpi_tables = get_kpi_tables()
+    hours = time_range.hour.to_numpy()
+    if format == "json":
+        values = kpi_tables.generate(node_ids, hours, rng)
+        frame = _performance_frame(node_ids, time_range, values)
+        return Response(frame.to_json(orient="records"), media_type="application/json")
+
+    chunk_nodes = max(1, NDJSON_CHUNK_RECORDS // len(time_range))
+
+    def lines():
+        for n in range(0, len(node_ids), chunk_nodes):
+            nodes = node_ids[n : n + chunk_nodes]
+            values = kpi_tables.generate(nodes, hours, rng)
+            frame = _performance_frame(nodes, time_range, values)
+            yield frame.to_json(orient="records", lines=True).rstrip("\n") + "\n"
+
+    return StreamingResponse(lines(), media_type=NDJSON_MEDIA_TYPE)
+
+
+def _alarm_response(alarms: Iterable[Alarm], format: str):
+    if format == "json":
+        return list(alarms)
+    return StreamingResponse(
+        (alarm.model_dump_json() + "\n" for alarm in alarms),
+        media_type=NDJSON_MEDIA_TYPE,
+    )
 
-    job_config = bigquery.QueryJobConfig(query_parameters=query_parameters)
-    job = bq_client.query(query, job_config=job_config)
-    return job
+
+def _media_type(format: str) -> str:
+    return "application/json" if format == "json" else NDJSON_MEDIA_TYPE
+
+
+def get_kpi_tables() -> KpiTables:
+    """The KPI tables, loaded on first use (or at startup by the app's lifespan)"""
+    global _kpi_tables
+    if _kpi_tables is None:
+        _kpi_tables = KpiTables.load(
+            bq_client, f"{PROJECT_ID}.{BQ_DATASET_ID}", cache_dir=KPI_TABLES_DIR
+        )
+    return _kpi_tables
 
 
 # -------------------
@@ -145,137 +234,124 @@ def _run_query_job(node_id: str, hour_list: List[int], with_node=True):
 @router.post("/performances", response_model=List[PerformanceData])  # Type hint
 async def get_performance(
     node_time_range: NodeTimeRange,
+    seed: Optional[int] = Query(None, description="seed for reproducible data"),
+    format: str = Query("json", pattern="^(json|ndjson)$"),
 ):
     """
     Generate mock performance data based on real hourly every data of the node from the provided performance data
     If the node cannot be found, then the mean across all nodes will be used to generate fake data
+    With format=ndjson, the records are streamed as newline-delimited JSON
     """
     node_id, start_time, end_time = _parse_node_time_range(node_time_range)
+    time_range = _get_time_range(start_time, end_time)
+    return _performance_response([node_id], time_range, _get_rng(seed), format)
 
-    # Round up start_time to the next quarter hour
-    remainder = start_time.minute % TIME_INTERVAL
-    if remainder != 0:
-        start_time += timedelta(
-            minutes=(TIME_INTERVAL - remainder), seconds=start_time.second
-        )
-        if start_time > end_time:
-            return []
 
-    # Create a pandas DatetimeIndex with quarter-minute frequency
-    time_range = pd.date_range(
-        start=start_time, end=end_time, freq=f"{TIME_INTERVAL}min"
+@router.post("/performances/batch", response_model=List[PerformanceData])
+async def get_performance_batch(
+    nodes_time_range: NodesTimeRange,
+    seed: Optional[int] = Query(None, description="seed for reproducible data"),
+    format: str = Query("json", pattern="^(json|ndjson)$"),
+):
+    """
+    Same as /performances for many nodes over one time range.
+    The records carry the node ids as they were requested.
+    """
+    start_time, end_time = _parse_time_range(
+        nodes_time_range.start_time, nodes_time_range.end_time
     )
-    hour_list = [t.hour for t in time_range]
+    time_range = _get_time_range(start_time, end_time)
+    node_ids = list(dict.fromkeys(nodes_time_range.node_ids))
+    return _performance_response(node_ids, time_range, _get_rng(seed), format)
 
-    query_job = _run_query_job(
-        node_id=node_id, hour_list=hour_list, with_node=isinstance(node_id, float)
+
+@router.post("/performances/export")
+async def export_performances(
+    nodes_time_range: NodesTimeRange,
+    format: str = Query("arrow", pattern="^(arrow|parquet)$"),
+    seed: Optional[int] = Query(None, description="seed for reproducible data"),
+):
+    """
+    Same as /performances/batch for bulk exports: the records are generated chunk by
+    chunk and returned as an Arrow IPC stream (streamed as they are generated) or
+    as a Parquet file.
+    """
+    start_time, end_time = _parse_time_range(
+        nodes_time_range.start_time, nodes_time_range.end_time
     )
-    try:
-        query_result = query_job.result()
-        if query_result.total_rows == 0:
-            # if the node_id does not exist in the current data, then run a query which is node_id independent
-            query_job = _run_query_job(
-                node_id=node_id, hour_list=hour_list, with_node=False
-            )
-            query_result = query_job.result()
-
-        result_dict = {}
-        for row in query_result:
-            row_dict = dict(row)
-            result_dict[row_dict["hour"]] = row_dict
-
-        perf_data = []
-
-        for time in time_range:
-            hour = time.hour
-            perf = result_dict.get(hour, {})
-            perf_data.append(
-                PerformanceData(
-                    node_id=str(node_id),
-                    timestamp=time,
-                    Max_RRC_Conn_User=_shake(
-                        perf.get("4G_ERI_Max_RRC_Conn_User"), mode="int"
-                    ),
-                    RRC_Estab_SR_pct=_shake(
-                        perf.get("4G_ERI_RRC_Estab_SR_pct"), mode="pct"
-                    ),
-                    eRAB_SSR_VoLTE_pct=_shake(
-                        perf.get("4G_ERI_eRAB_SSR_VoLTE_pct"), mode="pct"
-                    ),
-                    eRAB_SSR_Data_pct=_shake(
-                        perf.get("4G_ERI_eRAB_SSR_Data_pct"), mode="pct"
-                    ),
-                    Traffic_Data_Vol_DL_MiB=_shake(
-                        perf.get("4G_ERI_Traffic_Data_Vol_DL_MiB"), mode="float"
-                    ),
-                    Traffic_Data_Vol_UL_MiB=_shake(
-                        perf.get("4G_ERI_Traffic_Data_Vol_UL_MiB"), mode="float"
-                    ),
-                )
-            )
-        return perf_data
+    time_range = _get_time_range(start_time, end_time)
+    node_ids = list(dict.fromkeys(nodes_time_range.node_ids))
+    schema = export_schema(time_range)
+    batches = generate_batches(get_kpi_tables(), node_ids, time_range, _get_rng(seed))
+    if format == "arrow":
+        # sync iterator: generation runs in the threadpool, off the event loop
+        return StreamingResponse(
+            ipc_stream(schema, batches), media_type=ARROW_STREAM_MEDIA_TYPE
+        )
 
-    except Exception as e:
-        print(f"An error occurred: {e}")
-        raise HTTPException(status_code=500, detail=str(e))
+    fd, path = tempfile.mkstemp(suffix=".parquet")
+    os.close(fd)
+    await asyncio.to_thread(write_parquet, path, schema, batches)
+    return FileResponse(
+        path,
+        media_type=PARQUET_MEDIA_TYPE,
+        filename="performances.parquet",
+        background=BackgroundTask(os.remove, path),
+    )
 
 
-def _generate_row_num(node_id: str, start_time: datetime, end_time: datetime):
-    start_time_str = start_time.strftime("%Y-%m-%d")  # only use start date
-    combined_str = f"{node_id}|{start_time_str}"
-    hashed_bytes = hashlib.sha256(combined_str.encode("utf-8")).digest()
-    row_num = (
-        int.from_bytes(hashed_bytes[:8], byteorder="big", signed=False) % 497
-    )  # hard coded total row number
-    return row_num
+def get_alarm_catalogue() -> AlarmCatalogue:
+    """The alarm table, loaded on first use (or at startup by the app's lifespan)"""
+    global _alarm_catalogue
+    if _alarm_catalogue is None:
+        _alarm_catalogue = AlarmCatalogue.load(
+            bq_client, f"{PROJECT_ID}.ran_guardian", cache_dir=KPI_TABLES_DIR
+        )
+    return _alarm_catalogue
+
+
+def _generate_alarms(
+    node_id: str, start_time: datetime, time_range: pd.DatetimeIndex
+) -> List[Alarm]:
+    if _rng.random() > EVENT_PROBA:
+        return []  # no alarm for the node
+    catalogue = get_alarm_catalogue()
+    rows = catalogue.rows(node_id, start_time)
+    created_at = time_range[_rng.integers(len(time_range), size=len(rows))]
+    return [
+        Alarm(node_id=node_id, created_at=time, **catalogue.record(row))
+        for row, time in zip(rows.tolist(), created_at.to_pydatetime())
+    ]
 
 
 @router.post("/alarms", response_model=List[Alarm])  # Type hint
-async def get_alarms(node_time_range: NodeTimeRange):
+async def get_alarms(
+    node_time_range: NodeTimeRange,
+    format: str = Query("json", pattern="^(json|ndjson)$"),
+):
     # here the alarm data should be issued by site id
     node_id, start_time, end_time = _parse_node_time_range(node_time_range)
+    time_range = pd.date_range(start=start_time, end=end_time, freq=f"1D")
+    # Note: we mock the data by selecting rows of the alarm table
+    return _alarm_response(_generate_alarms(node_id, start_time, time_range), format)
 
-    row_num = _generate_row_num(node_id, start_time, end_time)
-
-    if np.random.rand() > EVENT_PROBA:
-        # no alarm for the node
-        return []
-    n_row = row_num % 3  # choose max 3 rows
-    query = f"""
-        SELECT *
-        FROM (
-        SELECT
-            *,
-            ROW_NUMBER() OVER (ORDER BY EVENTTIME) AS row_num
-        FROM
-            `{PROJECT_ID}.ran_guardian.alarm`
-        )
-        WHERE row_num between {row_num} and {row_num + n_row};
-    """
-    # Note: we mock the data by randomly select one
-    try:
-        query_job = bq_client.query(query)
-        alarm_data = []
-
-        time_range = pd.date_range(start=start_time, end=end_time, freq=f"1D")
-
-        for row in query_job.result():
-            row_dict = dict(row)
-            idx = np.random.choice(range(len(time_range)))
-            alarm_data.append(
-                Alarm(
-                    alarm_id=row_dict.get("ALERTKEY"),
-                    node_id=node_id,
-                    event_id=row_dict.get("EVENT_ID"),
-                    created_at=time_range[idx].to_pydatetime(),
-                    cleared_at=None,
-                    alarm_type=row_dict.get("ALERTGROUP"),
-                    description=row_dict.get("SUMMARY")
-                    + "\n"
-                    + row_dict.get("ADDITIONALTEXT"),
-                )
-            )
 
-        return alarm_data
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+@router.post("/alarms/batch", response_model=List[Alarm])
+async def get_alarms_batch(
+    nodes_time_range: NodesTimeRange,
+    format: str = Query("json", pattern="^(json|ndjson)$"),
+):
+    """
+    Same as /alarms for many sites over one time range.
+    The alarms carry the site ids as they were requested.
+    """
+    start_time, end_time = _parse_time_range(
+        nodes_time_range.start_time, nodes_time_range.end_time
+    )
+    time_range = pd.date_range(start=start_time, end=end_time, freq=f"1D")
+    alarms = (
+        alarm
+        for site_id in dict.fromkeys(nodes_time_range.node_ids)
+        for alarm in _generate_alarms(site_id, start_time, time_range)
+    )
+    return _alarm_response(alarms, format)
@@ -1,6 +1,7 @@
 """Helper functions to interfact with Firestore database."""
 
 import os
+import time
 from datetime import datetime, timezone, timedelta
 from google.cloud import firestore
 from google.cloud.firestore_v1.base_query import FieldFilter
@@ -8,10 +9,15 @@ from google.cloud import bigquery
 import pandas
 import pandas_gbq
 from dotenv import load_dotenv
+import pyarrow as pa
+from app.inventory_snapshot import sites_within_radius, sync_inventory_snapshot
 
 load_dotenv()
 PROJECT_ID = os.getenv("PROJECT_ID")
 FIREBASE_DB_NAME = os.getenv("FIREBASE_DB_NAME")
+EVENT_SIZES = ["S", "M", "L", "XL"]
+# minutes between two syncs of the local inventory snapshot
+INVENTORY_REFRESH_INTERVAL = int(os.getenv("INVENTORY_REFRESH_INTERVAL", 60))
 
 db = firestore.Client(project=PROJECT_ID, database=FIREBASE_DB_NAME)
 
@@ -84,10 +90,11 @@ def save_events(location: str, events: list[dict]) -> None:
 
         event["event_id"] = doc_ref.id
 
-        # Increment total events stat
+        # Increment total events stat (and the per size counter read by the backend)
         total_ref_stats = db.collection("locations").document("0_stats")
         total_ref_stats.update({
-            "num_events": firestore.Increment(1)
+            "num_events": firestore.Increment(1),
+            **_size_stat_increment(event.get("size"), 1)
         })
 
         # Increment location events stat
@@ -111,11 +118,19 @@ def get_events_by_location(location: str) -> list[dict]:
     events_list = [{**event.to_dict(), 'id': event.id} for event in events]
     return events_list
 
+def _size_stat_increment(size: str, amount: int) -> dict:
+    """Returns the update of the "by_size" counter of the global stats document."""
+    if size not in EVENT_SIZES:
+        return {}
+    return {f"by_size.{size}": firestore.Increment(amount)}
+
 def delete_event_by_id(event_location: str, event_id: str) -> None:
     """
     Delete an event with the specified event_id for the specified event_location.
     """
-    db.collection(event_location).document(event_id).delete()
+    doc_ref = db.collection(event_location).document(event_id)
+    event = doc_ref.get().to_dict() or {}
+    doc_ref.delete()
 
     # Decrement location events stat
     loc_ref_stats = db.collection("locations").document(event_location)
@@ -126,30 +141,30 @@ def delete_event_by_id(event_location: str, event_id: str) -> None:
     # Decrement total events stat
     total_ref_stats = db.collection("locations").document("0_stats")
     total_ref_stats.update({
-        "num_events": firestore.Increment(-1)
+        "num_events": firestore.Increment(-1),
+        **_size_stat_increment(event.get("size"), -1)
     })
 
-QUERY = """
-    SELECT
-    ST_X(GEO_COORDINATES) AS longitude,
-    ST_Y(GEO_COORDINATES) AS latitude,
-    MS_MSRBS_HERSTELLER
-    FROM
-    `de1000-dev-mwc-ran-agent.ran_guardian.inventory`
-    WHERE
-    ST_DISTANCE(
-        GEO_COORDINATES, -- Replace longitude and latitude with your table's column names
-        ST_GEOGPOINT({lng}, {lat}) -- Replace with your target longitude and latitude (e.g., Chicago)
-    ) <= {radius}; -- 5000 meters = 5 kilometers
-    """
+_inventory = None
+_inventory_synced_at = 0.0
+
+def get_inventory() -> pa.Table:
+    """Returns the local inventory snapshot (all the sites, with or without 4G
+    cells), synced with BigQuery at most every INVENTORY_REFRESH_INTERVAL minutes."""
+    global _inventory, _inventory_synced_at
+    if _inventory is None or time.monotonic() - _inventory_synced_at > INVENTORY_REFRESH_INTERVAL * 60:
+        client = bigquery.Client(project=PROJECT_ID, location='europe-west3')
+        _inventory = sync_inventory_snapshot(client)
+        _inventory_synced_at = time.monotonic()
+    return _inventory
 
 def get_nodes_within_radius(lng: float, lat: float, radius: int = 4000) -> pandas.DataFrame:
     """Get nodes within the specidied radius of the given coordinates."""
 
-    client = bigquery.Client(project=PROJECT_ID, location='europe-west3')
-    query_job = client.query(QUERY.format(lng=lng, lat=lat, radius=radius))  # API request
-    df = query_job.to_dataframe()
-    return df
+    inventory = get_inventory()
+    indices = sites_within_radius(inventory, lat, lng, radius)
+    columns = ["longitude", "latitude", "MS_MSRBS_HERSTELLER"]
+    return inventory.select(columns).take(indices).to_pandas()
 
 def get_event_by_location_and_id(location: str, event_id: str) -> dict:
     """Returns a single event for the specified location and event ID."""
@@ -160,9 +175,12 @@ def delete_events_by_location(location: str) -> int:
     """Deletes all events for the specified location."""
     docs = db.collection(location).stream()
     num_deleted = 0
+    num_deleted_by_size = {}
     for doc in docs:
+        size = doc.to_dict().get("size")
         doc.reference.delete()
         num_deleted += 1
+        num_deleted_by_size[size] = num_deleted_by_size.get(size, 0) + 1
 
     # Reset location events stat counter
     loc_ref_stats = db.collection("locations").document(location)
@@ -172,8 +190,12 @@ def delete_events_by_location(location: str) -> int:
 
     # Decrement total events stat
     total_ref_stats = db.collection("locations").document("0_stats")
+    size_updates = {}
+    for size, count in num_deleted_by_size.items():
+        size_updates.update(_size_stat_increment(size, -1*count))
     total_ref_stats.update({
-        "num_events": firestore.Increment(-1*num_deleted)
+        "num_events": firestore.Increment(-1*num_deleted),
+        **size_updates
     })
 
     return num_deleted
@@ -6,6 +6,7 @@ import time
 import os
 from dotenv import load_dotenv
 import logging
+from llm.rate_limiter import estimate_tokens, get_rate_limiter
 
 load_dotenv()
 
@@ -72,11 +73,23 @@ def generate(prompt, model=MODEL_NAME, include_search: bool=False, response_sche
         **generate_content_config
     )
 
-    responses = client.models.generate_content(
-    model = model,
-    contents = contents,
-    config = generate_content_config,
-    )
+    # every Gemini caller shares the quota through the rate limiter
+    rate_limiter = get_rate_limiter()
+    tokens = estimate_tokens(prompt)
+    rate_limiter.acquire_sync(model, tokens)
+    try:
+        responses = client.models.generate_content(
+        model = model,
+        contents = contents,
+        config = generate_content_config,
+        )
+    except genai.errors.APIError as e:
+        if e.code == 429:
+            rate_limiter.on_rate_limited(model, e)
+        raise
+    usage = responses.usage_metadata
+    if usage and usage.total_token_count:
+        rate_limiter.record_usage(model, usage.total_token_count - tokens)
     if responses.text:
         return responses.text
     else:
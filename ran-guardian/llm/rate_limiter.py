@@ -0,0 +1,311 @@
+"""
+Token-bucket rate limiter shared by every Gemini caller.
+
+Each model has a requests-per-minute and a tokens-per-minute bucket, refilled
+continuously and holding at most one minute of budget. A call waits until both
+buckets cover it, then takes one request and its estimated tokens; the estimate
+is corrected with the actual usage once the response is known, so the token
+bucket can go negative and hold back the next calls. A 429 answer pauses the
+model for its Retry-After delay.
+
+The buckets live in memory, shared by all the callers of the process. With
+`LLM_RATE_LIMIT_STATE_FILE` set, they live in that file instead, under an
+exclusive file lock, so that several processes share the same quota.
+"""
+
+import asyncio
+import email.utils
+import fcntl
+import json
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.outputs import LLMResult
+from langchain_core.rate_limiters import BaseRateLimiter
+
+logger = logging.getLogger(__name__)
+
+# default budget of every model, LLM_RATE_LIMITS overrides it per model as JSON:
+# {"gemini-2.0-flash": {"rpm": 500, "tpm": 4000000}}
+LLM_RPM = float(os.getenv("LLM_RPM", 300))
+LLM_TPM = float(os.getenv("LLM_TPM", 1000000))
+LLM_RATE_LIMITS = json.loads(os.getenv("LLM_RATE_LIMITS", "{}"))
+LLM_RATE_LIMIT_STATE_FILE = os.getenv("LLM_RATE_LIMIT_STATE_FILE")
+# pause after a 429 answer without Retry-After header
+DEFAULT_RETRY_AFTER = 2.0
+# token estimate of a request whose content is unknown (LangChain calls)
+DEFAULT_REQUEST_TOKENS = 0
+# counters of the `count_rate_limits` blocks the current context runs in
+_rate_limit_counters: ContextVar[Tuple[List[int], ...]] = ContextVar(
+    "rate_limit_counters", default=()
+)
+
+
+@dataclass
+class Budget:
+    rpm: float
+    tpm: float
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count of a text (about 4 characters per token)"""
+    return len(text) // 4 + 1
+
+
+def retry_after_seconds(exc: Exception) -> Optional[float]:
+    """Retry-After delay of the HTTP response carried by an API error, if any"""
+    headers = getattr(getattr(exc, "response", None), "headers", None) or {}
+    value = headers.get("Retry-After") or headers.get("retry-after")
+    if value is None:
+        return None
+    try:
+        return max(float(value), 0.0)
+    except ValueError:
+        pass
+    try:  # HTTP date
+        retry_at = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return max(retry_at.timestamp() - time.time(), 0.0)
+
+
+def is_rate_limit_error(exc: BaseException) -> bool:
+    """429 answers (genai and google.api_core errors carry the status as `code`,
+    httpx errors on their response)"""
+    code = getattr(exc, "code", None)
+    if not isinstance(code, int):
+        code = getattr(getattr(exc, "response", None), "status_code", None)
+    return code == 429
+
+
+@contextmanager
+def count_rate_limits() -> Iterator[List[int]]:
+    """Counts the 429 answers seen by the calls made within the block, including
+    the tasks and threads they start, as `[count]`"""
+    counter = [0]
+    token = _rate_limit_counters.set(_rate_limit_counters.get() + (counter,))
+    try:
+        yield counter
+    finally:
+        _rate_limit_counters.reset(token)
+
+
+class RateLimiter:
+    def __init__(
+        self,
+        default_budget: Budget,
+        budgets: Optional[Dict[str, Budget]] = None,
+        state_file: Optional[str] = None,
+        clock: Callable[[], float] = time.time,
+    ):
+        self.default_budget = default_budget
+        self.budgets = budgets or {}
+        self.state_file = state_file
+        self.clock = clock
+        self._lock = threading.Lock()
+        self._state: Dict[str, Dict[str, float]] = {}
+        # 429 answers seen by this process, an overload signal for the callers
+        self.n_rate_limited = 0
+
+    @classmethod
+    def from_env(cls) -> "RateLimiter":
+        return cls(
+            Budget(rpm=LLM_RPM, tpm=LLM_TPM),
+            {model: Budget(**budget) for model, budget in LLM_RATE_LIMITS.items()},
+            state_file=LLM_RATE_LIMIT_STATE_FILE,
+        )
+
+    def budget(self, model: str) -> Budget:
+        return self.budgets.get(model, self.default_budget)
+
+    # -------------------
+    # bucket state
+    # -------------------
+
+    def _update(self, func: Callable[[Dict[str, Dict[str, float]]], Any]) -> Any:
+        """Applies `func` to the state of all models, under the process lock and,
+        for a shared state file, the file lock"""
+        with self._lock:
+            if not self.state_file:
+                return func(self._state)
+            with open(self.state_file, "a+") as f:
+                fcntl.flock(f, fcntl.LOCK_EX)
+                try:
+                    f.seek(0)
+                    content = f.read()
+                    state = json.loads(content) if content else {}
+                    result = func(state)
+                    f.seek(0)
+                    f.truncate()
+                    json.dump(state, f)
+                    return result
+                finally:
+                    fcntl.flock(f, fcntl.LOCK_UN)
+
+    def _refill(self, state: Dict[str, Dict[str, float]], model: str) -> Dict:
+        budget = self.budget(model)
+        now = self.clock()
+        bucket = state.setdefault(
+            model,
+            {
+                "requests": budget.rpm,
+                "tokens": budget.tpm,
+                "updated": now,
+                "blocked_until": 0.0,
+            },
+        )
+        elapsed = max(now - bucket["updated"], 0.0)
+        bucket["requests"] = min(
+            budget.rpm, bucket["requests"] + elapsed * budget.rpm / 60
+        )
+        bucket["tokens"] = min(budget.tpm, bucket["tokens"] + elapsed * budget.tpm / 60)
+        bucket["updated"] = now
+        return bucket
+
+    def try_acquire(self, model: str, tokens: int = DEFAULT_REQUEST_TOKENS) -> float:
+        """Takes a request and `tokens` from the buckets of the model when they
+        cover them and returns 0, returns the time to wait otherwise"""
+        budget = self.budget(model)
+        # a request larger than the bucket only waits for a full bucket
+        tokens = min(tokens, budget.tpm)
+
+        def _take(state):
+            bucket = self._refill(state, model)
+            wait = max(
+                bucket["blocked_until"] - bucket["updated"],
+                (1 - bucket["requests"]) * 60 / budget.rpm,
+                (tokens - bucket["tokens"]) * 60 / budget.tpm,
+                0.0,
+            )
+            if wait == 0:
+                bucket["requests"] -= 1
+                bucket["tokens"] -= tokens
+            return wait
+
+        return self._update(_take)
+
+    async def _off_loop(self, method: Callable, *args) -> Any:
+        """Runs `method` in a thread when it locks and reads the state file, so
+        that the async callers do not block the event loop"""
+        if self.state_file:
+            return await asyncio.to_thread(method, *args)
+        return method(*args)
+
+    async def acquire(self, model: str, tokens: int = DEFAULT_REQUEST_TOKENS):
+        while wait := await self._off_loop(self.try_acquire, model, tokens):
+            await asyncio.sleep(wait)
+
+    def acquire_sync(self, model: str, tokens: int = DEFAULT_REQUEST_TOKENS):
+        while wait := self.try_acquire(model, tokens):
+            time.sleep(wait)
+
+    def record_usage(self, model: str, tokens: int):
+        """Takes `tokens` more from the token bucket of the model, to correct the
+        estimate of a request with its actual usage (negative to give back)"""
+
+        def _record(state):
+            bucket = self._refill(state, model)
+            bucket["tokens"] = min(self.budget(model).tpm, bucket["tokens"] - tokens)
+
+        self._update(_record)
+
+    async def arecord_usage(self, model: str, tokens: int):
+        await self._off_loop(self.record_usage, model, tokens)
+
+    def pause(self, model: str, seconds: float):
+        """Holds back every call to the model for `seconds` (Retry-After)"""
+        logger.warning(f"Rate limit of {model} exceeded, pausing for {seconds:.1f} s")
+        self.n_rate_limited += 1
+        for counter in _rate_limit_counters.get():
+            counter[0] += 1
+
+        def _pause(state):
+            bucket = self._refill(state, model)
+            bucket["blocked_until"] = max(
+                bucket["blocked_until"], bucket["updated"] + seconds
+            )
+
+        self._update(_pause)
+
+    def on_rate_limited(self, model: str, exc: Exception):
+        retry_after = retry_after_seconds(exc)
+        self.pause(model, DEFAULT_RETRY_AFTER if retry_after is None else retry_after)
+
+    async def aon_rate_limited(self, model: str, exc: Exception):
+        await self._off_loop(self.on_rate_limited, model, exc)
+
+
+_rate_limiter: Optional[RateLimiter] = None
+
+
+def get_rate_limiter() -> RateLimiter:
+    """The rate limiter of the process"""
+    global _rate_limiter
+    if _rate_limiter is None:
+        _rate_limiter = RateLimiter.from_env()
+    return _rate_limiter
+
+
+# -------------------
+# LangChain adapters
+# -------------------
+
+
+class LangChainRateLimiter(BaseRateLimiter):
+    """`rate_limiter` of LangChain chat models, which only reserves requests: the
+    tokens are accounted for after the call by `TokenUsageCallbackHandler`"""
+
+    def __init__(self, model: str, limiter: Optional[RateLimiter] = None):
+        self.model = model
+        self.limiter = limiter or get_rate_limiter()
+
+    def acquire(self, *, blocking: bool = True) -> bool:
+        if not blocking:
+            return self.limiter.try_acquire(self.model) == 0
+        self.limiter.acquire_sync(self.model)
+        return True
+
+    async def aacquire(self, *, blocking: bool = True) -> bool:
+        if not blocking:
+            return self.limiter.try_acquire(self.model) == 0
+        await self.limiter.acquire(self.model)
+        return True
+
+
+class TokenUsageCallbackHandler(BaseCallbackHandler):
+    """Takes the tokens used by LangChain chat model calls from the token bucket"""
+
+    def __init__(self, model: str, limiter: Optional[RateLimiter] = None):
+        self.model = model
+        self.limiter = limiter or get_rate_limiter()
+
+    def on_llm_end(self, response: LLMResult, **kwargs: Any) -> None:
+        tokens = 0
+        for generations in response.generations:
+            for generation in generations:
+                usage = getattr(
+                    getattr(generation, "message", None), "usage_metadata", None
+                )
+                if usage:
+                    tokens += usage.get("total_tokens", 0)
+        if tokens:
+            self.limiter.record_usage(self.model, tokens)
+
+    def on_llm_error(self, error: BaseException, **kwargs: Any) -> None:
+        if is_rate_limit_error(error):
+            self.limiter.on_rate_limited(self.model, error)
+
+
+def langchain_rate_limit_kwargs(model: str) -> Dict[str, List]:
+    """Keyword arguments routing a LangChain chat model through the rate limiter"""
+    return {
+        "rate_limiter": LangChainRateLimiter(model),
+        "callbacks": [TokenUsageCallbackHandler(model)],
+    }
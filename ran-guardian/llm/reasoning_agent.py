@@ -23,6 +23,7 @@ from langgraph.store.memory import InMemoryStore
 from langgraph.types import StateSnapshot
 from llm.logger import AgentWorkflowLogger
 from llm.prompt_manager import PromptManager
+from llm.rate_limiter import langchain_rate_limit_kwargs
 from llm.task_agent import (
     activate_mlb,
     change_dss,
@@ -143,8 +144,10 @@ class ReasoningAgent:
     def set_up(self) -> None:
         """Sets up the LangGraph workflow and the LLM model."""
         self.logger.debug("Setting up workflow graph...")
+        model_name = os.environ.get("GEMINI_MODEL_NAME", "gemini-2.0-flash")
         model = ChatVertexAI(
-            model=os.environ.get("GEMINI_MODEL_NAME", "gemini-2.0-flash"),
+            model=model_name,
+            **langchain_rate_limit_kwargs(model_name),
             safety_settings={
                 HarmCategory.HARM_CATEGORY_UNSPECIFIED: HarmBlockThreshold.BLOCK_NONE,
                 HarmCategory.HARM_CATEGORY_DANGEROUS_CONTENT: HarmBlockThreshold.BLOCK_NONE,
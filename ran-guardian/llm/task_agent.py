@@ -1,3 +1,4 @@
+import asyncio
 import logging
 import os
 from typing import Literal, Optional
@@ -16,7 +17,8 @@ from langgraph.graph import END, MessageGraph
 from langgraph.prebuilt import ToolNode
 from langgraph.store.memory import InMemoryStore
 from llm.prompt_manager import PromptManager
-from llm.tools import run_node_command, wait_sometime
+from llm.rate_limiter import langchain_rate_limit_kwargs
+from llm.tools import run_node_command
 from llm.utils import strip_markdown
 
 prompt_manager = PromptManager()
@@ -46,6 +48,7 @@ class TaskAgent:
     def set_up(self) -> None:
         model = ChatVertexAI(
             model=self.model_name,
+            **langchain_rate_limit_kwargs(self.model_name),
             safety_settings={
                 HarmCategory.HARM_CATEGORY_UNSPECIFIED: HarmBlockThreshold.BLOCK_NONE,
                 HarmCategory.HARM_CATEGORY_DANGEROUS_CONTENT: HarmBlockThreshold.BLOCK_NONE,
@@ -69,16 +72,8 @@ class TaskAgent:
                 run_node_command,
             ]
         )
-
-        dummy_wait_node = ToolNode(
-            [
-                wait_sometime,
-            ]
-        )
         builder.add_node("tools", tool_node)
-        builder.add_node("wait", dummy_wait_node)
-        builder.add_edge("agent", "wait")
-        builder.add_conditional_edges("wait", self._router)
+        builder.add_conditional_edges("agent", self._router)
         builder.add_edge("tools", "agent")
         builder.add_edge("tools", END)
 
@@ -88,14 +83,15 @@ class TaskAgent:
             checkpointer=MemorySaver(), store=InMemoryStore()
         )
 
-    def run_workflow(self):
-        """Run the agent workflow"""
+    async def run_workflow(self):
+        """Run the agent workflow, streamed asynchronously so that the LLM calls
+        and their rate limiting do not block the event loop"""
         if not self.runnable:
             raise RuntimeError("Agent not set up. Call set_up() first.")
 
         new_messages = []
         try:
-            for output_dict in self.runnable.stream(
+            async for output_dict in self.runnable.astream(
                 self.chat_history, config=self.config
             ):
                 for key, output in output_dict.items():
@@ -147,13 +143,13 @@ class TaskAgent:
 
 
 @tool
-def activate_mlb(node_id: str) -> str:
+async def activate_mlb(node_id: str) -> str:
     """Activate MLB of a node"""
     activate_mlb_prompt = prompt_manager.get_prompt("activate_mlb", node_id=node_id)
     agent = TaskAgent(system_instructions=activate_mlb_prompt, node_id=node_id)
     try:
         agent.set_up()
-        messages = agent.run_workflow()
+        messages = await agent.run_workflow()
         response = strip_markdown(messages[-1].content)
         return response
     except:
@@ -162,13 +158,13 @@ def activate_mlb(node_id: str) -> str:
 
 
 @tool
-def deactivate_ca(node_id: str) -> str:
+async def deactivate_ca(node_id: str) -> str:
     """Deactivate CA for a node"""
     activate_mlb_prompt = prompt_manager.get_prompt("deactivate_ca", node_id=node_id)
     agent = TaskAgent(system_instructions=activate_mlb_prompt, node_id=node_id)
     try:
         agent.set_up()
-        messages = agent.run_workflow()
+        messages = await agent.run_workflow()
         response = strip_markdown(messages[-1].content)
         return response
     except:
@@ -177,13 +173,13 @@ def deactivate_ca(node_id: str) -> str:
 
 
 @tool
-def change_dss(node_id: str) -> str:
+async def change_dss(node_id: str) -> str:
     """Change DSS for a node"""
     activate_mlb_prompt = prompt_manager.get_prompt("change_dss", node_id=node_id)
     agent = TaskAgent(system_instructions=activate_mlb_prompt, node_id=node_id)
     try:
         agent.set_up()
-        messages = agent.run_workflow()
+        messages = await agent.run_workflow()
         response = strip_markdown(messages[-1].content)
         return response
     except:
@@ -192,7 +188,7 @@ def change_dss(node_id: str) -> str:
 
 
 @tool
-def deactivate_pdcch_power_boost(node_id: str) -> str:
+async def deactivate_pdcch_power_boost(node_id: str) -> str:
     """Deactivate PDCCH Power Boost for node"""
     activate_mlb_prompt = prompt_manager.get_prompt(
         "deactivate_pdcch_power_boost", node_id=node_id
@@ -200,7 +196,7 @@ def deactivate_pdcch_power_boost(node_id: str) -> str:
     agent = TaskAgent(system_instructions=activate_mlb_prompt, node_id=node_id)
     try:
         agent.set_up()
-        messages = agent.run_workflow()
+        messages = await agent.run_workflow()
         response = strip_markdown(messages[-1].content)
         return response
     except:
@@ -209,7 +205,7 @@ def deactivate_pdcch_power_boost(node_id: str) -> str:
 
 
 @tool
-def enhance_dsplit_threshold(node_id: str) -> str:
+async def enhance_dsplit_threshold(node_id: str) -> str:
     """Enhance dsplitThreshold for node"""
     activate_mlb_prompt = prompt_manager.get_prompt(
         "enhance_dsplit_threshold", node_id=node_id
@@ -217,7 +213,7 @@ def enhance_dsplit_threshold(node_id: str) -> str:
     agent = TaskAgent(system_instructions=activate_mlb_prompt, node_id=node_id)
     try:
         agent.set_up()
-        messages = agent.run_workflow()
+        messages = await agent.run_workflow()
         response = strip_markdown(messages[-1].content)
         return response
     except:
@@ -226,7 +222,7 @@ def enhance_dsplit_threshold(node_id: str) -> str:
 
 
 @tool
-def enhance_resource_allocation(node_id: str) -> str:
+async def enhance_resource_allocation(node_id: str) -> str:
     """Enhance resource allocation for node"""
     activate_mlb_prompt = prompt_manager.get_prompt(
         "enhance_resource_allocation", node_id=node_id
@@ -234,7 +230,7 @@ def enhance_resource_allocation(node_id: str) -> str:
     agent = TaskAgent(system_instructions=activate_mlb_prompt, node_id=node_id)
     try:
         agent.set_up()
-        messages = agent.run_workflow()
+        messages = await agent.run_workflow()
         response = strip_markdown(messages[-1].content)
         return response
     except:
@@ -243,7 +239,7 @@ def enhance_resource_allocation(node_id: str) -> str:
 
 
 @tool
-def increase_tilt_value(node_id: str) -> str:
+async def increase_tilt_value(node_id: str) -> str:
     """Increase cell tilt value"""
     activate_mlb_prompt = prompt_manager.get_prompt(
         "increase_tilt_value", node_id=node_id
@@ -251,7 +247,7 @@ def increase_tilt_value(node_id: str) -> str:
     agent = TaskAgent(system_instructions=activate_mlb_prompt, node_id=node_id)
     try:
         agent.set_up()
-        messages = agent.run_workflow()
+        messages = await agent.run_workflow()
         response = strip_markdown(messages[-1].content)
         return response
     except:
@@ -260,13 +256,13 @@ def increase_tilt_value(node_id: str) -> str:
 
 
 @tool
-def decrease_power(node_id: str) -> str:
+async def decrease_power(node_id: str) -> str:
     """Decrease cell power"""
     activate_mlb_prompt = prompt_manager.get_prompt("decrease_power", node_id=node_id)
     agent = TaskAgent(system_instructions=activate_mlb_prompt, node_id=node_id)
     try:
         agent.set_up()
-        messages = agent.run_workflow()
+        messages = await agent.run_workflow()
         response = strip_markdown(messages[-1].content)
         return response
     except:
@@ -278,5 +274,5 @@ if __name__ == "__main__":
     activate_mlb_prompt = prompt_manager.get_prompt("activate_mlb")
     agent = TaskAgent(system_instructions=activate_mlb_prompt, node_id="n-123")
     agent.set_up()
-    messages = agent.run_workflow()
+    messages = asyncio.run(agent.run_workflow())
     print(messages[-1].content)
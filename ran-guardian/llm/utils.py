@@ -5,7 +5,7 @@ from datetime import datetime
 from enum import Enum
 from typing import Any, Optional
 
-from app.data_manager import DataManager
+from app.data_manager import get_shared_data_manager
 from app.models import Issue, IssueStatus, Task, TaskStatus
 from google.cloud import firestore
 from google.cloud.firestore_v1.transforms import Sentinel
@@ -14,8 +14,6 @@ from pydantic import BaseModel
 
 # DUMMY_ISSUE = {"status": "ANALYZING", "node_ids": ["n-123"], "summary": ""}
 
-dm = DataManager(project_id=os.environ.get("PROJECT_ID"))
-
 
 def format_message(message: BaseMessage | list[BaseMessage]) -> str:
     """Helper function to format BaseMessage objects for better display"""
@@ -46,16 +44,16 @@ async def get_sample_issue() -> Issue:
         status=IssueStatus.NEW,
         tasks=None,
     )
-    await dm.create_issue_from_model(sample_issue)
+    await get_shared_data_manager().create_issue_from_model(sample_issue)
     return sample_issue
 
 
 async def get_issue(issue_id: str) -> Issue:
-    return await dm.get_issue(issue_id)
+    return await get_shared_data_manager().get_issue(issue_id)
 
 
 async def check_issue_status(issue_id: str) -> str:
-    issue = await dm.get_issue(issue_id)
+    issue = await get_shared_data_manager().get_issue(issue_id)
     if issue:
         return issue.status
     else:
@@ -65,7 +63,7 @@ async def check_issue_status(issue_id: str) -> str:
 async def update_issue_status_and_summary(
     issue_id: str, status: IssueStatus, summary: str
 ) -> bool:
-    return await dm.update_issue(
+    return await get_shared_data_manager().update_issue(
         issue_id,
         {
             "status": status,
@@ -76,20 +74,20 @@ async def update_issue_status_and_summary(
 
 
 async def update_issue_status(issue_id: str, status: IssueStatus) -> bool:
-    return await dm.update_issue(
+    return await get_shared_data_manager().update_issue(
         issue_id,
         {"status": status, "updated_at": datetime.now()},
     )
 
 
 async def get_current_issue_tasks(issue_id: str) -> list[Task]:
-    issue = await dm.get_issue(issue_id)
+    issue = await get_shared_data_manager().get_issue(issue_id)
     tasks = issue.tasks if issue and issue.tasks else []
     return tasks
 
 
 async def set_issue_tasks(issue_id: str, tasks: list[Task]) -> bool:
-    return await dm.update_issue(issue_id, {"tasks": tasks})
+    return await get_shared_data_manager().update_issue(issue_id, {"tasks": tasks})
 
 
 def strip_markdown(text: str) -> str:
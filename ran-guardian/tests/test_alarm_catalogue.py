@@ -0,0 +1,62 @@
+from datetime import datetime
+
+import pyarrow as pa
+import pytest
+from data_generator import alarm_catalogue
+from data_generator.alarm_catalogue import ALARM_COLUMNS, AlarmCatalogue, hash_row_num
+
+START = datetime(2025, 3, 1, 10, 0)
+
+
+def _catalogue(n_rows):
+    return AlarmCatalogue(
+        pa.table(
+            {
+                column: [f"{column}{i}" for i in range(n_rows)]
+                for column in ALARM_COLUMNS
+            }
+        )
+    )
+
+
+@pytest.mark.parametrize(
+    "row_num, n_rows, rows",
+    [
+        (4, 10, [3, 4]),  # 4 % 3 = 1 extra row, 1-based: positions 3 and 4
+        (5, 10, [4, 5, 6]),
+        (9, 10, [8]),
+        (0, 10, []),  # row number 0 matches no row
+        (5, 6, [4, 5]),  # cut at the end of the table
+    ],
+)
+def test_rows(monkeypatch, row_num, n_rows, rows):
+    monkeypatch.setattr(alarm_catalogue, "hash_row_num", lambda *args: row_num)
+    assert _catalogue(n_rows).rows("node", START).tolist() == rows
+
+
+def test_rows_of_empty_catalogue():
+    assert _catalogue(0).rows("node", START).tolist() == []
+
+
+def test_hash_row_num_is_stable_for_a_day():
+    row_num = hash_row_num("node", START, 1000)
+    assert 0 <= row_num < 1000
+    assert hash_row_num("node", START.replace(hour=23), 1000) == row_num
+
+
+def test_record():
+    table = pa.table(
+        {
+            "ALERTKEY": ["k"],
+            "EVENT_ID": [7],
+            "ALERTGROUP": ["g"],
+            "SUMMARY": ["summary"],
+            "ADDITIONALTEXT": [None],
+        }
+    )
+    assert AlarmCatalogue(table).record(0) == {
+        "alarm_id": "k",
+        "event_id": "7",
+        "alarm_type": "g",
+        "description": "summary\n",
+    }
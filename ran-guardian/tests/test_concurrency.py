@@ -0,0 +1,146 @@
+import asyncio
+
+import pytest
+from app.concurrency import AdaptiveLimiter, is_overload_error
+from llm.rate_limiter import Budget, RateLimiter
+
+
+class RateLimited(Exception):
+    code = 429
+
+
+def test_additive_increase():
+    limiter = AdaptiveLimiter("test", initial_limit=2)
+
+    async def run():
+        for _ in range(4):
+            async with limiter.slot():
+                pass
+
+    asyncio.run(run())
+    assert limiter.successes == 4
+    assert int(limiter.limit) == 3
+
+
+def test_multiplicative_decrease_once_per_burst():
+    limiter = AdaptiveLimiter("test", initial_limit=8)
+
+    async def call():
+        async with limiter.slot():
+            await asyncio.sleep(0.01)
+            raise RateLimited()
+
+    async def run():
+        return await asyncio.gather(*[call() for _ in range(8)], return_exceptions=True)
+
+    results = asyncio.run(run())
+    assert all(isinstance(r, RateLimited) for r in results)
+    assert limiter.overloads == 8
+    assert limiter.limit == 4
+    assert limiter.in_flight == 0
+
+
+def test_limit_bounds_concurrency():
+    limiter = AdaptiveLimiter("test", initial_limit=2, max_limit=2)
+    peak = 0
+
+    async def call():
+        nonlocal peak
+        async with limiter.slot():
+            peak = max(peak, limiter.in_flight)
+            await asyncio.sleep(0.01)
+
+    async def run():
+        await asyncio.gather(*[call() for _ in range(6)])
+
+    asyncio.run(run())
+    assert peak == 2
+    assert limiter.stats()["waiting"] == 0
+
+
+def test_overload_signals():
+    rate_limiter = RateLimiter(Budget(rpm=100, tpm=100000))
+    limiter = AdaptiveLimiter("test", initial_limit=4)
+    other = AdaptiveLimiter("other", initial_limit=4)
+
+    async def rate_limited():
+        async with limiter.slot():
+            # a 429 handled below the limiter, in a task of the call
+            await asyncio.create_task(rate_limiter.aon_rate_limited("m", RateLimited()))
+
+    async def healthy():
+        async with other.slot():
+            await asyncio.sleep(0.01)
+
+    async def run():
+        await asyncio.gather(rate_limited(), healthy())
+
+    asyncio.run(run())
+    assert rate_limiter.n_rate_limited == 1
+    assert limiter.limit == 2
+    # the 429 of another stage does not cut this one
+    assert other.limit == 4.25
+    assert is_overload_error(asyncio.TimeoutError())
+    assert not is_overload_error(ValueError())
+
+
+def test_waiters_admitted_by_priority():
+    limiter = AdaptiveLimiter("test", initial_limit=1, max_limit=1)
+    order = []
+
+    async def call(name, priority):
+        async with limiter.slot(priority):
+            order.append(name)
+            await asyncio.sleep(0.01)
+
+    async def run():
+        first = asyncio.create_task(call("first", 0))
+        await asyncio.sleep(0)
+        await asyncio.gather(
+            first, call("low", 1), call("high", 3), call("medium", 2), call("low2", 1)
+        )
+
+    asyncio.run(run())
+    assert order == ["first", "high", "medium", "low", "low2"]
+
+
+def test_released_slot_goes_to_the_waiter():
+    limiter = AdaptiveLimiter("test", initial_limit=1, max_limit=1)
+    order = []
+
+    async def call(name, priority):
+        async with limiter.slot(priority):
+            order.append(name)
+
+    async def run():
+        await limiter.acquire()
+        waiter = asyncio.create_task(call("waiter", 3))
+        await asyncio.sleep(0)
+        limiter.release()
+        # the newcomer runs before the woken waiter resumes
+        async with asyncio.timeout(0.05):
+            await call("newcomer", 0)
+        await waiter
+
+    asyncio.run(run())
+    assert order == ["waiter", "newcomer"]
+    assert limiter.in_flight == 0
+
+
+def test_cancelled_waiter_passes_its_slot_on():
+    limiter = AdaptiveLimiter("test", initial_limit=1, max_limit=1)
+
+    async def run():
+        await limiter.acquire()
+        cancelled = asyncio.create_task(limiter.acquire(2))
+        other = asyncio.create_task(limiter.acquire(1))
+        await asyncio.sleep(0)
+        limiter.release()  # hands the slot to `cancelled`
+        cancelled.cancel()
+        await asyncio.wait_for(other, 0.05)
+        assert cancelled.cancelled()
+        limiter.release()
+
+    asyncio.run(run())
+    assert limiter.in_flight == 0
+    assert limiter.stats()["waiting"] == 0
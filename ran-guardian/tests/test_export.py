@@ -0,0 +1,100 @@
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+import pytest
+from data_generator.export import (
+    IPC_END_OF_STREAM,
+    export_schema,
+    generate_batches,
+    ipc_stream,
+    write_ipc,
+    write_parquet,
+)
+from data_generator.kpi_tables import (
+    PERF_METRIC_COLUMNS,
+    PERFORMANCE_METRICS,
+    KpiTables,
+)
+
+NODE_IDS = ["1", "2", "3"]
+
+
+@pytest.fixture
+def kpi_tables():
+    node_table = pa.table(
+        {
+            "node_id": [1.0, 2.0, 3.0],
+            "hour": [0, 0, 0],
+            **{column: [100.0, 0.5, 50.0] for column in PERF_METRIC_COLUMNS},
+        }
+    )
+    mean_table = pa.table(
+        {"hour": list(range(24)), **{c: [1.0] * 24 for c in PERF_METRIC_COLUMNS}}
+    )
+    return KpiTables.from_tables(node_table, mean_table)
+
+
+@pytest.fixture
+def time_range():
+    return pd.date_range("2025-03-01", periods=5, freq="15min", tz="UTC")
+
+
+def _batches(kpi_tables, time_range, **chunks):
+    return generate_batches(
+        kpi_tables, NODE_IDS, time_range, np.random.default_rng(0), **chunks
+    )
+
+
+@pytest.mark.parametrize(
+    "chunk_nodes, chunk_timestamps, n_batches",
+    [(1000, 96, 1), (2, 96, 2), (1000, 2, 3), (2, 2, 6), (1, 1, 15)],
+)
+def test_generate_batches(
+    kpi_tables, time_range, chunk_nodes, chunk_timestamps, n_batches
+):
+    batches = list(
+        _batches(
+            kpi_tables,
+            time_range,
+            chunk_nodes=chunk_nodes,
+            chunk_timestamps=chunk_timestamps,
+        )
+    )
+    assert len(batches) == n_batches
+    table = pa.Table.from_batches(batches).sort_by(
+        [("node_id", "ascending"), ("timestamp", "ascending")]
+    )
+    assert table.schema == export_schema(time_range)
+    assert table.column_names == ["node_id", "timestamp"] + PERFORMANCE_METRICS
+    assert table["node_id"].to_pylist() == [n for n in NODE_IDS for _ in time_range]
+    assert table["timestamp"].to_pylist()[:5] == time_range.to_pydatetime().tolist()
+
+
+def test_ipc_stream_framing(kpi_tables, time_range):
+    batches = list(_batches(kpi_tables, time_range, chunk_nodes=2, chunk_timestamps=2))
+    messages = list(ipc_stream(export_schema(time_range), iter(batches)))
+    # schema, one message per batch, end of stream
+    assert len(messages) == len(batches) + 2
+    assert messages[-1] == IPC_END_OF_STREAM
+    table = pa.ipc.open_stream(b"".join(messages)).read_all()
+    assert table.equals(pa.Table.from_batches(batches))
+
+
+@pytest.mark.parametrize(
+    "write, read",
+    [
+        (write_ipc, lambda path: pa.ipc.open_stream(pa.memory_map(path)).read_all()),
+        (write_parquet, pq.read_table),
+    ],
+)
+def test_write(kpi_tables, time_range, tmp_path, write, read):
+    path = str(tmp_path / "kpis")
+    schema = export_schema(time_range)
+    n_records = write(path, schema, _batches(kpi_tables, time_range, chunk_nodes=2))
+    assert n_records == len(NODE_IDS) * len(time_range)
+    table = read(path)
+    assert table.num_rows == n_records
+    assert table.equals(
+        pa.Table.from_batches(list(_batches(kpi_tables, time_range, chunk_nodes=2)))
+    )
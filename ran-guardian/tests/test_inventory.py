@@ -0,0 +1,142 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pytest
+from app.inventory import InventoryIndex, explode_cells
+from app.inventory_snapshot import (
+    _upsert,
+    haversine_distance,
+    load_inventory_snapshot,
+    sites_within_radius,
+    write_inventory_snapshot,
+)
+from app.models import Location
+
+
+@pytest.fixture
+def inventory():
+    rng = np.random.default_rng(0)
+    n_sites = 5000
+    return pd.DataFrame(
+        {
+            "site_id": [f"SITE{i}" for i in range(n_sites)],
+            "latitude": rng.uniform(47, 55, n_sites),
+            "longitude": rng.uniform(6, 15, n_sites),
+            "CELLS_4G": [f"['SITE{i}A', 'SITE{i}B']" for i in range(n_sites)],
+        }
+    )
+
+
+def test_explode_cells():
+    offsets, node_codes, node_ids = explode_cells(["['A1', 'A2', 'A3']", "['B1']"])
+    assert offsets.tolist() == [0, 3, 4]
+    assert node_ids[node_codes].tolist() == ["A1", "A2", "A3", "B1"]
+
+
+@pytest.mark.parametrize("radius", [300, 4000, 15000])
+def test_query_radius_matches_brute_force(inventory, radius):
+    index = InventoryIndex.from_dataframe(inventory)
+    rng = np.random.default_rng(radius)
+    for _ in range(20):
+        location = Location(latitude=rng.uniform(47, 55), longitude=rng.uniform(6, 15))
+        distances = haversine_distance(
+            location.latitude,
+            location.longitude,
+            inventory["latitude"],
+            inventory["longitude"],
+        )
+        expected = np.flatnonzero(distances <= radius)
+        found = index.query_radius(location, radius)
+        assert sorted(found.tolist()) == expected.tolist()
+        assert np.all(np.diff(distances[found]) >= 0)  # nearest first
+
+
+def test_query_radius_across_antimeridian():
+    index = InventoryIndex(
+        ["EAST", "WEST"], [0.0, 0.0], [179.999, -179.999], ["['E1']", "['W1']"]
+    )
+    found = index.query_radius(Location(latitude=0.0, longitude=180.0), 1000)
+    assert sorted(index.site_ids[found]) == ["EAST", "WEST"]
+
+
+def test_nearby_nodes(inventory):
+    index = InventoryIndex.from_dataframe(inventory)
+    site = inventory.iloc[0]
+    location = Location(latitude=site["latitude"], longitude=site["longitude"])
+    nodes = index.nearby_nodes(location, 1, max_sites=1)
+    assert [node.node_id for node in nodes] == ["SITE0A", "SITE0B"]
+    assert all(node.site_id == "SITE0" for node in nodes)
+
+
+def test_snapshot_upsert(inventory, tmp_path):
+    path = str(tmp_path / "inventory.arrow")
+    table = pa.Table.from_pandas(inventory, preserve_index=False)
+    write_inventory_snapshot(table.replace_schema_metadata({b"k": b"v"}), path)
+    snapshot = load_inventory_snapshot(path)
+    assert snapshot.schema.metadata == {b"k": b"v"}
+
+    changed = pa.Table.from_pandas(
+        inventory.iloc[:2].assign(latitude=0.0), preserve_index=False
+    )
+    merged = _upsert(snapshot, changed).to_pandas().set_index("site_id")
+    assert len(merged) == len(inventory)
+    assert merged.loc[["SITE0", "SITE1"], "latitude"].tolist() == [0.0, 0.0]
+    assert merged.loc["SITE2", "latitude"] == inventory.loc[2, "latitude"]
+
+
+def test_nearby_sites(inventory):
+    index = InventoryIndex.from_dataframe(inventory)
+    location = Location(latitude=51.0, longitude=10.0)
+    sites = index.nearby_sites(location, 15000)
+    assert len(sites) > 1
+    for site in sites:
+        assert [node.node_id for node in site.nodes] == [
+            f"{site.site_id}A",
+            f"{site.site_id}B",
+        ]
+
+
+def test_nearby_nodes_batch_matches_single_queries(inventory):
+    index = InventoryIndex.from_dataframe(inventory)
+    rng = np.random.default_rng(1)
+    locations = [
+        Location(latitude=rng.uniform(47, 55), longitude=rng.uniform(6, 15))
+        for _ in range(10)
+    ]
+    batch = index.nearby_nodes_batch(locations, 15000, max_sites=2)
+    for location, nodes in zip(locations, batch):
+        single = index.nearby_nodes(location, 15000, max_sites=2)
+        assert [node.node_id for node in nodes] == [node.node_id for node in single]
+
+
+def test_snapshot_keeps_sites_without_4g_cells():
+    table = pa.table(
+        {
+            "site_id": ["A", "B", "C", "D"],
+            "CELLS_4G": ["['A1']", None, "['C1']", "['D1']"],
+            "longitude": [10.0, 10.001, 10.5, None],
+            "latitude": [51.0, 51.0, 51.0, 51.0],
+        }
+    )
+    # the explorer sees every site with coordinates, nearest first
+    found = sites_within_radius(table, 51.0, 10.0005, 1000)
+    assert table["site_id"].take(found).to_pylist() == ["A", "B"]
+    # the agent's index only the sites with 4G cells and coordinates
+    index = InventoryIndex.from_table(table)
+    assert index.site_ids.tolist() == ["A", "C"]
+
+
+def test_concurrent_snapshot_writes(inventory, tmp_path):
+    path = str(tmp_path / "inventory.arrow")
+    tables = [
+        pa.Table.from_pandas(inventory.iloc[: 1000 * (i + 1)], preserve_index=False)
+        for i in range(4)
+    ]
+    with ThreadPoolExecutor(len(tables)) as executor:
+        list(executor.map(lambda table: write_inventory_snapshot(table, path), tables))
+    # one of the complete tables, and no temporary file left behind
+    assert load_inventory_snapshot(path).num_rows in {t.num_rows for t in tables}
+    assert os.listdir(tmp_path) == ["inventory.arrow"]
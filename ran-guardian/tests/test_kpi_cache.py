@@ -0,0 +1,92 @@
+import asyncio
+from datetime import datetime, timedelta
+
+from app.kpi_cache import KpiCache
+from app.models import PerformanceData
+
+INTERVAL = 15  # minutes
+
+
+def _record(node_id: str, timestamp: datetime) -> PerformanceData:
+    return PerformanceData(
+        node_id=node_id, timestamp=timestamp, rrc_max_users=100, rrc_setup_sr_pct=0.9
+    )
+
+
+class FakeServer:
+    """Returns one record per bucket boundary within the requested range, the
+    buckets being published `delay` after their start"""
+
+    def __init__(self, delay: timedelta = timedelta(0)):
+        self.requests = []
+        self.delay = delay
+
+    async def fetch(self, node_ids, start_time, end_time):
+        self.requests.append((list(node_ids), start_time))
+        step = timedelta(minutes=INTERVAL)
+        times = []
+        time = start_time
+        while time <= end_time - self.delay:
+            times.append(time)
+            time += step
+        return {node_id: [_record(node_id, t) for t in times] for node_id in node_ids}
+
+
+def test_only_missing_buckets_are_fetched():
+    server = FakeServer()
+    cache = KpiCache(server.fetch, interval=INTERVAL)
+    now = datetime(2025, 3, 1, 10, 7)
+
+    perf = asyncio.run(cache.get(["A", "B"], 4, now=now))
+    assert [r.timestamp for r in perf["A"]] == [
+        datetime(2025, 3, 1, 9, 15),
+        datetime(2025, 3, 1, 9, 30),
+        datetime(2025, 3, 1, 9, 45),
+        datetime(2025, 3, 1, 10, 0),
+    ]
+    assert len(server.requests) == 1
+
+    # same bucket: served from memory
+    asyncio.run(cache.get(["A", "B"], 4, now=now + timedelta(minutes=5)))
+    assert len(server.requests) == 1
+
+    # next bucket: only the new bucket is fetched
+    perf = asyncio.run(cache.get(["A"], 4, now=now + timedelta(minutes=15)))
+    assert server.requests[-1] == (["A"], datetime(2025, 3, 1, 10, 15))
+    assert perf["A"][-1].timestamp == datetime(2025, 3, 1, 10, 15)
+    assert len(perf["A"]) == 4
+
+    stats = cache.stats()
+    assert stats["misses"] == 9
+    assert stats["hits"] == 11
+
+
+def test_lru_eviction():
+    server = FakeServer()
+    cache = KpiCache(server.fetch, interval=INTERVAL, max_nodes=2)
+    now = datetime(2025, 3, 1, 10, 7)
+    for node_id in ["A", "B", "A", "C"]:
+        asyncio.run(cache.get([node_id], 4, now=now))
+    assert cache.stats()["nodes"] == 2
+    assert cache.stats()["evictions"] == 1
+    asyncio.run(cache.get(["A"], 4, now=now))  # A was used last, still cached
+    assert len(server.requests) == 3
+
+
+def test_late_bucket_is_fetched_again():
+    server = FakeServer(delay=timedelta(minutes=10))
+    cache = KpiCache(server.fetch, interval=INTERVAL)
+    now = datetime(2025, 3, 1, 10, 7)
+
+    # the 10:00 bucket is not published yet
+    perf = asyncio.run(cache.get(["A"], 4, now=now))
+    assert perf["A"][-1].timestamp == datetime(2025, 3, 1, 9, 45)
+
+    # one cycle later it is, and it is requested again
+    perf = asyncio.run(cache.get(["A"], 4, now=now + timedelta(minutes=15)))
+    assert server.requests[-1] == (["A"], datetime(2025, 3, 1, 10, 0))
+    assert [r.timestamp for r in perf["A"]] == [
+        datetime(2025, 3, 1, 9, 30),
+        datetime(2025, 3, 1, 9, 45),
+        datetime(2025, 3, 1, 10, 0),
+    ]
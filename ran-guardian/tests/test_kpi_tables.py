@@ -0,0 +1,66 @@
+import numpy as np
+import pyarrow as pa
+import pytest
+from data_generator import kpi_tables
+from data_generator.kpi_tables import PERF_METRIC_COLUMNS, KpiTables
+
+
+def _metrics(*values):
+    """The same `values` in every metric column"""
+    return {column: list(values) for column in PERF_METRIC_COLUMNS}
+
+
+@pytest.fixture
+def tables():
+    # node 1 has hours 0 and 1, node 2 only hour 0
+    node_table = pa.table(
+        {"node_id": [1.0, 1.0, 2.0], "hour": [0, 1, 0], **_metrics(10.0, 11.0, 20.0)}
+    )
+    mean_table = pa.table({"hour": [0, 1, 2], **_metrics(0.5, 0.6, 0.7)})
+    return KpiTables.from_tables(node_table, mean_table)
+
+
+@pytest.mark.parametrize(
+    "node_id, row",
+    [("1", 0), ("1.0", 0), ("2", 1), ("3", -1), ("not-a-node", -1), ("", -1)],
+)
+def test_node_row(tables, node_id, row):
+    assert tables.node_row(node_id) == row
+
+
+def test_unknown_nodes_are_cached(tables, monkeypatch):
+    calls = []
+
+    def parse(node_id):
+        calls.append(node_id)
+        return None
+
+    monkeypatch.setattr(kpi_tables, "parse_node_key", parse)
+    assert tables.node_rows(["x", "x", "y", "x"]).tolist() == [-1, -1, -1, -1]
+    assert calls == ["x", "y"]
+
+
+@pytest.mark.parametrize(
+    "node_id, hours, expected",
+    [
+        ("1", [0, 1], [10.0, 11.0]),
+        ("2", [0, 1], [20.0, 0.6]),  # hour 1 missing: mean
+        ("3", [0, 2], [0.5, 0.7]),  # unknown node: mean
+        ("2", [1, 0, 1], [0.6, 20.0, 0.6]),
+    ],
+)
+def test_hourly_values(tables, node_id, hours, expected):
+    values = tables.hourly_values([node_id], np.array(hours))
+    assert values.shape == (1, len(hours), len(PERF_METRIC_COLUMNS))
+    np.testing.assert_allclose(values[0, :, 0], expected, rtol=1e-6)
+    np.testing.assert_allclose(values[0, :, -1], expected, rtol=1e-6)
+
+
+def test_generate(tables):
+    rng = np.random.default_rng(0)
+    values = tables.generate(["1", "2", "3"], np.array([0, 1]), rng)
+    base = tables.hourly_values(["1", "2", "3"], np.array([0, 1]))
+    ratios = values[..., 4:] / base[..., 4:]
+    assert np.all((ratios >= 0.9) & (ratios < 1.1))
+    assert np.all((values[..., 1:4] >= 0) & (values[..., 1:4] <= 1))
+    assert np.array_equal(values[..., 0], np.trunc(values[..., 0]))
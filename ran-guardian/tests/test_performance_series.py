@@ -0,0 +1,54 @@
+from datetime import datetime, timedelta, timezone
+
+import numpy as np
+import pyarrow as pa
+from app.models import PerformanceData
+from app.performance_series import PerformanceSeries
+
+
+def _performances(tzinfo=None):
+    start = datetime(2025, 3, 1, 10, 0, tzinfo=tzinfo)
+    return [
+        PerformanceData(
+            node_id="A",
+            timestamp=start + timedelta(minutes=15 * i),
+            rrc_max_users=100 + 10 * i,
+            rrc_setup_sr_pct=0.99 - 0.01 * i,
+            erab_ssr_volte_pct=None if i == 1 else 0.95,
+            download_throughput=1024.5,
+        )
+        for i in range(4)
+    ]
+
+
+def test_round_trip():
+    for tzinfo in (None, timezone(timedelta(hours=1))):
+        performances = _performances(tzinfo)
+        series = PerformanceSeries.from_models(performances)
+        assert series["rrc_max_users"].dtype == np.int64
+        assert np.isnan(series["erab_ssr_volte_pct"][1])
+        assert series.to_models() == performances
+
+
+def test_stats():
+    series = PerformanceSeries.from_models(_performances())
+    assert series.min()["rrc_max_users"] == 100
+    assert np.isclose(series.mean()["erab_ssr_volte_pct"], 0.95)
+    assert series.mean()["erab_ssr_data_pct"] is None
+    # +10 users every 15 minutes
+    assert np.isclose(series.slope()["rrc_max_users"], 40.0)
+    assert series.breaches("rrc_setup_sr_pct", below=0.975).tolist() == [
+        False,
+        False,
+        True,
+        True,
+    ]
+
+
+def test_from_arrow():
+    performances = _performances(timezone(timedelta(hours=1)))
+    table = pa.Table.from_pylist([p.model_dump() for p in performances])
+    series = PerformanceSeries.from_arrow(table)
+    assert series["rrc_max_users"].dtype == np.int64
+    assert np.isnan(series["erab_ssr_data_pct"]).all()
+    assert series.to_models() == performances
@@ -0,0 +1,115 @@
+import asyncio
+
+from app.pipeline import Pipeline
+
+
+async def numbers(n):
+    for i in range(n):
+        yield i
+
+
+def test_stages_filter_and_fan_out():
+    async def double(i):
+        yield i
+        yield i
+
+    async def odd(i):
+        if i % 2:
+            yield i
+
+    async def run():
+        return await (
+            Pipeline("test", lambda: numbers(10), queue_size=2)
+            .add_stage("double", double, workers=3)
+            .add_stage("odd", odd, workers=2)
+            .run()
+        )
+
+    stats = asyncio.run(run())
+    assert [(s["name"], s["in"], s["out"]) for s in stats] == [
+        ("double", 10, 20),
+        ("odd", 20, 10),
+    ]
+
+
+def test_batches_and_feed():
+    batches = []
+    results = []
+
+    async def collect(items):
+        batches.append(items)
+        for item in items:
+            yield item
+
+    async def sink(item):
+        results.append(item)
+        yield item
+
+    async def run():
+        await (
+            Pipeline("test", lambda: numbers(10), queue_size=16)
+            .add_stage("collect", collect, batch_size=4)
+            .add_stage("sink", sink, feed=lambda: numbers(3))
+            .run()
+        )
+
+    asyncio.run(run())
+    assert all(len(batch) <= 4 for batch in batches)
+    assert sum(len(batch) for batch in batches) == 10
+    assert sorted(results) == sorted(list(range(10)) + list(range(3)))
+
+
+def test_slow_item_does_not_stall_others():
+    done = []
+
+    async def work(i):
+        await asyncio.sleep(0.2 if i == 0 else 0.01)
+        done.append(i)
+        yield i
+
+    async def run():
+        await Pipeline("test", lambda: numbers(5)).add_stage("work", work, 2).run()
+
+    asyncio.run(run())
+    assert done[-1] == 0
+
+
+def test_failing_item_is_skipped():
+    async def fail_on_two(i):
+        if i == 2:
+            raise ValueError(i)
+        yield i
+
+    async def run():
+        return (
+            await Pipeline("test", lambda: numbers(4))
+            .add_stage("fail", fail_on_two)
+            .run()
+        )
+
+    stats = asyncio.run(run())
+    assert stats[0]["out"] == 3
+    assert stats[0]["errors"] == 1
+
+
+def test_priority_stage():
+    processed = []
+
+    async def source():
+        for i in [1, 5, 3, 4, 2]:
+            yield i
+
+    async def work(i):
+        processed.append(i)
+        await asyncio.sleep(0.01)
+        yield i
+
+    async def run():
+        await (
+            Pipeline("test", source, queue_size=8)
+            .add_stage("work", work, priority=lambda i: i)
+            .run()
+        )
+
+    asyncio.run(run())
+    assert processed == [5, 4, 3, 2, 1]
@@ -0,0 +1,98 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+from llm.rate_limiter import (
+    Budget,
+    RateLimiter,
+    TokenUsageCallbackHandler,
+    retry_after_seconds,
+)
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock():
+    return FakeClock()
+
+
+def test_request_and_token_budgets(clock):
+    limiter = RateLimiter(Budget(rpm=2, tpm=1000), clock=clock)
+    assert limiter.try_acquire("m", 100) == 0
+    assert limiter.try_acquire("m", 100) == 0
+    # no request left, one is refilled every 30 s
+    assert limiter.try_acquire("m", 100) == pytest.approx(30)
+    clock.now += 30
+    assert limiter.try_acquire("m", 100) == 0
+
+    # actual usage above the estimate holds back the next calls
+    # (900 tokens left, 500 refilled in 30 s)
+    limiter.record_usage("m", 1500)
+    clock.now += 30
+    assert limiter.try_acquire("m", 100) == pytest.approx((100 + 100) * 60 / 1000)
+
+    # other models have their own buckets
+    assert limiter.try_acquire("other", 100) == 0
+
+
+def test_retry_after_pauses_the_model(clock):
+    limiter = RateLimiter(Budget(rpm=100, tpm=100000), clock=clock)
+    error = SimpleNamespace(response=SimpleNamespace(headers={"Retry-After": "7"}))
+    assert retry_after_seconds(error) == 7
+    limiter.on_rate_limited("m", error)
+    assert limiter.try_acquire("m") == pytest.approx(7)
+    clock.now += 7
+    assert limiter.try_acquire("m") == 0
+
+
+def test_callback_pauses_the_model_on_429(clock):
+    limiter = RateLimiter(Budget(rpm=100, tpm=100000), clock=clock)
+    handler = TokenUsageCallbackHandler("m", limiter)
+    handler.on_llm_error(ValueError("invalid request"))
+    assert limiter.try_acquire("m") == 0
+
+    error = SimpleNamespace(
+        code=429, response=SimpleNamespace(headers={"Retry-After": "5"})
+    )
+    handler.on_llm_error(error)
+    assert limiter.n_rate_limited == 1
+    assert limiter.try_acquire("m") == pytest.approx(5)
+
+
+def test_state_file_is_shared(clock, tmp_path):
+    path = str(tmp_path / "rate_limits.json")
+    first = RateLimiter(Budget(rpm=1, tpm=1000), state_file=path, clock=clock)
+    second = RateLimiter(Budget(rpm=1, tpm=1000), state_file=path, clock=clock)
+    assert first.try_acquire("m") == 0
+    assert second.try_acquire("m") == pytest.approx(60)
+
+
+def test_state_file_is_not_locked_on_the_event_loop(tmp_path, monkeypatch):
+    limiter = RateLimiter(
+        Budget(rpm=10, tpm=1000), state_file=str(tmp_path / "rate_limits.json")
+    )
+    to_thread = asyncio.to_thread
+    off_loop = []
+
+    async def _to_thread(func, *args):
+        off_loop.append(func.__name__)
+        return await to_thread(func, *args)
+
+    monkeypatch.setattr(asyncio, "to_thread", _to_thread)
+
+    async def run():
+        await limiter.acquire("m", 100)
+        await limiter.arecord_usage("m", 200)
+        await limiter.aon_rate_limited("m", SimpleNamespace(code=429))
+
+    asyncio.run(run())
+    assert off_loop == ["try_acquire", "record_usage", "on_rate_limited"]
+    assert limiter.n_rate_limited == 1
+    assert limiter.try_acquire("m") == pytest.approx(2, abs=0.1)
@@ -0,0 +1,55 @@
+from datetime import datetime, timedelta, timezone
+
+from app.models import EventRisk, Issue, RiskLevel
+from app.scheduler import by_priority, issue_priority, priority_score
+
+NOW = datetime(2025, 6, 1, 12)
+
+
+def make_issue(issue_id, days_to_start, size, risk_level, n_nodes):
+    return Issue(
+        issue_id=issue_id,
+        event_id=issue_id,
+        start_date=NOW + timedelta(days=days_to_start),
+        event_size=size,
+        event_risk=EventRisk(
+            event_id=issue_id,
+            node_summaries=[],
+            risk_level=risk_level,
+            description="",
+        ),
+        node_ids=[f"node{i}" for i in range(n_nodes)],
+        created_at=NOW - timedelta(hours=1),
+    )
+
+
+def test_imminent_large_risky_issues_first():
+    issues = [
+        make_issue("far_small_low", 60, 1, RiskLevel.LOW, 0),
+        make_issue("soon_xl_high", 1, 4, RiskLevel.HIGH, 5),
+        make_issue("soon_s_medium", 1, 1, RiskLevel.MEDIUM, 1),
+        make_issue("far_xl_high", 60, 4, RiskLevel.HIGH, 5),
+    ]
+    ranked = by_priority(issues, lambda issue: issue_priority(issue, NOW))
+    assert [issue.issue_id for issue in ranked] == [
+        "soon_xl_high",
+        "far_xl_high",
+        "soon_s_medium",
+        "far_small_low",
+    ]
+    top = by_priority(issues, lambda issue: issue_priority(issue, NOW), n=2)
+    assert top == ranked[:2]
+
+
+def test_components():
+    start = NOW + timedelta(days=7)
+    base = priority_score(NOW, start, 2, RiskLevel.MEDIUM, 0, NOW)
+    # urgency is halved one horizon before the start, full once started
+    assert priority_score(
+        NOW, NOW - timedelta(hours=1), 2, RiskLevel.MEDIUM, 0, NOW
+    ) == (base + 0.35 / 2)
+    # staleness grows with the time since the last evaluation
+    assert priority_score(NOW, start, 2, RiskLevel.MEDIUM, 0, None) > base
+    # timezone aware times compare with naive ones
+    aware = start.astimezone(timezone.utc)
+    assert abs(priority_score(NOW, aware, 2, RiskLevel.MEDIUM, 0, NOW) - base) < 1e-9